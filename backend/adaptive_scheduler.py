@@ -0,0 +1,202 @@
+from typing import Dict, Any, List, Optional, Sequence
+from collections import OrderedDict
+from datetime import datetime
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class DeviceState:
+    """Last scored sample, cached verdict and sampling interval for one device"""
+
+    def __init__(self, interval: float):
+        self.last_row: Optional[np.ndarray] = None
+        self.last_result: Optional[Dict[str, Any]] = None
+        self.interval = interval
+        self.hot_remaining = 0
+        self.seen = 0
+        self.scored = 0
+        self.skipped = 0
+
+class AdaptiveScorer:
+    """
+    Change-triggered, adaptively paced scoring on top of Windows10ThreatDetector
+
+    A sample is only scored when some feature moved beyond its tolerance
+    since the device's last scored sample; otherwise the cached verdict is
+    returned. Devices whose verdict is a threat, or whose confidence lies
+    within ``boundary_margin`` of the 0.5 decision boundary, are marked hot:
+    their sampling interval drops to ``min_interval`` and the next
+    ``hot_samples`` samples are always scored. Calm devices back off towards
+    ``max_interval``. At most ``max_devices`` devices are tracked; the least
+    recently seen are forgotten and simply get scored on their next sample.
+    """
+
+    def __init__(
+        self,
+        detector,
+        tolerances: Optional[Dict[str, float]] = None,
+        relative_tolerance: float = 0.05,
+        absolute_tolerance: float = 1e-6,
+        ignore_features: Sequence[str] = ("ts",),
+        boundary_margin: float = 0.15,
+        hot_samples: int = 5,
+        min_interval: float = 1.0,
+        max_interval: float = 60.0,
+        base_interval: float = 5.0,
+        backoff: float = 1.5,
+        max_devices: int = 10000
+    ):
+        self.detector = detector
+        self.feature_names = detector.feature_names
+        self.relative_tolerance = relative_tolerance
+        self.boundary_margin = boundary_margin
+        self.hot_samples = hot_samples
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.base_interval = base_interval
+        self.backoff = backoff
+        self.max_devices = max_devices
+
+        # Per-feature absolute tolerance, compiled once into feature order
+        tolerances = tolerances or {}
+        self.absolute_tolerances = np.array(
+            [tolerances.get(name, absolute_tolerance) for name in self.feature_names],
+            dtype=np.float64
+        )
+        for i, name in enumerate(self.feature_names):
+            if name in ignore_features:
+                self.absolute_tolerances[i] = np.inf
+
+        self.devices: "OrderedDict[str, DeviceState]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _state(self, device_id: str) -> DeviceState:
+        state = self.devices.get(device_id)
+        if state is None:
+            state = self.devices[device_id] = DeviceState(self.base_interval)
+            if len(self.devices) > self.max_devices:
+                self.devices.popitem(last=False)
+        else:
+            self.devices.move_to_end(device_id)
+        return state
+
+    def _unchanged(self, state: DeviceState, row: np.ndarray) -> bool:
+        if state.last_row is None or state.hot_remaining > 0:
+            return False
+        tolerance = self.absolute_tolerances + self.relative_tolerance * np.abs(state.last_row)
+        return bool(np.all(np.abs(row - state.last_row) <= tolerance))
+
+    def _update(self, state: DeviceState, row: np.ndarray, result: Dict[str, Any]) -> None:
+        state.last_row = row.copy()
+        state.last_result = result
+        state.scored += 1
+        near_boundary = result["confidence"] < 0.5 + self.boundary_margin
+        if result["is_threat"] or near_boundary:
+            state.interval = self.min_interval
+            state.hot_remaining = self.hot_samples
+        else:
+            state.interval = min(self.max_interval, max(state.interval, self.min_interval) * self.backoff)
+
+    def score_batch(self, device_ids: Sequence[str], rows) -> List[Dict[str, Any]]:
+        """
+        Score a batch of samples, skipping rows whose device did not change
+
+        Args:
+            device_ids: Device id for each row
+            rows: Array-like of shape (n_samples, n_features) in feature_names order
+
+        Returns:
+            One result per row; skipped rows get the cached verdict with
+            ``"cached": True``, stamped now and with the time it was scored
+            in ``"scored_at"``
+
+        Rows are compared in order: a row is checked against the device's
+        previous row in the same batch, not only against the last batch.
+        Hot marking from verdicts in this batch applies from the next batch.
+        """
+        rows = np.asarray(rows, dtype=np.float64)
+        if rows.ndim == 1:
+            rows = rows.reshape(1, -1)
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+        now = datetime.now().isoformat()
+        with self.lock:
+            to_score = []
+            # Device -> index of its latest row to score in this batch, and rows reusing its verdict
+            pending: Dict[str, int] = {}
+            reused = []
+            # Reference rows before this batch, restored if scoring fails
+            previous: Dict[str, Optional[np.ndarray]] = {}
+            for i, device_id in enumerate(device_ids):
+                state = self._state(device_id)
+                state.seen += 1
+                if self._unchanged(state, rows[i]):
+                    state.skipped += 1
+                    if device_id in pending:
+                        reused.append((i, pending[device_id]))
+                    else:
+                        results[i] = {**state.last_result, "cached": True, "timestamp": now,
+                                      "scored_at": state.last_result["timestamp"]}
+                else:
+                    to_score.append(i)
+                    if state.hot_remaining > 0:
+                        state.hot_remaining -= 1
+                    # Later rows of this device in the batch compare against this one
+                    previous.setdefault(device_id, state.last_row)
+                    state.last_row = rows[i]
+                    pending[device_id] = i
+
+            if to_score:
+                try:
+                    scored = self.detector.detect_batch(rows[to_score])
+                except Exception:
+                    for device_id, row in previous.items():
+                        self._state(device_id).last_row = row
+                    raise
+                for i, result in zip(to_score, scored):
+                    result["cached"] = False
+                    result["scored_at"] = result["timestamp"]
+                    self._update(self._state(device_ids[i]), rows[i], result)
+                    results[i] = result
+                for i, j in reused:
+                    results[i] = {**results[j], "cached": True, "timestamp": now, "scored_at": results[j]["timestamp"]}
+
+        return results
+
+    def score(self, device_id: str, metrics) -> Dict[str, Any]:
+        """Score one sample (dict or array-like) for a device"""
+        return self.score_batch([device_id], self.detector.vectorize(metrics))[0]
+
+    def next_interval(self, device_id: str) -> float:
+        """Sampling interval the device's collector should use next"""
+        state = self.devices.get(device_id)
+        return state.interval if state is not None else self.base_interval
+
+    def is_hot(self, device_id: str) -> bool:
+        state = self.devices.get(device_id)
+        return state is not None and state.interval <= self.min_interval
+
+    def device_stats(self, device_id: str = None) -> Dict[str, Any]:
+        """Per-device skip and score ratios"""
+        with self.lock:
+            devices = {device_id: self.devices[device_id]} if device_id in self.devices else (
+                {} if device_id else dict(self.devices))
+            return {
+                device: {
+                    "samples": state.seen,
+                    "scored": state.scored,
+                    "skipped": state.skipped,
+                    "score_ratio": state.scored / state.seen if state.seen else 0.0,
+                    "skip_ratio": state.skipped / state.seen if state.seen else 0.0,
+                    "interval": state.interval,
+                    "hot": state.interval <= self.min_interval,
+                    "last_verdict": None if state.last_result is None else {
+                        "is_threat": state.last_result["is_threat"],
+                        "confidence": state.last_result["confidence"]
+                    }
+                }
+                for device, state in devices.items()
+            }
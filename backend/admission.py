@@ -0,0 +1,279 @@
+"""
+Admission control for the HTTP API
+
+Requests are classified by path into endpoint classes. Each class can have
+a token-bucket rate limit, non-priority classes are also rate limited per
+device_id, and a global cap bounds in-flight requests with headroom
+reserved for priority classes. Requests over a limit are rejected at once
+with ``Retry-After`` instead of queueing, so latency stays bounded under
+overload. WebSocket traffic, including the /ws heartbeat, is never shed.
+"""
+from typing import Dict, Any, Optional, Sequence, Tuple
+from collections import OrderedDict
+import json
+import logging
+import math
+import re
+import threading
+import time
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+# First matching prefix wins; prefixes match whole path segments, so "/api/replay"
+# covers /api/replay and /api/replay/<id> but not /api/replays, and a "*" segment
+# matches any single segment. Alert listing stays in "query"; only analyst
+# status changes are priority.
+DEFAULT_CLASSES: Sequence[Tuple[str, Sequence[str]]] = (
+    ("exempt", ("/health", "/ws", "/api/admission", "/api/admin/")),
+    ("bulk", ("/api/replay", "/api/alerts/export", "/api/detection/history/aggregate")),
+    ("priority", ("/api/signature/", "/api/file/", "/api/enhanced/", "/api/alerts/*/status")),
+    ("detect", ("/api/trained-models/windows10-detect", "/api/trained-models/ml-detect", "/api/behavioral/",
+                "/api/encrypted/", "/api/social-engineering/", "/test-alert")),
+)
+DEFAULT_CLASS = "query"
+PRIORITY_CLASSES = ("priority",)
+
+# (rate per second, burst); None disables the class limit
+DEFAULT_CLASS_LIMITS: Dict[str, Optional[Tuple[float, float]]] = {
+    "priority": None,
+    "detect": (500.0, 1000.0),
+    "bulk": (2.0, 5.0),
+    "query": (200.0, 400.0)
+}
+
+_DEVICE_ID = re.compile(rb'"device_id"\s*:\s*"([^"\\]{1,128})"')
+_MAX_SNIFF_BYTES = 65536
+
+class TokenBucket:
+    """Classic token bucket; ``take`` returns 0 when admitted or the seconds until a token is available"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refund(self) -> None:
+        """Return a token taken for a request that was rejected later"""
+        self.tokens = min(self.burst, self.tokens + 1.0)
+
+    def take(self, now: float) -> float:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+class AdmissionController:
+    """
+    Decides whether a request may run
+
+    Args:
+        max_concurrency: Global cap on in-flight requests
+        priority_reserve: Slots of the cap only priority classes may use
+        device_rate: Requests per second allowed per device_id (non-priority classes)
+        device_burst: Bucket size per device_id
+        class_limits: (rate, burst) per endpoint class
+        max_devices: Device buckets kept; least recently used devices are forgotten
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 64,
+        priority_reserve: int = 8,
+        device_rate: float = 50.0,
+        device_burst: float = 100.0,
+        class_limits: Optional[Dict[str, Optional[Tuple[float, float]]]] = None,
+        classes: Sequence[Tuple[str, Sequence[str]]] = DEFAULT_CLASSES,
+        max_devices: int = 10000
+    ):
+        self.max_concurrency = max_concurrency
+        self.priority_reserve = min(priority_reserve, max_concurrency - 1)
+        self.device_rate = device_rate
+        self.device_burst = device_burst
+        self.classes = classes
+        self._segment_prefixes = [
+            (
+                name,
+                frozenset(p.rstrip("/") for p in prefixes if "*" not in p),
+                tuple(p.rstrip("/") + "/" for p in prefixes if "*" not in p),
+                [re.compile("".join("[^/]+" if part == "*" else re.escape(part)
+                                    for part in re.split(r"(\*)", p.rstrip("/"))) + "(?:/|$)")
+                 for p in prefixes if "*" in p]
+            )
+            for name, prefixes in classes
+        ]
+        self.max_devices = max_devices
+
+        now = time.monotonic()
+        limits = DEFAULT_CLASS_LIMITS if class_limits is None else class_limits
+        self.class_buckets = {
+            name: TokenBucket(limit[0], limit[1], now)
+            for name, limit in limits.items() if limit is not None
+        }
+        self.device_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+        self.admitted: Dict[str, int] = {}
+        self.shed: Dict[str, Dict[str, int]] = {}
+
+    def classify(self, path: str) -> str:
+        for name, exact, prefixes, patterns in self._segment_prefixes:
+            if path in exact or path.startswith(prefixes) or any(pattern.match(path) for pattern in patterns):
+                return name
+        return DEFAULT_CLASS
+
+    def _shed(self, endpoint_class: str, reason: str, retry_after: float) -> Tuple[bool, float, str]:
+        counts = self.shed.setdefault(endpoint_class, {})
+        counts[reason] = counts.get(reason, 0) + 1
+        return False, retry_after, reason
+
+    def admit(self, endpoint_class: str, device_id: Optional[str] = None) -> Tuple[bool, float, str]:
+        """
+        Try to admit a request; call ``release`` when an admitted request finishes
+
+        Returns:
+            (admitted, retry_after seconds, reason)
+        """
+        now = time.monotonic()
+        priority = endpoint_class in PRIORITY_CLASSES
+        with self.lock:
+            limit = self.max_concurrency if priority else self.max_concurrency - self.priority_reserve
+            if self.in_flight >= limit:
+                return self._shed(endpoint_class, "concurrency", 1.0)
+
+            bucket = self.class_buckets.get(endpoint_class)
+            if bucket is not None:
+                wait = bucket.take(now)
+                if wait:
+                    return self._shed(endpoint_class, "class_rate", wait)
+
+            if device_id and not priority:
+                device_bucket = self.device_buckets.get(device_id)
+                if device_bucket is None:
+                    device_bucket = self.device_buckets[device_id] = TokenBucket(self.device_rate, self.device_burst, now)
+                    if len(self.device_buckets) > self.max_devices:
+                        self.device_buckets.popitem(last=False)
+                else:
+                    self.device_buckets.move_to_end(device_id)
+                wait = device_bucket.take(now)
+                if wait:
+                    # A noisy device must not drain the class budget shared with other devices
+                    if bucket is not None:
+                        bucket.refund()
+                    return self._shed(endpoint_class, "device_rate", wait)
+
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self.admitted[endpoint_class] = self.admitted.get(endpoint_class, 0) + 1
+            return True, 0.0, "admitted"
+
+    def release(self) -> None:
+        with self.lock:
+            self.in_flight -= 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "max_concurrency": self.max_concurrency,
+                "priority_reserve": self.priority_reserve,
+                "tracked_devices": len(self.device_buckets),
+                "admitted": dict(self.admitted),
+                "shed": {name: dict(counts) for name, counts in self.shed.items()},
+                "shed_total": sum(sum(counts.values()) for counts in self.shed.values())
+            }
+
+def _header(scope: Dict[str, Any], name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying an AdmissionController to HTTP requests
+
+    The device is taken from the ``X-Device-ID`` header, the ``device_id``
+    query parameter, or a ``"device_id"`` field in small JSON bodies (the
+    body is sniffed, not parsed, and replayed to the application).
+    """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint_class = self.controller.classify(scope["path"])
+        if endpoint_class == "exempt":
+            await self.app(scope, receive, send)
+            return
+
+        device_id = _header(scope, b"x-device-id")
+        if device_id is None and b"device_id=" in scope.get("query_string", b""):
+            # Percent-decoded, so the same device is one bucket however its id was encoded
+            values = parse_qs(scope["query_string"].decode("latin-1")).get("device_id")
+            device_id = values[0][:128] if values else None
+        if device_id is None and scope["method"] in ("POST", "PUT", "PATCH") and endpoint_class not in PRIORITY_CLASSES:
+            length = _header(scope, b"content-length")
+            if length is not None and length.isdigit() and int(length) <= _MAX_SNIFF_BYTES:
+                receive, device_id = await self._sniff_device(receive)
+
+        admitted, retry_after, reason = self.controller.admit(endpoint_class, device_id)
+        if not admitted:
+            await self._reject(send, endpoint_class, reason, retry_after)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
+
+    async def _sniff_device(self, receive):
+        messages = []
+        body = b""
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+
+        match = _DEVICE_ID.search(body)
+
+        async def replay():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        return replay, match.group(1).decode("utf-8", "replace") if match else None
+
+    async def _reject(self, send, endpoint_class: str, reason: str, retry_after: float) -> None:
+        # Rate-limited clients get 429; a saturated server answers 503
+        status = 503 if reason == "concurrency" else 429
+        body = json.dumps({
+            "detail": "Server overloaded, retry later" if status == 503 else "Rate limit exceeded",
+            "reason": reason,
+            "endpoint_class": endpoint_class
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,242 @@
+from typing import Dict, Any, Optional, Callable, Awaitable, List
+from collections import deque
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+AlertHandler = Callable[[Any], Awaitable[None]]
+
+def _json_default(value: Any) -> Any:
+    # NumPy scalars and arrays from the detectors; anything else as text
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+class AlertBus:
+    """
+    Delivers every published alert to every worker, in one global order
+
+    Endpoints publish alerts; the handler passed to ``start`` stores and
+    broadcasts them. Because every worker applies the same ordered stream,
+    their alert stores and replay sequence numbers stay identical.
+    """
+
+    def __init__(self):
+        self.handler: Optional[AlertHandler] = None
+        self.stats = {
+            "published": 0,
+            "delivered": 0,
+            "errors": 0
+        }
+
+    async def start(self, handler: AlertHandler) -> None:
+        self.handler = handler
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, alert: Any) -> None:
+        raise NotImplementedError
+
+    async def _deliver(self, alert: Any) -> None:
+        try:
+            await self.handler(alert)
+            self.stats["delivered"] += 1
+        except Exception as e:
+            logger.error(f"Error handling alert {alert.get('id')} from bus: {e}")
+            self.stats["errors"] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {"backend": self.name, **self.stats}
+
+class InProcessAlertBus(AlertBus):
+    """Single-worker bus: publishing hands the alert straight to the handler"""
+
+    name = "in_process"
+
+    async def publish(self, alert: Any) -> None:
+        self.stats["published"] += 1
+        await self._deliver(alert)
+
+class UnixSocketAlertBus(AlertBus):
+    """
+    Multi-process bus over a Unix domain socket
+
+    Workers elect a hub by taking an exclusive ``flock`` on ``<path>.lock``.
+    The hub listens on ``path``, fixes the global order of alerts in the
+    order it receives them and fans each one out to every worker, itself
+    included. The others connect as clients. The lock is released when
+    the hub process dies, and the remaining workers re-run the election.
+    Alerts are newline-delimited JSON. A worker that stops reading is
+    disconnected once its unsent backlog exceeds ``max_peer_buffer`` bytes;
+    it reconnects like after a hub change.
+    """
+
+    name = "unix_socket"
+
+    def __init__(self, path: str, reconnect_delay: float = 0.5, max_peer_buffer: int = 4 * 1024 * 1024):
+        super().__init__()
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.reconnect_delay = reconnect_delay
+        self.max_peer_buffer = max_peer_buffer
+        self.is_hub = False
+        self.lock_fd: Optional[int] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.peers: List[asyncio.StreamWriter] = []
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.pending = deque()  # alerts published while no hub was reachable
+        self.inbox: asyncio.Queue = None
+        self.tasks: List[asyncio.Task] = []
+        self.stats.update({"hub_elections_won": 0, "reconnects": 0, "slow_peers_dropped": 0})
+
+    async def start(self, handler: AlertHandler) -> None:
+        await super().start(handler)
+        self.inbox = asyncio.Queue()
+        self.tasks.append(asyncio.create_task(self._consume()))
+        self.tasks.append(asyncio.create_task(self._run()))
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        for writer in self.peers + ([self.writer] if self.writer else []):
+            writer.close()
+        if self.server is not None:
+            self.server.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        if self.lock_fd is not None:
+            os.close(self.lock_fd)
+            self.lock_fd = None
+
+    async def publish(self, alert: Any) -> None:
+        self.stats["published"] += 1
+        if hasattr(alert, "to_dict"):
+            alert = alert.to_dict()
+        line = (json.dumps(alert, default=_json_default) + "\n").encode()
+        if self.is_hub:
+            self._fanout(line)
+        elif self.writer is not None and not self.writer.is_closing():
+            self.writer.write(line)
+            await self.writer.drain()
+        else:
+            self.pending.append(line)
+
+    def _try_lock(self) -> bool:
+        import fcntl
+        fd = os.open(self.lock_path, os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self.lock_fd = fd
+        return True
+
+    async def _run(self) -> None:
+        """Become the hub if the lock is free, otherwise stay connected to it"""
+        while True:
+            if self._try_lock():
+                await self._serve()
+                return
+            try:
+                reader, self.writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                # Hub is still starting up or a new election is in progress
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+
+            logger.info(f"Alert bus connected to hub at {self.path}")
+            while self.pending:
+                self.writer.write(self.pending.popleft())
+            await self.writer.drain()
+
+            await self._read_lines(reader)
+            self.writer = None
+            self.stats["reconnects"] += 1
+            logger.warning("Alert bus lost its hub, re-running election")
+
+    async def _serve(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._handle_peer, path=self.path)
+        self.is_hub = True
+        self.stats["hub_elections_won"] += 1
+        logger.info(f"Alert bus hub listening on {self.path} (pid {os.getpid()})")
+        while self.pending:
+            self._fanout(self.pending.popleft())
+
+    async def _handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.peers.append(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._fanout(line)
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            # Peer went away or the hub is shutting down
+            pass
+        finally:
+            self.peers.remove(writer)
+            writer.close()
+
+    def _fanout(self, line: bytes) -> None:
+        """Deliver one alert to every worker; called only on the hub, so order is global"""
+        for writer in self.peers:
+            if writer.is_closing():
+                continue
+            if writer.transport.get_write_buffer_size() > self.max_peer_buffer:
+                # Never drained by this worker; buffering more would grow without bound
+                logger.warning(f"Alert bus peer not reading, disconnecting after "
+                               f"{writer.transport.get_write_buffer_size()} buffered bytes")
+                self.stats["slow_peers_dropped"] += 1
+                writer.transport.abort()
+                continue
+            writer.write(line)
+        self.inbox.put_nowait(line)
+
+    async def _read_lines(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            try:
+                line = await reader.readline()
+            except (ConnectionError, OSError):
+                return
+            if not line:
+                return
+            self.inbox.put_nowait(line)
+
+    async def _consume(self) -> None:
+        """Apply alerts one at a time so the handler sees them in bus order"""
+        while True:
+            line = await self.inbox.get()
+            try:
+                alert = json.loads(line)
+            except ValueError:
+                self.stats["errors"] += 1
+                continue
+            await self._deliver(alert)
+
+def create_alert_bus(backend: str = None, path: str = None) -> AlertBus:
+    """
+    Create the alert bus configured for this deployment
+
+    Args:
+        backend: "in_process" (default) or "unix_socket"; defaults to the
+                 ALERT_BUS environment variable
+        path: Socket path for the unix_socket bus; defaults to ALERT_BUS_PATH
+    """
+    backend = backend or os.getenv("ALERT_BUS", "in_process")
+    if backend == "unix_socket":
+        path = path or os.getenv("ALERT_BUS_PATH", "/tmp/neuroscan-alerts.sock")
+        max_peer_buffer = int(os.getenv("ALERT_BUS_MAX_PEER_BUFFER", str(4 * 1024 * 1024)))
+        return UnixSocketAlertBus(path, max_peer_buffer=max_peer_buffer)
+    if backend != "in_process":
+        logger.warning(f"Unknown alert bus backend {backend!r}, using in_process")
+    return InProcessAlertBus()
@@ -0,0 +1,157 @@
+from typing import Dict, Any, Optional
+from datetime import datetime
+import sys
+import uuid
+
+# Fields with a small set of recurring values; interning makes every alert share one copy
+INTERNED_FIELDS = ("threat_type", "severity", "status", "device_id", "detection_method")
+
+def _intern(value: Any) -> str:
+    return sys.intern(str(value))
+
+class Alert:
+    """
+    Compact alert record
+
+    Slotted so an alert carries no per-instance ``__dict__``; enum-like
+    fields are interned. Supports ``alert[key]`` and ``alert.get(key)`` so
+    code written against the old dict alerts keeps working, and
+    ``to_dict`` produces the wire shape sent to API and WebSocket clients.
+    """
+
+    __slots__ = (
+        "id", "threat_type", "severity", "timestamp", "status", "device_id",
+        "description", "detection_method", "confidence", "metrics"
+    )
+
+    def __init__(
+        self,
+        id: str,
+        threat_type: str,
+        severity: str,
+        timestamp: str,
+        status: str,
+        device_id: str,
+        description: str,
+        detection_method: str,
+        confidence: float,
+        metrics: Optional[Dict[str, Any]] = None
+    ):
+        self.id = id
+        self.threat_type = _intern(threat_type)
+        self.severity = _intern(severity)
+        self.timestamp = timestamp
+        self.status = _intern(status)
+        self.device_id = _intern(device_id)
+        self.description = description
+        self.detection_method = _intern(detection_method)
+        self.confidence = float(confidence)
+        self.metrics = metrics
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = getattr(self, key, None) if isinstance(key, str) else None
+        return default if value is None else value
+
+    def __repr__(self) -> str:
+        return f"Alert(id={self.id!r}, threat_type={self.threat_type!r}, severity={self.severity!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize to the wire shape used by the API and WebSocket feed"""
+        data = {
+            "id": self.id,
+            "threat_type": self.threat_type,
+            "severity": self.severity,
+            "timestamp": self.timestamp,
+            "status": self.status,
+            "device_id": self.device_id,
+            "description": self.description,
+            "detection_method": self.detection_method,
+            "confidence": self.confidence
+        }
+        if self.metrics is not None:
+            data["metrics"] = self.metrics
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Alert":
+        """Rebuild an alert from its wire shape, e.g. when received over the alert bus"""
+        return cls(
+            id=data["id"],
+            threat_type=data.get("threat_type", "unknown"),
+            severity=data.get("severity", "medium"),
+            timestamp=data["timestamp"],
+            status=data.get("status", "open"),
+            device_id=data.get("device_id", "unknown"),
+            description=data.get("description", "No description provided"),
+            detection_method=data.get("detection_method", "unknown"),
+            confidence=data.get("confidence", 0.0),
+            metrics=data.get("metrics")
+        )
+
+def create_alert(
+    threat_type: str,
+    severity: str,
+    device_id: str,
+    description: str,
+    detection_method: str,
+    confidence: float = 0.0,
+    metrics: Optional[Dict[str, Any]] = None,
+    status: str = "open"
+) -> Alert:
+    """Create a new open alert with a fresh id and timestamp"""
+    return Alert(
+        id=str(uuid.uuid4()),
+        threat_type=threat_type,
+        severity=severity,
+        timestamp=datetime.now().isoformat(),
+        status=status,
+        device_id=device_id,
+        description=description,
+        detection_method=detection_method,
+        confidence=confidence,
+        metrics=metrics
+    )
+
+# Memory benchmark
+if __name__ == "__main__":
+    import tracemalloc
+
+    count = 100000
+    methods = ["signature", "behavioral", "encrypted", "ml_model", "trained_model"]
+
+    def build_dict(i):
+        # Mirrors how endpoints used to build alerts: shared literals, formatted device ids
+        return {
+            "id": str(uuid.uuid4()),
+            "threat_type": "Signature Match",
+            "severity": "high",
+            "timestamp": datetime.now().isoformat(),
+            "status": "open",
+            "device_id": f"device-{i % 50}",
+            "description": f"Signature-based threat detected: {i}",
+            "detection_method": methods[i % len(methods)],
+            "confidence": 0.9,
+            "metrics": {"threat_count": 1}
+        }
+
+    def measure(factory):
+        tracemalloc.start()
+        kept = [factory(i) for i in range(count)]
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return size / len(kept)
+
+    dict_bytes = measure(build_dict)
+    alert_bytes = measure(lambda i: Alert.from_dict(build_dict(i)))
+
+    print(f"dict alert:    {dict_bytes:8.1f} bytes/alert")
+    print(f"slotted Alert: {alert_bytes:8.1f} bytes/alert")
+    print(f"saving:        {dict_bytes - alert_bytes:8.1f} bytes/alert "
+          f"({(1 - alert_bytes / dict_bytes) * 100:.0f}%, "
+          f"{(dict_bytes - alert_bytes) * 1_000_000 / 2**20:.0f} MiB per 1M alerts)")
@@ -0,0 +1,149 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, Callable, Iterator
+import base64
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sorts after any alert id, so (timestamp, _MAX_ID) bounds every alert at that timestamp
+_MAX_ID = "\uffff"
+
+def to_epoch(value: str) -> float:
+    """
+    Parse an ISO-8601 timestamp into UTC epoch seconds
+
+    Timestamps without an offset are local time, as alerts are stamped.
+
+    Raises:
+        ValueError: If the timestamp cannot be parsed
+    """
+    return datetime.fromisoformat(value).timestamp()
+
+def encode_cursor(key: Tuple[float, str]) -> str:
+    """Encode a (timestamp, id) key as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """
+    Decode an opaque cursor back into its (timestamp, id) key
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        timestamp, alert_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        # Cursors issued before keys were epochs carry the ISO timestamp
+        timestamp = to_epoch(timestamp) if isinstance(timestamp, str) else float(timestamp)
+        return timestamp, str(alert_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+class AlertStore:
+    """
+    Alerts kept sorted by (timestamp, id), the timestamp as UTC epoch seconds
+
+    Comparing epochs rather than ISO strings keeps ranges correct for
+    timestamps with any UTC offset. The sorted key list doubles as the time index: range bounds and cursor
+    positions are binary searches, so a page costs O(log n + limit) no
+    matter how deep it is, and pages stay stable while new alerts arrive.
+    """
+
+    def __init__(self):
+        self.keys: List[Tuple[float, str]] = []
+        self.items: List[Dict[str, Any]] = []
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, alert: Dict[str, Any]) -> None:
+        key = (to_epoch(alert["timestamp"]), alert["id"])
+        if not self.keys or key >= self.keys[-1]:
+            self.keys.append(key)
+            self.items.append(alert)
+        else:
+            # Late arrival, keep the index sorted
+            pos = bisect_right(self.keys, key)
+            self.keys.insert(pos, key)
+            self.items.insert(pos, alert)
+        self.by_id[alert["id"]] = alert
+
+    def get(self, alert_id: str) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(alert_id)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Iterate alerts newest first"""
+        return reversed(self.items)
+
+    def latest(self, limit: int) -> List[Dict[str, Any]]:
+        """Get the newest ``limit`` alerts, newest first"""
+        return self.items[:-limit - 1:-1] if limit > 0 else []
+
+    def _bounds(self, since: Optional[float], until: Optional[float]) -> Tuple[int, int]:
+        """Index range of alerts with since <= timestamp <= until"""
+        lo = bisect_left(self.keys, (since,)) if since is not None else 0
+        hi = bisect_right(self.keys, (until, _MAX_ID)) if until is not None else len(self.keys)
+        return lo, hi
+
+    def page(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+        offset: int = 0
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Get one page of alerts, newest first
+
+        Args:
+            limit: Maximum number of alerts to return
+            cursor: Opaque cursor from a previous page; only older alerts are returned
+            since: Inclusive lower bound in epoch seconds
+            until: Inclusive upper bound in epoch seconds
+            predicate: Optional filter applied to each alert
+            offset: Number of matching alerts to skip (legacy paging)
+
+        Returns:
+            Tuple of the page and the cursor for the next page (None when exhausted)
+        """
+        lo, hi = self._bounds(since, until)
+        if cursor:
+            hi = min(hi, bisect_left(self.keys, decode_cursor(cursor)))
+
+        page = []
+        i = hi - 1
+        while i >= lo and len(page) < limit:
+            alert = self.items[i]
+            if predicate is None or predicate(alert):
+                if offset > 0:
+                    offset -= 1
+                else:
+                    page.append(alert)
+            i -= 1
+
+        next_cursor = None
+        if len(page) == limit and i >= lo:
+            next_cursor = encode_cursor(self.keys[i + 1])
+        return page, next_cursor
+
+    def iter_range(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        predicate: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily iterate alerts in a time range, oldest first
+
+        The range is copied (references only) when called, so callers may
+        await between items while new alerts are inserted.
+        """
+        lo, hi = self._bounds(since, until)
+        items = self.items[lo:hi]
+        if predicate is None:
+            return iter(items)
+        return (alert for alert in items if predicate(alert))
@@ -0,0 +1,58 @@
+from collections import deque
+from itertools import islice
+from typing import Dict, Any, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AlertReplayLog:
+    """Bounded log of sequenced alert events used to resume WebSocket clients"""
+
+    def __init__(self, maxlen: int = 1000):
+        self.seq = 0
+        self.events = deque(maxlen=maxlen)
+        self.stats = {
+            "appended": 0,
+            "deltas_served": 0,
+            "snapshots_served": 0
+        }
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest event still held in the log"""
+        if not self.events:
+            return self.seq + 1
+        return self.events[0]["seq"]
+
+    def append(self, event_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Stamp an event with the next sequence number and record it"""
+        self.seq += 1
+        event = {
+            "type": event_type,
+            "seq": self.seq,
+            "data": data
+        }
+        self.events.append(event)
+        self.stats["appended"] += 1
+        return event
+
+    def since(self, seq: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Get the events a client missed after ``seq``
+
+        Args:
+            seq: Last sequence number the client has applied
+
+        Returns:
+            List of events newer than ``seq`` (possibly empty), or None when
+            the client is too far behind (or ahead, e.g. after a server
+            restart) and needs a full snapshot instead
+        """
+        if seq > self.seq or seq < self.first_seq - 1:
+            self.stats["snapshots_served"] += 1
+            return None
+
+        self.stats["deltas_served"] += 1
+        # Events are contiguous, so the offset into the deque is known
+        start = seq - self.first_seq + 1
+        return list(islice(self.events, start, None))
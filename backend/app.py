@@ -5,10 +5,12 @@ sys.path.append(os.path.dirname(__file__))
 Enhanced NeuralShield Backend
 Integrates all advanced threat detection modules
 """
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, status, BackgroundTasks, Query, Request
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, status, BackgroundTasks, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from typing import List, Dict, Any, Optional
 import uuid
+import hmac
 import json
 import time 
 import asyncio
@@ -17,8 +19,28 @@ import logging
 import os
 
 from collections import deque
+from itertools import islice
 from pydantic import BaseModel
 
+from alert_stream import AlertReplayLog
+from alert_store import AlertStore, to_epoch
+from alert_bus import create_alert_bus
+from alert_model import Alert, create_alert
+from subscriptions import SubscriptionIndex, Subscription, compile_subscription, FILTER_FIELDS
+from telemetry_collector import TelemetryCollector, PSUTIL_AVAILABLE
+from adaptive_scheduler import AdaptiveScorer
+from shared_models import SharedModelRegistry, SharedWindows10Model
+from calibration import OnlineCalibrator
+from detection_history import DetectionHistory, BUCKETS as HISTORY_BUCKETS
+from admission import AdmissionController, AdmissionMiddleware
+from fingerprint_index import FingerprintIndex, extract_indicators, merge_matches
+from social_engineering import SocialEngineeringEngine
+from hash_reputation import HashReputation, create_lookup
+from profiler import StackSampler, LoopLagMonitor, collapsed, top_frames
+from correlation import AlertCorrelator, load_correlation_spec
+from ws_heartbeat import HeartbeatScheduler
+from replay import replay, create_sink, ReplayProgress, FlowScorer, Windows10Scorer, MODES as REPLAY_MODES, FORMATS as REPLAY_FORMATS
+
 # Setup logging first
 logging.basicConfig(
     level=logging.INFO,
@@ -33,7 +55,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 # Import the trained Windows10 threat detector
 try:
     from models.windows10_threat_detector import Windows10ThreatDetector
-    from ml_model import ThreatDetectionModel
+    from ml_model import ThreatDetectionModel, process_data
     TRAINED_MODELS_AVAILABLE = True
     logger.info("Trained models loaded successfully")
 except ImportError as e:
@@ -69,6 +91,17 @@ except ImportError as e:
 # Create FastAPI app
 app = FastAPI(title="Enhanced NeuroScan - Advanced Threat Detection API")
 
+# Admission control: per-device and per-endpoint-class token buckets plus a global
+# in-flight cap; added before CORS so rejections still carry CORS headers
+admission = AdmissionController(
+    max_concurrency=int(os.getenv('ADMISSION_MAX_CONCURRENCY', '64')),
+    priority_reserve=int(os.getenv('ADMISSION_PRIORITY_RESERVE', '8')),
+    device_rate=float(os.getenv('ADMISSION_DEVICE_RATE', '50')),
+    device_burst=float(os.getenv('ADMISSION_DEVICE_BURST', '100'))
+) if os.getenv('ADMISSION_CONTROL', '1') == '1' else None
+if admission is not None:
+    app.add_middleware(AdmissionMiddleware, controller=admission)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -79,19 +112,78 @@ app.add_middleware(
 )
 
 # Initialize trained models
+shared_registry = None
 if TRAINED_MODELS_AVAILABLE:
+    # The two models are independent; one failing to load must not disable the other
     try:
-        windows10_detector = Windows10ThreatDetector()
-        ml_model = ThreatDetectionModel()
-        logger.info("Trained models initialized successfully")
+        # MODEL_SERVING=shared attaches to models published by shared_models.py instead of loading per worker
+        shared_registry = SharedModelRegistry() if os.getenv('MODEL_SERVING', 'local') == 'shared' else None
+        if shared_registry is not None and shared_registry.available('windows10'):
+            windows10_detector = Windows10ThreatDetector.from_shared(SharedWindows10Model(shared_registry))
+        else:
+            windows10_detector = Windows10ThreatDetector(allow_pickle=os.getenv('ALLOW_PICKLE_MODELS', '0') == '1')
+        logger.info("Windows10 threat detector initialized successfully")
+    except ValueError as e:
+        # Legacy pickled scaler refused; only this detector is turned off
+        logger.error(f"Windows10 threat detector disabled: {e} "
+                     f"(or set ALLOW_PICKLE_MODELS=1 if the file is trusted)")
+        windows10_detector = None
     except Exception as e:
-        logger.error(f"Failed to initialize trained models: {e}")
+        logger.error(f"Failed to initialize Windows10 threat detector: {e}")
         windows10_detector = None
+    try:
+        ml_model = ThreatDetectionModel(memo_size=int(os.getenv('ML_MEMO_SIZE', '0')))
+        logger.info("Flow threat model initialized successfully")
+    except Exception as e:
+        logger.error(f"Failed to initialize flow threat model: {e}")
         ml_model = None
 else:
     windows10_detector = None
     ml_model = None
 
+# Bundle the flow model's parameters were last loaded from (MODEL_SERVING=shared)
+shared_threat_bundle = None
+
+def sync_shared_threat_model() -> None:
+    """Load the flow model's parameters from a newly published threat_model segment"""
+    global shared_threat_bundle
+    if shared_registry is None or ml_model is None or not shared_registry.available('threat_model'):
+        return
+    bundle = shared_registry.get('threat_model')
+    if bundle is not shared_threat_bundle:
+        shared_threat_bundle = bundle
+        ml_model.load_model(bundle.path)
+        logger.info(f"Flow model parameters loaded from shared threat_model v{bundle.metadata.get('version')}")
+
+sync_shared_threat_model()
+
+# Online threshold/weight calibration for the flow model. Sketches are per worker;
+# applied thresholds go over the alert bus so every worker's model uses the same values
+calibrator = OnlineCalibrator(
+    ml_model,
+    auto_apply_every=int(os.getenv('ML_CALIBRATION_APPLY_EVERY', '0')),
+    publisher=lambda changes: publish_control_soon("calibration.apply", changes=changes)
+) if ml_model is not None else None
+
+# Change-triggered scoring: unchanged device samples reuse the last verdict
+adaptive_scorer = AdaptiveScorer(
+    windows10_detector,
+    base_interval=float(os.getenv('TELEMETRY_INTERVAL', '5')),
+    max_devices=int(os.getenv('ADAPTIVE_MAX_DEVICES', '10000'))
+) if windows10_detector is not None else None
+
+# Local telemetry collector feeding the Windows10 detector in batches (opt-in)
+telemetry_collector = None
+if adaptive_scorer is not None and PSUTIL_AVAILABLE and os.getenv('TELEMETRY_COLLECTOR', '0') == '1':
+    try:
+        telemetry_collector = TelemetryCollector(
+            adaptive_scorer,
+            interval=float(os.getenv('TELEMETRY_INTERVAL', '5')),
+            batch_size=int(os.getenv('TELEMETRY_BATCH_SIZE', '12'))
+        )
+    except Exception as e:
+        logger.error(f"Failed to initialize telemetry collector: {e}")
+
 # Initialize enhanced threat detector
 if ENHANCED_MODULES_AVAILABLE:
     enhanced_detector = EnhancedThreatDetector({
@@ -104,11 +196,56 @@ if ENHANCED_MODULES_AVAILABLE:
 else:
     enhanced_detector = None
 
+# Compiled TLS fingerprint IOCs, shared by all workers and rebuilt on reload
+fingerprint_index = None
+if os.getenv('FINGERPRINT_INDEX', '1') == '1':
+    try:
+        fingerprint_index = FingerprintIndex(
+            ioc_dir=os.getenv('FINGERPRINT_IOC_DIR', os.path.join(os.path.dirname(__file__), 'ioc')),
+            registry=shared_registry or SharedModelRegistry()
+        )
+        fingerprint_index.ensure_loaded()
+    except Exception as e:
+        logger.error(f"Failed to initialize fingerprint index: {e}")
+        fingerprint_index = None
+
+# Known-good / known-bad hash sets checked before the signature scanners
+hash_reputation = None
+if os.getenv('HASH_REPUTATION', '1') == '1':
+    try:
+        hash_reputation = HashReputation(
+            hash_dir=os.getenv('HASH_REPUTATION_DIR', os.path.join(os.path.dirname(__file__), 'hashes')),
+            registry=shared_registry or SharedModelRegistry(),
+            lookup=create_lookup()
+        )
+        hash_reputation.ensure_loaded()
+    except Exception as e:
+        logger.error(f"Failed to initialize hash reputation: {e}")
+        hash_reputation = None
+
+# Compiled phrase/domain engine for social-engineering detection
+try:
+    social_engine = SocialEngineeringEngine()
+except Exception as e:
+    logger.error(f"Failed to initialize social-engineering engine: {e}")
+    social_engine = None
+
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}
         self.connection_timestamps: Dict[str, datetime] = {}
+        self.subscriptions = SubscriptionIndex()
+        # Newest replay seq each client should have seen; filtered clients skip the seqs of other alerts
+        self.sent_seq: Dict[str, int] = {}
+        # Server pings idle clients and reaps dead ones from one timer-wheel task
+        self.heartbeat = HeartbeatScheduler(
+            idle_timeout=float(os.getenv('WS_IDLE_TIMEOUT', '45')),
+            pong_timeout=float(os.getenv('WS_PONG_TIMEOUT', '15')),
+            tick=float(os.getenv('WS_HEARTBEAT_TICK', '1')),
+            on_reap=self.disconnect,
+            ping_payload=lambda: {"seq": replay_log.seq}
+        )
         self.stats = {
             "total_connections": 0,
             "total_disconnections": 0,
@@ -116,7 +253,7 @@ class ConnectionManager:
             "errors": 0
         }
 
-    async def connect(self, websocket: WebSocket, client_id: str = None):
+    async def connect(self, websocket: WebSocket, client_id: str = None, subscription: Subscription = None):
         try:
             await websocket.accept()
             
@@ -125,6 +262,8 @@ class ConnectionManager:
                 
             self.active_connections[client_id] = websocket
             self.connection_timestamps[client_id] = datetime.now()
+            self.subscriptions.add(client_id, subscription)
+            self.heartbeat.add(client_id, websocket)
             self.stats["total_connections"] += 1
             
             logger.info(f"Client connected: {client_id} - Now {len(self.active_connections)} active connections")
@@ -139,6 +278,9 @@ class ConnectionManager:
         if client_id in self.active_connections:
             self.active_connections.pop(client_id, None)
             self.connection_timestamps.pop(client_id, None)
+            self.sent_seq.pop(client_id, None)
+            self.subscriptions.remove(client_id)
+            self.heartbeat.remove(client_id)
             self.stats["total_disconnections"] += 1
             
             if client_id in self.connection_timestamps:
@@ -147,11 +289,26 @@ class ConnectionManager:
             else:
                 logger.info(f"Client disconnected: {client_id}")
 
-    async def broadcast(self, message: str):
+    def subscribe(self, client_id: str, subscription: Subscription):
+        if client_id in self.active_connections:
+            self.subscriptions.add(client_id, subscription)
+            logger.info(f"Client {client_id} subscribed with filters {subscription.to_dict()}")
+
+    async def broadcast(self, message: str, alert: Dict[str, Any] = None, seq: Optional[int] = None):
         disconnected_clients = []
         self.stats["messages_sent"] += 1
         
-        for client_id, connection in self.active_connections.items():
+        # Alerts only go to clients whose subscription matches
+        if alert is not None:
+            targets = [(client_id, self.active_connections[client_id])
+                       for client_id in self.subscriptions.match(alert)
+                       if client_id in self.active_connections]
+        else:
+            targets = list(self.active_connections.items())
+        
+        for client_id, connection in targets:
+            if seq is not None:
+                self.sent_seq[client_id] = seq
             try:
                 await connection.send_text(message)
             except Exception as e:
@@ -162,7 +319,7 @@ class ConnectionManager:
         for client_id in disconnected_clients:
             self.disconnect(client_id)
             
-        return len(self.active_connections) - len(disconnected_clients)
+        return len(targets) - len(disconnected_clients)
 
 manager = ConnectionManager()
 
@@ -176,6 +333,12 @@ class ThreatDetectionRequest(BaseModel):
 class SignatureDetectionRequest(BaseModel):
     file_path: str
 
+class SignatureBatchRequest(BaseModel):
+    file_paths: List[str]
+
+class HashLookupRequest(BaseModel):
+    hashes: List[str]
+
 class FileAnalysisRequest(BaseModel):
     file_path: str
 
@@ -185,48 +348,149 @@ class BehavioralAnalysisRequest(BaseModel):
 class EncryptedThreatRequest(BaseModel):
     network_data: Dict[str, Any]
 
+class FingerprintLookupRequest(BaseModel):
+    indicators: List[Dict[str, str]]
+
 class SocialEngineeringRequest(BaseModel):
     communication_data: Dict[str, Any]
 
+class SocialEngineeringBatchRequest(BaseModel):
+    messages: List[Dict[str, Any]]
+
+class AlertStatusUpdate(BaseModel):
+    status: str
+
+class ReplayRequest(BaseModel):
+    inputs: List[str]
+    output: str
+    mode: str = "flows"
+    format: str = "ndjson"
+    workers: int = 0
+    batch_size: int = 5000
+
+# Statuses an analyst can set; see calibration.FEEDBACK_LABELS for those that train the model
+ALERT_STATUSES = ("open", "investigating", "confirmed", "resolved", "false_positive")
+
 # In-memory storage
-alerts = []
+alert_store = AlertStore()
 alert_history = deque(maxlen=1000)
-threat_detection_history = deque(maxlen=1000)
+detection_history = DetectionHistory(
+    raw_retention=float(os.getenv('HISTORY_RAW_RETENTION', str(7 * 86400))),
+    rollup_retention=float(os.getenv('HISTORY_ROLLUP_RETENTION', str(180 * 86400)))
+)
+
+# Event-loop stall detection (started with the app)
+loop_lag_monitor = LoopLagMonitor(
+    threshold=float(os.getenv('LOOP_LAG_THRESHOLD_MS', '100')) / 1000.0
+) if os.getenv('LOOP_LAG_MONITOR', '1') == '1' else None
+
+# Per-device alert correlation; incidents are broadcast instead of raw alerts
+correlator = None
+if os.getenv('CORRELATION', '1') == '1':
+    try:
+        correlator = AlertCorrelator(max_devices=int(os.getenv('CORRELATION_MAX_DEVICES', '10000')))
+    except Exception as e:
+        logger.error(f"Failed to initialize alert correlation: {e}")
+
+# Sequenced replay log so reconnecting WebSocket clients only receive what they missed
+replay_log = AlertReplayLog(maxlen=int(os.getenv('WS_REPLAY_LOG_SIZE', '1000')))
+
+# Shared alert bus so every worker stores and broadcasts every alert, in order
+alert_bus = create_alert_bus()
 
 # Helper functions
-async def broadcast_alert(alert):
-    try:
-        logger.info(f"Broadcasting alert to {len(manager.active_connections)} clients: {alert['threat_type']}")
-        
-        formatted_alert = {
-            "id": alert["id"],
-            "threat_type": alert["threat_type"],
-            "severity": alert["severity"],
-            "timestamp": alert["timestamp"],
-            "status": alert.get("status", "open"),
-            "device_id": alert.get("device_id", "unknown"),
-            "description": alert.get("description", "No description provided"),
-            "detection_method": alert.get("detection_method", "unknown"),
-            "confidence": alert.get("confidence", 0.0)
-        }
-        
-        if "metrics" in alert:
-            formatted_alert["metrics"] = alert["metrics"]
+async def publish_alert(alert: Alert):
+    """Publish a new alert to all workers through the alert bus"""
+    await alert_bus.publish(alert)
+
+async def publish_control(action: str, **args):
+    """Publish a state change every worker must apply, in bus order with the alerts"""
+    await alert_bus.publish({"control": action, **args})
+
+# Control messages published from synchronous code; referenced until sent
+control_tasks = set()
+
+def publish_control_soon(action: str, **args):
+    task = asyncio.get_running_loop().create_task(publish_control(action, **args))
+    control_tasks.add(task)
+    task.add_done_callback(control_tasks.discard)
+
+def apply_control(message: Dict[str, Any]):
+    """Apply a control message delivered by the alert bus"""
+    action = message["control"]
+    if action == "calibration.apply":
+        if calibrator is not None:
+            calibrator.apply_changes(message["changes"])
+    elif action == "correlation.reload":
+        if correlator is not None:
+            correlator.reload(spec=message["spec"])
+    else:
+        logger.warning(f"Ignoring unknown control message {action!r} from the alert bus")
+
+def alert_status(alert_id: str) -> Optional[str]:
+    alert = alert_store.get(alert_id)
+    return alert.status if alert is not None else None
+
+async def apply_alert(alert):
+    """Store and broadcast an alert delivered by the alert bus"""
+    if isinstance(alert, dict):
+        if "control" in alert:
+            apply_control(alert)
+            return
+        alert = Alert.from_dict(alert)
+    
+    # A known id carries an analyst status change
+    existing = alert_store.get(alert.id)
+    if existing is not None:
+        if existing.status != alert.status:
+            previous_status, existing.status = existing.status, alert.status
+            if calibrator is not None and existing.detection_method == "ml_model":
+                calibrator.feedback(existing.metrics or {}, existing.status, previous_status)
+            # Dashboards show incidents when correlating, so the change goes out as an incident update
+            incident = correlator.update_status(existing, alert_status) if correlator is not None else None
+            if incident is not None:
+                await broadcast_incident(incident, existing)
+            else:
+                await broadcast_alert(existing, event_type="alert_update")
+        return
+    
+    alert_store.add(alert)
+    alert_history.append(alert)
+    detection_history.record_alert(alert)
+    if correlator is not None:
+        await broadcast_incident(correlator.observe(alert).to_dict(), alert)
+    else:
+        await broadcast_alert(alert)
+
+async def broadcast_alert(alert: Alert, event_type: str = "alert"):
+    """Broadcast a new alert, or with ``event_type="alert_update"`` a change to a known one"""
+    try:
+        logger.info(f"Broadcasting {event_type} to {len(manager.active_connections)} clients: {alert.threat_type}")
         
-        message = {
-            "type": "alert", 
-            "data": formatted_alert
-        }
+        formatted_alert = alert.to_dict()
+        message = replay_log.append(event_type, formatted_alert)
         
         json_message = json.dumps(message)
-        active_clients = await manager.broadcast(json_message)
+        active_clients = await manager.broadcast(json_message, formatted_alert, message["seq"])
         
-        logger.info(f"Successfully broadcasted alert {alert['id']} to {active_clients} clients")
+        logger.info(f"Successfully broadcasted alert {alert.id} (seq {message['seq']}) to {active_clients} clients")
         return True
     except Exception as e:
         logger.error(f"Error broadcasting alert: {e}")
         return False
 
+async def broadcast_incident(incident: Dict[str, Any], alert: Alert):
+    """Broadcast an incident update to the clients subscribed to the alert that caused it"""
+    try:
+        message = replay_log.append("incident", incident)
+        active_clients = await manager.broadcast(json.dumps(message), alert.to_dict(), message["seq"])
+        logger.info(f"Broadcasted incident {incident['id']} ({incident['metrics']['alert_count']} alerts, "
+                    f"seq {message['seq']}) to {active_clients} clients")
+        return True
+    except Exception as e:
+        logger.error(f"Error broadcasting incident: {e}")
+        return False
+
 # API Endpoints
 @app.get("/")
 async def root():
@@ -259,33 +523,23 @@ async def enhanced_threat_detection(request: ThreatDetectionRequest):
         # Run comprehensive detection
         detection_result = enhanced_detector.detect_threats(data)
         
-        # Store in history
-        threat_detection_history.append(detection_result)
-        
         # Create alert if threats detected
         if detection_result.get("threats_detected"):
-            alert_data = {
-                "id": str(uuid.uuid4()),
-                "threat_type": "Enhanced Threat Detection",
-                "severity": detection_result.get("threat_level", "medium").lower(),
-                "timestamp": datetime.now().isoformat(),
-                "status": "open",
-                "device_id": "enhanced-detector",
-                "description": f"Enhanced threat detection found {len(detection_result['threats_detected'])} threats",
-                "detection_method": "ensemble",
-                "confidence": detection_result.get("confidence", 0.0),
-                "metrics": {
+            alert_data = create_alert(
+                threat_type="Enhanced Threat Detection",
+                severity=detection_result.get("threat_level", "medium").lower(),
+                device_id="enhanced-detector",
+                description=f"Enhanced threat detection found {len(detection_result['threats_detected'])} threats",
+                detection_method="ensemble",
+                confidence=detection_result.get("confidence", 0.0),
+                metrics={
                     "threat_count": len(detection_result["threats_detected"]),
                     "threat_types": detection_result.get("threat_types", []),
                     "overall_risk_score": detection_result.get("overall_risk_score", 0.0)
                 }
-            }
+            )
             
-            alerts.insert(0, alert_data)
-            alert_history.append(alert_data)
-            
-            # Broadcast alert
-            await broadcast_alert(alert_data)
+            await publish_alert(alert_data)
         
         return {
             "status": "success",
@@ -321,24 +575,17 @@ async def advanced_threat_detection(request: ThreatDetectionRequest):
         # Create alerts for advanced threats
         if advanced_result.get("advanced_threats"):
             for threat in advanced_result["advanced_threats"]:
-                alert_data = {
-                    "id": str(uuid.uuid4()),
-                    "threat_type": threat["type"],
-                    "severity": "high",
-                    "timestamp": datetime.now().isoformat(),
-                    "status": "open",
-                    "device_id": "advanced-detector",
-                    "description": f"Advanced threat detected: {threat['type']}",
-                    "detection_method": "advanced",
-                    "confidence": threat.get("confidence", 0.0),
-                    "metrics": threat.get("indicators", {})
-                }
+                alert_data = create_alert(
+                    threat_type=threat["type"],
+                    severity="high",
+                    device_id="advanced-detector",
+                    description=f"Advanced threat detected: {threat['type']}",
+                    detection_method="advanced",
+                    confidence=threat.get("confidence", 0.0),
+                    metrics=threat.get("indicators", {})
+                )
                 
-                alerts.insert(0, alert_data)
-                alert_history.append(alert_data)
-                
-                # Broadcast alert
-                await broadcast_alert(alert_data)
+                await publish_alert(alert_data)
         
         return {
             "status": "success",
@@ -350,40 +597,135 @@ async def advanced_threat_detection(request: ThreatDetectionRequest):
         logger.error(f"Error in advanced threat detection: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def signature_alert(result: Dict[str, Any]) -> Alert:
+    return create_alert(
+        threat_type=result.get("threat_type", "Signature Match"),
+        severity="high" if result.get("confidence", 0) > 0.8 else "medium",
+        device_id="signature-detector",
+        description=f"Signature-based threat detected: {result.get('threat_type')}",
+        detection_method="signature",
+        confidence=result.get("confidence", 0.0),
+        metrics=result.get("details", {})
+    )
+
+def reputation_result(reputation: Dict[str, Any]) -> Dict[str, Any]:
+    """Signature-detector shaped result for a hash-reputation verdict"""
+    malicious = reputation["verdict"] == "malicious"
+    return {
+        "detected": malicious,
+        "threat_type": f"Known Malware ({reputation.get('label') or reputation['source']})" if malicious else None,
+        "confidence": 0.95 if malicious else 0.0,
+        "details": {"reputation": reputation},
+        "verdict": reputation["verdict"],
+        "scanned": True,
+        "short_circuit": True
+    }
+
+def scan_files(file_paths: List[str]) -> List[Dict[str, Any]]:
+    """Hash reputation first, then the heavyweight scanners for files still unknown"""
+    if hash_reputation is not None:
+        reputations = hash_reputation.check_files(file_paths, external=not ENHANCED_MODULES_AVAILABLE)
+    else:
+        reputations = [None] * len(file_paths)
+    results = []
+    for file_path, reputation in zip(file_paths, reputations):
+        if reputation is not None and reputation["verdict"] == "error":
+            results.append({"detected": False, "confidence": 0.0, "error": reputation["error"], "short_circuit": False})
+        elif reputation is not None and reputation["short_circuit"]:
+            results.append(reputation_result(reputation))
+        elif ENHANCED_MODULES_AVAILABLE and enhanced_detector:
+            result = enhanced_detector.signature_detector.detect_threats(file_path)
+            if reputation is not None:
+                result["reputation"] = reputation
+            result["scanned"] = True
+            results.append(result)
+        elif reputation is not None:
+            # Neither hash list knows the file and no scanner can run: say so instead of reporting it clean
+            results.append({"detected": False, "confidence": 0.0, "verdict": reputation["verdict"],
+                            "details": {"reputation": reputation}, "scanned": False, "short_circuit": False})
+        else:
+            raise HTTPException(status_code=503, detail="Signature detection not available")
+    return results
+
 @app.post("/api/signature/detect")
 async def signature_detection(request: SignatureDetectionRequest):
     """Signature-based threat detection"""
     try:
-        if not ENHANCED_MODULES_AVAILABLE or not enhanced_detector:
-            raise HTTPException(status_code=503, detail="Enhanced modules not available")
-        
-        result = enhanced_detector.signature_detector.detect_threats(request.file_path)
-        
+        loop = asyncio.get_running_loop()
+        result = (await loop.run_in_executor(None, scan_files, [request.file_path]))[0]
+        if "error" in result:
+            raise HTTPException(status_code=404, detail=result["error"])
+        if not result["scanned"]:
+            raise HTTPException(status_code=503, detail=f"File not in the hash reputation sets and no signature "
+                                                        f"scanner available (verdict: {result['verdict']})")
+
         if result.get("detected"):
-            alert_data = {
-                "id": str(uuid.uuid4()),
-                "threat_type": result.get("threat_type", "Signature Match"),
-                "severity": "high" if result.get("confidence", 0) > 0.8 else "medium",
-                "timestamp": datetime.now().isoformat(),
-                "status": "open",
-                "device_id": "signature-detector",
-                "description": f"Signature-based threat detected: {result.get('threat_type')}",
-                "detection_method": "signature",
-                "confidence": result.get("confidence", 0.0),
-                "metrics": result.get("details", {})
-            }
-            
-            alerts.insert(0, alert_data)
-            alert_history.append(alert_data)
-            
-            await broadcast_alert(alert_data)
-        
+            await publish_alert(signature_alert(result))
+
         return {"status": "success", "result": result}
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in signature detection: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/signature/detect/batch")
+async def signature_detection_batch(request: SignatureBatchRequest):
+    """Signature detection for many files; known hashes skip the scanners"""
+    try:
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(None, scan_files, request.file_paths)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in batch signature detection: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    for result in results:
+        if result.get("detected"):
+            await publish_alert(signature_alert(result))
+    return {
+        "status": "success",
+        "results": results,
+        "detected": sum(1 for result in results if result.get("detected")),
+        "short_circuited": sum(1 for result in results if result.get("short_circuit")),
+        "not_scanned": sum(1 for result in results if not result.get("scanned"))
+    }
+
+@app.post("/api/signature/hashes/lookup")
+async def lookup_hashes(request: HashLookupRequest):
+    """Local known-good / known-bad verdicts for many hashes"""
+    if hash_reputation is None:
+        raise HTTPException(status_code=503, detail="Hash reputation not available")
+    results = hash_reputation.check_hashes(request.hashes)
+    return {
+        "status": "success",
+        "results": results,
+        "known_bad": sum(1 for result in results if result["verdict"] == "malicious"),
+        "known_good": sum(1 for result in results if result["verdict"] == "clean")
+    }
+
+@app.get("/api/signature/hashes")
+async def get_hash_reputation():
+    """Set sizes, version and short-circuit counters of the hash reputation tier"""
+    if hash_reputation is None:
+        raise HTTPException(status_code=503, detail="Hash reputation not available")
+    return {"status": "success", "reputation": hash_reputation.summary()}
+
+@app.post("/api/signature/hashes/reload")
+async def reload_hash_reputation():
+    """Recompile the hash lists; every worker picks up the new sets"""
+    if hash_reputation is None:
+        raise HTTPException(status_code=503, detail="Hash reputation not available")
+    try:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, hash_reputation.rebuild)
+    except Exception as e:
+        logger.error(f"Error rebuilding hash reputation: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"status": "success", **result}
+
 @app.post("/api/file/analyze")
 async def file_analysis(request: FileAnalysisRequest):
     """File-based malware analysis"""
@@ -394,23 +736,17 @@ async def file_analysis(request: FileAnalysisRequest):
         result = enhanced_detector.file_analyzer.predict(request.file_path)
         
         if result.get("prediction") == "malicious":
-            alert_data = {
-                "id": str(uuid.uuid4()),
-                "threat_type": result.get("threat_type", "File-based Malware"),
-                "severity": "high" if result.get("confidence", 0) > 0.8 else "medium",
-                "timestamp": datetime.now().isoformat(),
-                "status": "open",
-                "device_id": "file-analyzer",
-                "description": f"File-based malware detected: {result.get('threat_type')}",
-                "detection_method": "file_analysis",
-                "confidence": result.get("confidence", 0.0),
-                "metrics": result.get("features", {})
-            }
+            alert_data = create_alert(
+                threat_type=result.get("threat_type", "File-based Malware"),
+                severity="high" if result.get("confidence", 0) > 0.8 else "medium",
+                device_id="file-analyzer",
+                description=f"File-based malware detected: {result.get('threat_type')}",
+                detection_method="file_analysis",
+                confidence=result.get("confidence", 0.0),
+                metrics=result.get("features", {})
+            )
             
-            alerts.insert(0, alert_data)
-            alert_history.append(alert_data)
-            
-            await broadcast_alert(alert_data)
+            await publish_alert(alert_data)
         
         return {"status": "success", "result": result}
         
@@ -429,26 +765,20 @@ async def behavioral_analysis(request: BehavioralAnalysisRequest):
         result = enhanced_detector.behavioral_analyzer.analyze_behavior(data)
         
         if result.get("threats_detected"):
-            alert_data = {
-                "id": str(uuid.uuid4()),
-                "threat_type": "Behavioral Anomaly",
-                "severity": result.get("threat_level", "medium").lower(),
-                "timestamp": datetime.now().isoformat(),
-                "status": "open",
-                "device_id": "behavioral-analyzer",
-                "description": f"Behavioral anomaly detected: {result.get('threat_level')} risk",
-                "detection_method": "behavioral",
-                "confidence": result.get("overall_risk_score", 0.0) / 10.0,
-                "metrics": {
+            alert_data = create_alert(
+                threat_type="Behavioral Anomaly",
+                severity=result.get("threat_level", "medium").lower(),
+                device_id="behavioral-analyzer",
+                description=f"Behavioral anomaly detected: {result.get('threat_level')} risk",
+                detection_method="behavioral",
+                confidence=result.get("overall_risk_score", 0.0) / 10.0,
+                metrics={
                     "threat_count": len(result.get("threats_detected", [])),
                     "threat_types": result.get("threat_types", [])
                 }
-            }
+            )
             
-            alerts.insert(0, alert_data)
-            alert_history.append(alert_data)
-            
-            await broadcast_alert(alert_data)
+            await publish_alert(alert_data)
         
         return {"status": "success", "result": result}
         
@@ -459,33 +789,34 @@ async def behavioral_analysis(request: BehavioralAnalysisRequest):
 @app.post("/api/encrypted/detect")
 async def encrypted_threat_detection(request: EncryptedThreatRequest):
     """Encrypted threat detection"""
+    if fingerprint_index is None and (not ENHANCED_MODULES_AVAILABLE or not enhanced_detector):
+        raise HTTPException(status_code=503, detail="Enhanced modules not available")
     try:
-        if not ENHANCED_MODULES_AVAILABLE or not enhanced_detector:
-            raise HTTPException(status_code=503, detail="Enhanced modules not available")
+        if enhanced_detector:
+            result = enhanced_detector.encrypted_detector.detect_encrypted_threats(request.network_data)
+        else:
+            result = {"threats_detected": [], "threat_types": [], "threat_level": "LOW", "overall_risk_score": 0.0}
         
-        result = enhanced_detector.encrypted_detector.detect_encrypted_threats(request.network_data)
+        # Known-bad JA3/JA3S, SNI and certificate fingerprints
+        if fingerprint_index is not None:
+            merge_matches(result, fingerprint_index.lookup_batch(extract_indicators(request.network_data)))
         
         if result.get("threats_detected"):
-            alert_data = {
-                "id": str(uuid.uuid4()),
-                "threat_type": "Encrypted Threat",
-                "severity": result.get("threat_level", "medium").lower(),
-                "timestamp": datetime.now().isoformat(),
-                "status": "open",
-                "device_id": "encrypted-detector",
-                "description": f"Encrypted threat detected: {result.get('threat_level')} risk",
-                "detection_method": "encrypted",
-                "confidence": result.get("overall_risk_score", 0.0) / 10.0,
-                "metrics": {
+            alert_data = create_alert(
+                threat_type="Encrypted Threat",
+                severity=result.get("threat_level", "medium").lower(),
+                device_id=request.network_data.get("device_id", "encrypted-detector"),
+                description=f"Encrypted threat detected: {result.get('threat_level')} risk",
+                detection_method="encrypted",
+                confidence=result.get("overall_risk_score", 0.0) / 10.0,
+                metrics={
                     "threat_count": len(result.get("threats_detected", [])),
-                    "threat_types": result.get("threat_types", [])
+                    "threat_types": result.get("threat_types", []),
+                    "fingerprint_matches": result.get("fingerprint_matches", [])
                 }
-            }
+            )
             
-            alerts.insert(0, alert_data)
-            alert_history.append(alert_data)
-            
-            await broadcast_alert(alert_data)
+            await publish_alert(alert_data)
         
         return {"status": "success", "result": result}
         
@@ -493,36 +824,66 @@ async def encrypted_threat_detection(request: EncryptedThreatRequest):
         logger.error(f"Error in encrypted threat detection: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/encrypted/fingerprints/lookup")
+async def lookup_fingerprints(request: FingerprintLookupRequest):
+    """Look up many {kind, value} indicators against the fingerprint index"""
+    if fingerprint_index is None:
+        raise HTTPException(status_code=503, detail="Fingerprint index not available")
+    indicators = [(item.get("kind", ""), item.get("value", "")) for item in request.indicators]
+    matches = fingerprint_index.lookup_batch(indicators)
+    return {
+        "status": "success",
+        "matches": matches,
+        "match_count": sum(match is not None for match in matches)
+    }
+
+@app.get("/api/encrypted/fingerprints")
+async def get_fingerprint_index():
+    """Size, version and lookup counters of the fingerprint index"""
+    if fingerprint_index is None:
+        raise HTTPException(status_code=503, detail="Fingerprint index not available")
+    return {"status": "success", "index": fingerprint_index.summary()}
+
+@app.post("/api/encrypted/fingerprints/reload")
+async def reload_fingerprint_index():
+    """Recompile the IOC files; every worker picks up the new index"""
+    if fingerprint_index is None:
+        raise HTTPException(status_code=503, detail="Fingerprint index not available")
+    try:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, fingerprint_index.rebuild)
+    except Exception as e:
+        logger.error(f"Error rebuilding fingerprint index: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"status": "success", **result}
+
+def social_engineering_alert(communication_data: Dict[str, Any], result: Dict[str, Any]) -> Alert:
+    return create_alert(
+        threat_type="Social Engineering",
+        severity=result.get("threat_level", "medium").lower(),
+        device_id=communication_data.get("device_id", "social-engineering-detector"),
+        description=f"Social engineering detected: {result.get('threat_level')} risk",
+        detection_method="social_engineering",
+        confidence=result.get("overall_risk_score", 0.0) / 10.0,
+        metrics={
+            "threat_count": len(result.get("threats_detected", [])),
+            "threat_types": result.get("threat_types", [])
+        }
+    )
+
 @app.post("/api/social-engineering/detect")
 async def social_engineering_detection(request: SocialEngineeringRequest):
     """Social engineering detection"""
+    if social_engine is None and (not ENHANCED_MODULES_AVAILABLE or not enhanced_detector):
+        raise HTTPException(status_code=503, detail="Enhanced modules not available")
     try:
-        if not ENHANCED_MODULES_AVAILABLE or not enhanced_detector:
-            raise HTTPException(status_code=503, detail="Enhanced modules not available")
-        
-        result = enhanced_detector.social_engineering_detector.detect_social_engineering(request.communication_data)
+        if social_engine is not None:
+            result = social_engine.score(request.communication_data)
+        else:
+            result = enhanced_detector.social_engineering_detector.detect_social_engineering(request.communication_data)
         
         if result.get("threats_detected"):
-            alert_data = {
-                "id": str(uuid.uuid4()),
-                "threat_type": "Social Engineering",
-                "severity": result.get("threat_level", "medium").lower(),
-                "timestamp": datetime.now().isoformat(),
-                "status": "open",
-                "device_id": "social-engineering-detector",
-                "description": f"Social engineering detected: {result.get('threat_level')} risk",
-                "detection_method": "social_engineering",
-                "confidence": result.get("overall_risk_score", 0.0) / 10.0,
-                "metrics": {
-                    "threat_count": len(result.get("threats_detected", [])),
-                    "threat_types": result.get("threat_types", [])
-                }
-            }
-            
-            alerts.insert(0, alert_data)
-            alert_history.append(alert_data)
-            
-            await broadcast_alert(alert_data)
+            await publish_alert(social_engineering_alert(request.communication_data, result))
         
         return {"status": "success", "result": result}
         
@@ -530,62 +891,180 @@ async def social_engineering_detection(request: SocialEngineeringRequest):
         logger.error(f"Error in social engineering detection: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/social-engineering/detect/batch")
+async def social_engineering_detection_batch(request: SocialEngineeringBatchRequest):
+    """Score many messages in one call; one alert per flagged message"""
+    if social_engine is None:
+        raise HTTPException(status_code=503, detail="Social-engineering engine not available")
+    try:
+        results = social_engine.score_batch(request.messages)
+        for message, result in zip(request.messages, results):
+            if result["threats_detected"]:
+                await publish_alert(social_engineering_alert(message, result))
+        return {
+            "status": "success",
+            "results": results,
+            "flagged": sum(1 for result in results if result["threats_detected"])
+        }
+    except Exception as e:
+        logger.error(f"Error in batch social engineering detection: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/social-engineering/rules")
+async def get_social_engineering_rules():
+    """Get the compiled social-engineering rule set and its hit counts"""
+    if social_engine is None:
+        raise HTTPException(status_code=503, detail="Social-engineering engine not available")
+    return {"status": "success", **social_engine.summary()}
+
+@app.post("/api/social-engineering/rules/reload")
+async def reload_social_engineering_rules():
+    """Recompile social-engineering rules from the configured rule file"""
+    if social_engine is None:
+        raise HTTPException(status_code=503, detail="Social-engineering engine not available")
+    try:
+        counts = social_engine.reload()
+    except Exception as e:
+        logger.error(f"Error reloading social-engineering rules: {e}")
+        raise HTTPException(status_code=400, detail=f"Error reloading social-engineering rules: {str(e)}")
+    return {"status": "success", **counts}
+
+def parse_time_range(since: Optional[str], until: Optional[str]):
+    """Parse since/until query parameters into epoch seconds, rejecting unparseable timestamps"""
+    try:
+        return (
+            to_epoch(since) if since else None,
+            to_epoch(until) if until else None
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since/until must be ISO-8601 timestamps")
+
+def alert_predicate(severity: Optional[str], status: Optional[str], detection_method: Optional[str]):
+    """Compile alert query filters into a predicate, or None when unfiltered"""
+    subscription = compile_subscription({
+        "severity": severity,
+        "status": status,
+        "detection_method": detection_method
+    })
+    return None if subscription.is_wildcard else subscription.matches
+
 @app.get("/api/alerts")
 async def get_alerts(
+    response: Response,
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
     severity: Optional[str] = None,
     status: Optional[str] = None,
     detection_method: Optional[str] = None
 ):
-    """Get alerts with filtering options"""
-    filtered_alerts = alerts
+    """
+    Get alerts with filtering options, newest first
+    
+    Pass the X-Next-Cursor response header back as ``cursor`` to fetch the
+    next page; cursors stay stable while new alerts are being added.
+    """
+    since, until = parse_time_range(since, until)
+    
+    try:
+        page, next_cursor = alert_store.page(
+            limit,
+            cursor=cursor,
+            since=since,
+            until=until,
+            predicate=alert_predicate(severity, status, detection_method),
+            offset=offset
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    if severity:
-        filtered_alerts = [a for a in filtered_alerts if a["severity"] == severity]
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [alert.to_dict() for alert in page]
+
+@app.get("/api/alerts/export")
+async def export_alerts(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    severity: Optional[str] = None,
+    status: Optional[str] = None,
+    detection_method: Optional[str] = None
+):
+    """Stream alerts in a time range as NDJSON, oldest first, for bulk SIEM pulls"""
+    since, until = parse_time_range(since, until)
+    predicate = alert_predicate(severity, status, detection_method)
     
-    if status:
-        filtered_alerts = [a for a in filtered_alerts if a["status"] == status]
+    # Taken before the first await, so alerts inserted mid-export cannot shift the iteration
+    alerts = alert_store.iter_range(since, until, predicate)
     
-    if detection_method:
-        filtered_alerts = [a for a in filtered_alerts if a.get("detection_method") == detection_method]
+    async def generate():
+        batch = []
+        for alert in alerts:
+            batch.append(json.dumps(alert.to_dict()))
+            if len(batch) >= 500:
+                yield "\n".join(batch) + "\n"
+                batch = []
+                # Let other requests run between chunks of a large export
+                await asyncio.sleep(0)
+        if batch:
+            yield "\n".join(batch) + "\n"
     
-    return filtered_alerts[offset:offset + limit]
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.post("/api/alerts/{alert_id}/status")
+async def update_alert_status(alert_id: str, update: AlertStatusUpdate):
+    """
+    Set an alert's status
+    
+    The change goes out over the alert bus so every worker updates its copy;
+    verdicts on ml_model alerts also feed the online weight calibration.
+    """
+    if update.status not in ALERT_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(ALERT_STATUSES)}")
+    alert = alert_store.get(alert_id)
+    if alert is None:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    
+    updated = Alert.from_dict({**alert.to_dict(), "status": update.status})
+    await publish_alert(updated)
+    return {"status": "success", "alert": updated.to_dict()}
 
 @app.get("/alerts")
 async def get_alerts_legacy():
     """Legacy alerts endpoint for backward compatibility"""
-    return alerts[:100]
+    return [alert.to_dict() for alert in alert_store.latest(100)]
 
 @app.post("/test-alert")
 async def create_test_alert():
     """Create a test alert for development purposes"""
-    test_alert = {
-        "id": str(uuid.uuid4()),
-        "threat_type": "Test Threat",
-        "severity": "medium",
-        "timestamp": datetime.now().isoformat(),
-        "status": "open",
-        "device_id": "test-device",
-        "description": "This is a test alert created for development purposes",
-        "detection_method": "test",
-        "confidence": 0.85,
-        "metrics": {
+    test_alert = create_alert(
+        threat_type="Test Threat",
+        severity="medium",
+        device_id="test-device",
+        description="This is a test alert created for development purposes",
+        detection_method="test",
+        confidence=0.85,
+        metrics={
             "test_metric": "test_value"
         }
-    }
+    )
     
-    alerts.insert(0, test_alert)
-    alert_history.append(test_alert)
+    await publish_alert(test_alert)
     
-    # Broadcast the test alert
-    await broadcast_alert(test_alert)
-    
-    return {"status": "success", "alert": test_alert}
+    return {"status": "success", "alert": test_alert.to_dict()}
+
+def module_status(local_tier: bool = False) -> str:
+    """"active" with the enhanced detector loaded, "partial" when only the local compiled tier runs"""
+    if ENHANCED_MODULES_AVAILABLE and enhanced_detector:
+        return "active"
+    return "partial" if local_tier else "inactive"
 
 @app.get("/api/dashboard/summary")
 async def get_dashboard_summary():
     """Get enhanced dashboard summary"""
+    alerts = alert_store.items
     total_alerts = len(alerts)
     open_alerts = len([a for a in alerts if a["status"] == "open"])
     critical_alerts = len([a for a in alerts if a["severity"] == "critical" and a["status"] == "open"])
@@ -620,26 +1099,185 @@ async def get_dashboard_summary():
         "detection_methods": detection_methods,
         "threat_types": threat_types,
         "enhanced_modules": {
-            "signature_detection": "active" if ENHANCED_MODULES_AVAILABLE else "inactive",
-            "file_analysis": "active" if ENHANCED_MODULES_AVAILABLE else "inactive",
-            "behavioral_analysis": "active" if ENHANCED_MODULES_AVAILABLE else "inactive",
-            "encrypted_detection": "active" if ENHANCED_MODULES_AVAILABLE else "inactive",
-            "social_engineering": "active" if ENHANCED_MODULES_AVAILABLE else "inactive"
+            "signature_detection": module_status(hash_reputation is not None),
+            "file_analysis": module_status(),
+            "behavioral_analysis": module_status(),
+            "encrypted_detection": module_status(fingerprint_index is not None),
+            "social_engineering": module_status(social_engine is not None)
         }
     }
 
 @app.get("/api/detection/history")
 async def get_detection_history(limit: int = Query(50, ge=1, le=200)):
-    """Get threat detection history"""
-    return list(threat_detection_history)[-limit:]
+    """Get the most recent detections, oldest first"""
+    return detection_history.recent(limit)
+
+@app.get("/api/detection/history/aggregate")
+async def aggregate_detection_history(
+    group_by: Optional[str] = None,
+    bucket: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    threat_type: Optional[str] = None,
+    severity: Optional[str] = None,
+    device_id: Optional[str] = None,
+    detection_method: Optional[str] = None
+):
+    """
+    Count detections per time bucket and dimension values for trend charts
+    
+    ``group_by`` is a comma-separated subset of threat_type, severity,
+    device_id and detection_method; ``bucket`` is minute, hour, day or a
+    width in seconds. Data older than the raw retention is served from
+    hourly rollups.
+    """
+    dimensions = [d.strip() for d in group_by.split(",") if d.strip()] if group_by else []
+    width = None
+    if bucket:
+        width = HISTORY_BUCKETS.get(bucket) or (int(bucket) if bucket.isdigit() and int(bucket) > 0 else None)
+        if width is None:
+            raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(HISTORY_BUCKETS)} or seconds")
+    since, until = parse_time_range(since, until)
+    
+    try:
+        rows = await asyncio.get_running_loop().run_in_executor(None, lambda: detection_history.aggregate(
+            dimensions, width, since, until,
+            {"threat_type": threat_type, "severity": severity, "device_id": device_id, "detection_method": detection_method}
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", "group_by": dimensions, "bucket": width, "rows": rows}
+
+@app.get("/api/incidents")
+async def get_incidents(
+    state: str = "open",
+    device_id: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Get open or recently closed incidents, newest first"""
+    if correlator is None:
+        raise HTTPException(status_code=503, detail="Alert correlation disabled")
+    if state not in ("open", "closed"):
+        raise HTTPException(status_code=400, detail="state must be open or closed")
+    incidents = correlator.incidents(state, device_id, limit)
+    return {"status": "success", "incidents": incidents, "count": len(incidents)}
+
+@app.get("/api/incidents/{incident_id}")
+async def get_incident(incident_id: str):
+    """Get one incident with the ids of its alerts"""
+    if correlator is None:
+        raise HTTPException(status_code=503, detail="Alert correlation disabled")
+    incident = correlator.get(incident_id)
+    if incident is None:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    return {"status": "success", "incident": incident}
+
+@app.get("/api/correlation/stats")
+async def get_correlation_stats():
+    """Get correlation windows, rules and counters"""
+    if correlator is None:
+        raise HTTPException(status_code=503, detail="Alert correlation disabled")
+    return {"status": "success", **correlator.summary()}
+
+@app.post("/api/correlation/reload")
+async def reload_correlation_rules():
+    """
+    Reload correlation windows and rules; open incidents are kept
+
+    The file is read and validated here, then the parsed spec goes over the
+    alert bus so every worker swaps rules at the same point in the alert stream.
+    """
+    if correlator is None:
+        raise HTTPException(status_code=503, detail="Alert correlation disabled")
+    try:
+        spec = load_correlation_spec(correlator.path)
+        count = len(AlertCorrelator.parse_spec(spec)[3])
+    except Exception as e:
+        logger.error(f"Error reloading correlation rules: {e}")
+        raise HTTPException(status_code=400, detail=f"Error reloading correlation rules: {str(e)}")
+    await publish_control("correlation.reload", spec=spec)
+    return {"status": "success", "rules": count}
+
+@app.get("/api/admission/stats")
+async def get_admission_stats():
+    """Get admitted and shed request counts per endpoint class"""
+    return {"enabled": admission is not None, **(admission.summary() if admission is not None else {})}
+
+# Diagnostics under /api/admin/ are off unless ADMIN_TOKEN is set, and then need it in X-Admin-Token
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+async def require_admin(request: Request):
+    """Reject admin requests unless enabled and authenticated"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Admin token required")
+
+@app.get("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def profile_process(
+    seconds: float = Query(5.0, gt=0, le=60),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+    format: str = "collapsed",
+    include_idle: bool = False
+):
+    """
+    Sample the stacks of all threads for a few seconds
+    
+    format=collapsed returns flame-graph-ready text (flamegraph.pl,
+    speedscope); format=json returns the hottest frames and the stacks.
+    """
+    if format not in ("collapsed", "json"):
+        raise HTTPException(status_code=400, detail="format must be collapsed or json")
+    sampler = StackSampler(interval=interval_ms / 1000.0, include_idle=include_idle)
+    try:
+        # Run on a dedicated thread so the event loop keeps serving (and is sampled) meanwhile
+        result = await asyncio.to_thread(sampler.sample, seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "collapsed":
+        return PlainTextResponse(collapsed(result["stacks"]))
+    return {
+        "status": "success",
+        **{key: value for key, value in result.items() if key != "stacks"},
+        "top_frames": top_frames(result["stacks"]),
+        "stacks": dict(result["stacks"].most_common(200))
+    }
+
+@app.get("/api/admin/loop-lag", dependencies=[Depends(require_admin)])
+async def get_loop_lag(events: int = Query(20, ge=0, le=100)):
+    """Get event-loop lag statistics and recent stalls with the blocking stack"""
+    if loop_lag_monitor is None:
+        raise HTTPException(status_code=503, detail="Loop lag monitor disabled")
+    return {"status": "success", **loop_lag_monitor.summary(events)}
+
+@app.get("/api/connections/stats")
+async def get_connection_stats():
+    """Get WebSocket connection counts, churn and heartbeat reaping"""
+    return {
+        "active_connections": len(manager.active_connections),
+        **manager.stats,
+        "heartbeat": manager.heartbeat.summary()
+    }
 
 @app.get("/api/detection/stats")
 async def get_detection_stats():
     """Get detection statistics"""
     return {
-        "total_detections": len(threat_detection_history),
+        "total_detections": detection_history.total,
+        "detection_history": detection_history.summary(),
         "active_connections": len(manager.active_connections),
         "connection_stats": manager.stats,
+        "heartbeat": manager.heartbeat.summary(),
+        "subscriptions": manager.subscriptions.summary(),
+        "alert_bus": alert_bus.summary(),
+        "admission": admission.summary() if admission is not None else None,
+        "replay_log": {
+            "seq": replay_log.seq,
+            "first_seq": replay_log.first_seq,
+            "size": len(replay_log.events),
+            **replay_log.stats
+        },
         "detection_weights": enhanced_detector.detection_weights if enhanced_detector else {}
     }
 
@@ -649,42 +1287,47 @@ async def windows10_detect(request: Dict[str, Any]):
     if not TRAINED_MODELS_AVAILABLE or windows10_detector is None:
         raise HTTPException(status_code=503, detail="Trained models not available")
     
+    top_k = request.get('top_k', 5)
+    n_features = len(windows10_detector.feature_names)
+    if not isinstance(top_k, int) or isinstance(top_k, bool) or not 1 <= top_k <= n_features:
+        raise HTTPException(status_code=400, detail=f"top_k must be an integer between 1 and {n_features}")
+    
     try:
         # Extract metrics from request
         metrics = request.get('metrics', {})
+        row = windows10_detector.vectorize(metrics)
         
-        # Run detection using trained model
-        result = windows10_detector.detect(metrics)
+        # Run detection using trained model, skipping inference if the device's metrics haven't moved
+        result = adaptive_scorer.score_batch([request.get('device_id', 'unknown')], row)[0]
+        
+        # Per-sample attributions are computed lazily, only for threats and only when asked for
+        if request.get('explain') and result['is_threat']:
+            result = dict(result, attributions=windows10_detector.explain_batch(row, top_k)[0])
         
         # Create alert if threat detected
         if result['is_threat']:
-            alert = {
-                "id": str(uuid.uuid4()),
-                "threat_type": "Windows10 System Threat",
-                "severity": "high" if result['confidence'] > 0.8 else "medium",
-                "timestamp": datetime.now().isoformat(),
-                "status": "open",
-                "device_id": request.get('device_id', 'unknown'),
-                "description": f"Windows10 threat detected with confidence {result['confidence']:.2f}",
-                "detection_method": "trained_model",
-                "confidence": result['confidence'],
-                "metrics": {
+            alert = create_alert(
+                threat_type="Windows10 System Threat",
+                severity="high" if result['confidence'] > 0.8 else "medium",
+                device_id=request.get('device_id', 'unknown'),
+                description=f"Windows10 threat detected with confidence {result['confidence']:.2f}",
+                detection_method="trained_model",
+                confidence=result['confidence'],
+                metrics={
                     "prediction": result['prediction'],
-                    "top_features": result['top_features']
+                    "top_features": result['top_features'],
+                    **({"attributions": result['attributions']} if 'attributions' in result else {})
                 }
-            }
+            )
             
-            # Add to alerts
-            alerts.append(alert)
-            
-            # Broadcast to WebSocket clients
-            await manager.broadcast_alert(alert)
+            # Store and broadcast via the alert bus
+            await publish_alert(alert)
             
             return {
                 "status": "success",
                 "threat_detected": True,
                 "result": result,
-                "alert": alert
+                "alert": alert.to_dict()
             }
         else:
             return {
@@ -708,34 +1351,32 @@ async def ml_detect(request: Dict[str, Any]):
         network_data = request.get('network_data', {})
         
         # Run detection using ML model
-        result = ml_model.predict(network_data)
+        sync_shared_threat_model()
+        features = process_data(network_data)
+        label, confidence, result = ml_model.predict(features)
+        if calibrator is not None:
+            calibrator.observe(features, request.get('device_group'))
         
         # Create alert if threat detected
-        if result['is_threat']:
-            alert = {
-                "id": str(uuid.uuid4()),
-                "threat_type": result['threat_type'],
-                "severity": result['severity'],
-                "timestamp": datetime.now().isoformat(),
-                "status": "open",
-                "device_id": request.get('device_id', 'unknown'),
-                "description": f"Network threat detected: {result['threat_type']}",
-                "detection_method": "ml_model",
-                "confidence": result['confidence'],
-                "metrics": result.get('metrics', {})
-            }
-            
-            # Add to alerts
-            alerts.append(alert)
+        if label == "threat":
+            alert = create_alert(
+                threat_type=result['threat_type'],
+                severity=result['severity'],
+                device_id=request.get('device_id', 'unknown'),
+                description=f"Network threat detected: {result['threat_type']}",
+                detection_method="ml_model",
+                confidence=result['confidence'],
+                metrics=features
+            )
             
-            # Broadcast to WebSocket clients
-            await manager.broadcast_alert(alert)
+            # Store and broadcast via the alert bus
+            await publish_alert(alert)
             
             return {
                 "status": "success",
                 "threat_detected": True,
                 "result": result,
-                "alert": alert
+                "alert": alert.to_dict()
             }
         else:
             return {
@@ -748,6 +1389,176 @@ async def ml_detect(request: Dict[str, Any]):
         logger.error(f"Error in ML detection: {e}")
         raise HTTPException(status_code=500, detail=f"Error in ML detection: {str(e)}")
 
+async def publish_telemetry_results(device_id: str, results: List[Dict[str, Any]]):
+    """Raise alerts for threats found in a batch of collector samples"""
+    for result in results:
+        if result['is_threat']:
+            alert = create_alert(
+                threat_type="Windows10 System Threat",
+                severity="high" if result['confidence'] > 0.8 else "medium",
+                device_id=device_id,
+                description=f"Windows10 threat detected from local telemetry with confidence {result['confidence']:.2f}",
+                detection_method="trained_model",
+                confidence=result['confidence'],
+                metrics={
+                    "prediction": result['prediction'],
+                    "top_features": result['top_features'],
+                    "source": "telemetry_collector"
+                }
+            )
+            await publish_alert(alert)
+
+@app.get("/api/telemetry/status")
+async def get_telemetry_status():
+    """Get local telemetry collector status and sampling statistics"""
+    if telemetry_collector is None:
+        return {"status": "inactive", "psutil_available": PSUTIL_AVAILABLE}
+    return {"status": "active", **telemetry_collector.summary()}
+
+@app.get("/api/trained-models/adaptive-stats")
+async def get_adaptive_stats(device_id: Optional[str] = None):
+    """Get per-device skip/score ratios and sampling intervals of the adaptive scorer"""
+    if adaptive_scorer is None:
+        raise HTTPException(status_code=503, detail="Trained models not available")
+    return {"status": "success", "devices": adaptive_scorer.device_stats(device_id)}
+
+@app.get("/api/trained-models/ml-rules")
+async def get_ml_rules():
+    """Get the active threat-type rules and their hit counts"""
+    if ml_model is None:
+        raise HTTPException(status_code=503, detail="ML model not available")
+    return {"status": "success", **ml_model.rules.summary()}
+
+@app.post("/api/trained-models/ml-rules/reload")
+async def reload_ml_rules():
+    """Recompile threat-type rules from the configured rule file"""
+    if ml_model is None:
+        raise HTTPException(status_code=503, detail="ML model not available")
+    try:
+        count = ml_model.reload_rules()
+    except Exception as e:
+        logger.error(f"Error reloading threat rules: {e}")
+        raise HTTPException(status_code=400, detail=f"Error reloading threat rules: {str(e)}")
+    return {"status": "success", "rules": count}
+
+@app.get("/api/trained-models/calibration")
+async def get_calibration(group: str = "*"):
+    """Get calibration state and threshold proposals for a device group ("*" for all traffic)"""
+    if calibrator is None:
+        raise HTTPException(status_code=503, detail="ML model not available")
+    return {"status": "success", "group": group, "proposals": calibrator.propose(group), **calibrator.summary()}
+
+@app.post("/api/trained-models/calibration/apply")
+async def apply_calibration(group: str = "*"):
+    """
+    Apply the global threshold proposals to the ML model on every worker
+    
+    The model has one set of thresholds, so per-group proposals are advisory
+    and cannot be applied.
+    """
+    if calibrator is None:
+        raise HTTPException(status_code=503, detail="ML model not available")
+    if group != "*":
+        raise HTTPException(status_code=400, detail="Only the global group (\"*\") can be applied; "
+                                                    "thresholds are shared by all device groups")
+    changes = calibrator.take_changes()
+    if changes:
+        await publish_control("calibration.apply", changes=changes)
+    return {"status": "success", "group": group, "applied": changes}
+
+# Bulk re-scoring jobs started through the API, by job id; only the most recent finished jobs are kept
+replay_jobs: Dict[str, Dict[str, Any]] = {}
+REPLAY_DIR = os.path.realpath(os.getenv('REPLAY_DIR', os.path.join(os.path.dirname(__file__), 'replays')))
+REPLAY_KEEP_FINISHED = int(os.getenv('REPLAY_KEEP_FINISHED', '50'))
+REPLAY_MAX_WORKERS = os.cpu_count() or 1
+
+def resolve_replay_path(path: str) -> str:
+    """Resolve a client path inside REPLAY_DIR, rejecting anything that escapes it"""
+    resolved = os.path.realpath(os.path.join(REPLAY_DIR, path))
+    if os.path.commonpath([resolved, REPLAY_DIR]) != REPLAY_DIR or resolved == REPLAY_DIR:
+        raise HTTPException(status_code=400, detail=f"Path must be inside the replay directory: {path}")
+    return resolved
+
+def evict_replay_jobs() -> None:
+    finished = [job_id for job_id, job in replay_jobs.items() if job["progress"].finished]
+    for job_id in finished[:max(0, len(finished) - REPLAY_KEEP_FINISHED)]:
+        del replay_jobs[job_id]
+
+@app.post("/api/replay")
+async def start_replay(request: ReplayRequest):
+    """
+    Re-score NDJSON/CSV capture files (optionally gzip) in the background
+    
+    ``inputs`` and ``output`` are relative to REPLAY_DIR on the server;
+    poll /api/replay/{job_id} for progress.
+    """
+    if request.mode not in REPLAY_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(REPLAY_MODES)}")
+    if request.format not in REPLAY_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(REPLAY_FORMATS)}")
+    if not 0 <= request.workers <= REPLAY_MAX_WORKERS:
+        raise HTTPException(status_code=400, detail=f"workers must be between 0 and {REPLAY_MAX_WORKERS}")
+    if not 1 <= request.batch_size <= 100000:
+        raise HTTPException(status_code=400, detail="batch_size must be between 1 and 100000")
+    inputs = [resolve_replay_path(path) for path in request.inputs]
+    output = resolve_replay_path(request.output)
+    missing = [path for path, resolved in zip(request.inputs, inputs) if not os.path.isfile(resolved)]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Input files not found: {', '.join(missing)}")
+    
+    # In-process replays reuse the loaded models; pool workers rebuild them from the live parameters
+    scorer = None
+    model_params = None
+    sync_shared_threat_model()
+    if request.mode == "flows" and ml_model is not None:
+        scorer = FlowScorer(ml_model)
+        model_params = ml_model.get_params()
+    elif request.mode == "windows10" and windows10_detector is not None:
+        scorer = Windows10Scorer(windows10_detector)
+        if shared_registry is not None and shared_registry.available('windows10'):
+            model_params = {"shared_dir": shared_registry.directory}
+        else:
+            model_params = {"model_dir": os.path.dirname(windows10_detector.model_path),
+                            "allow_pickle": os.getenv('ALLOW_PICKLE_MODELS', '0') == '1'}
+    
+    evict_replay_jobs()
+    job_id = str(uuid.uuid4())
+    progress = ReplayProgress(report_every=5.0)
+    replay_jobs[job_id] = {
+        "mode": request.mode,
+        "inputs": request.inputs,
+        "output": request.output,
+        "format": request.format,
+        "started": datetime.now().isoformat(),
+        "progress": progress
+    }
+    
+    def run():
+        try:
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+            sink = create_sink(output, request.format)
+            try:
+                replay(inputs, request.mode, sink, scorer=scorer if request.workers == 0 else None,
+                       model_path=(model_params or {}).get("model_dir"), model_params=model_params,
+                       batch_size=request.batch_size, workers=request.workers, progress=progress)
+            finally:
+                sink.close()
+        except Exception as e:
+            logger.error(f"Replay {job_id} failed: {e}")
+            progress.error = str(e)
+            progress.finished = True
+    
+    asyncio.get_running_loop().run_in_executor(None, run)
+    return {"status": "success", "job_id": job_id}
+
+@app.get("/api/replay/{job_id}")
+async def get_replay(job_id: str):
+    """Get progress of a replay job"""
+    job = replay_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Replay job not found")
+    return {"status": "success", "job_id": job_id, **job, "progress": job["progress"].to_dict()}
+
 @app.get("/api/trained-models/status")
 async def get_trained_models_status():
     """Get status of trained models"""
@@ -756,41 +1567,129 @@ async def get_trained_models_status():
         "trained_models_available": TRAINED_MODELS_AVAILABLE,
         "windows10_detector": windows10_detector is not None,
         "ml_model": ml_model is not None,
+        "ml_model_memo": ml_model.memo_stats() if ml_model is not None else None,
+        "shared_models": {
+            "directory": shared_registry.directory,
+            "versions": shared_registry.versions(),
+            **shared_registry.stats
+        } if shared_registry is not None else None,
         "enhanced_modules_available": ENHANCED_MODULES_AVAILABLE,
         "enhanced_detector": enhanced_detector is not None,
         "timestamp": datetime.now().isoformat()
     }
 
+def event_matches(subscription: Subscription, event: Dict[str, Any]) -> bool:
+    # Incidents were routed by their triggering alert; on resume, match any member detection method
+    data = event["data"]
+    if event["type"] == "incident":
+        return any(subscription.matches(dict(data, detection_method=method))
+                   for method in data["metrics"]["detection_methods"])
+    return subscription.matches(data)
+
+async def send_sync(websocket: WebSocket, client_id: str, since: Optional[int] = None):
+    """Send a client either the delta since its last sequence number or a full snapshot"""
+    events = replay_log.since(since) if since is not None else None
+    
+    if events is None:
+        if correlator is not None:
+            # Live alerts go out as incidents, so the snapshot holds open incidents too
+            subscription = manager.subscriptions.get(client_id)
+            if subscription is None or subscription.is_wildcard:
+                incidents = correlator.incidents("open", limit=50)
+            else:
+                incidents = (i for i in correlator.incidents("open", limit=1000)
+                             if event_matches(subscription, {"type": "incident", "data": i}))
+            alerts = list(islice(incidents, 50))
+        else:
+            alerts = [alert.to_dict() for alert in islice(manager.subscriptions.filter(client_id, alert_store), 50)]
+        sync_data = {
+            "type": "initial", 
+            "seq": replay_log.seq,
+            "alerts": alerts,
+            "summary": await get_dashboard_summary()
+        }
+    else:
+        subscription = manager.subscriptions.get(client_id)
+        if subscription is not None and not subscription.is_wildcard:
+            events = [e for e in events if event_matches(subscription, e)]
+        # The summary is not in the replay log, so every delta carries a fresh one,
+        # even when the events were filtered out or were status changes
+        sync_data = {
+            "type": "delta",
+            "since": since,
+            "seq": replay_log.seq,
+            "events": events,
+            "summary": await get_dashboard_summary()
+        }
+    
+    manager.sent_seq[client_id] = sync_data["seq"]
+    await websocket.send_text(json.dumps(sync_data))
+    return sync_data["type"]
+
+def subscription_from_query(query_params) -> Optional[Subscription]:
+    """Compile filters passed as query parameters, e.g. /ws?severity=high,critical"""
+    filters = {field: query_params[field] for field in FILTER_FIELDS if field in query_params}
+    if "min_confidence" in query_params:
+        filters["min_confidence"] = query_params["min_confidence"]
+    return compile_subscription(filters) if filters else None
+
+def parse_seq(value) -> Optional[int]:
+    """Parse a client-supplied sequence number, ignoring malformed values"""
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
 # WebSocket endpoint
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    client_id = await manager.connect(websocket)
+    try:
+        subscription = subscription_from_query(websocket.query_params)
+    except ValueError as e:
+        logger.warning(f"Ignoring invalid WebSocket filters: {e}")
+        subscription = None
+    
+    client_id = await manager.connect(websocket, subscription=subscription)
     
     if not client_id:
         return
         
     try:
-        # Send initial data
-        initial_data = {
-            "type": "initial", 
-            "alerts": alerts[:50],
-            "summary": await get_dashboard_summary()
-        }
-        await websocket.send_text(json.dumps(initial_data))
-        logger.info(f"Sent initial data to client {client_id}")
+        # Send initial data, or only the missed events when resuming with ?since=<seq>
+        sync_type = await send_sync(websocket, client_id, parse_seq(websocket.query_params.get("since")))
+        logger.info(f"Sent {sync_type} data to client {client_id}")
         
         # Keep connection open
         while True:
             data = await websocket.receive_text()
+            # Any message, including a pong to a server ping, proves the client is alive
+            manager.heartbeat.touch(client_id)
             logger.debug(f"Received message from client {client_id}: {data[:100]}...")
             
             try:
                 msg = json.loads(data)
                 if msg.get("type") == "ping":
+                    # The last seq sent to this client, so a filtered client sees a gap only when it missed one
                     await websocket.send_text(json.dumps({
                         "type": "pong", 
+                        "seq": manager.sent_seq.get(client_id, replay_log.seq),
                         "timestamp": datetime.now().isoformat()
                     }))
+                elif msg.get("type") == "resume":
+                    await send_sync(websocket, client_id, parse_seq(msg.get("since")))
+                elif msg.get("type") == "subscribe":
+                    try:
+                        subscription = compile_subscription(msg.get("filters"))
+                    except (ValueError, TypeError, AttributeError) as e:
+                        await websocket.send_text(json.dumps({"type": "error", "detail": str(e)}))
+                        continue
+                    manager.subscribe(client_id, subscription)
+                    manager.sent_seq[client_id] = replay_log.seq
+                    await websocket.send_text(json.dumps({
+                        "type": "subscribed",
+                        "seq": replay_log.seq,
+                        "filters": subscription.to_dict()
+                    }))
             except:
                 pass
                 
@@ -869,8 +1768,30 @@ async def cleanup_test_samples():
 
 @app.on_event("startup")
 async def startup_event():
+    await alert_bus.start(apply_alert)
+    logger.info(f"Alert bus started: {alert_bus.name}")
+    
+    if loop_lag_monitor is not None:
+        loop_lag_monitor.start()
+    manager.heartbeat.start()
+    
+    if telemetry_collector is not None:
+        loop = asyncio.get_running_loop()
+        # Results arrive on the collector thread; hand alerts over to the event loop
+        telemetry_collector.on_results = lambda device_id, results: asyncio.run_coroutine_threadsafe(
+            publish_telemetry_results(device_id, results), loop)
+        telemetry_collector.start()
     logger.info("Enhanced NeuroScan Backend started with all advanced detection modules")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if telemetry_collector is not None:
+        telemetry_collector.stop()
+    if loop_lag_monitor is not None:
+        await loop_lag_monitor.stop()
+    await manager.heartbeat.stop()
+    await alert_bus.stop()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
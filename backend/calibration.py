@@ -0,0 +1,313 @@
+from typing import Dict, Any, Callable, List, Optional, Sequence
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_GROUP = "*"
+OVERFLOW_GROUP = "other"
+
+# Volume-like features whose baselines differ per site; port and protocol are categorical
+DEFAULT_PERCENTILES = {
+    "packet_count": 0.99,
+    "connection_duration": 0.99,
+    "bytes_transferred": 0.99,
+    "packet_rate": 0.99,
+    "flag_count": 0.99
+}
+
+# Analyst statuses that confirm (1.0) or reject (0.0) a model verdict; "resolved"
+# only says the alert was handled, not whether it was a true positive
+FEEDBACK_LABELS = {
+    "confirmed": 1.0,
+    "false_positive": 0.0
+}
+
+class P2Quantile:
+    """
+    Streaming estimate of one quantile with the P-square algorithm
+
+    Keeps five markers regardless of how many values were observed
+    (Jain & Chlamtac, 1985).
+    """
+
+    __slots__ = ("p", "count", "heights", "positions", "desired", "increments")
+
+    def __init__(self, p: float):
+        self.p = p
+        self.count = 0
+        self.heights: List[float] = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1.0, 1.0 + 2 * p, 1.0 + 4 * p, 3.0 + 2 * p, 5.0]
+        self.increments = [0.0, p / 2, p, (1.0 + p) / 2, 1.0]
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        q = self.heights
+        if self.count <= 5:
+            q.append(x)
+            if self.count == 5:
+                q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Move the three middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                s = 1 if d > 0 else -1
+                parabolic = q[i] + s / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if q[i - 1] < parabolic < q[i + 1]:
+                    q[i] = parabolic
+                else:
+                    q[i] = q[i] + s * (q[i + s] - q[i]) / (n[i + s] - n[i])
+                n[i] += s
+
+    def value(self) -> Optional[float]:
+        if self.count == 0:
+            return None
+        if self.count < 5:
+            ordered = sorted(self.heights)
+            return ordered[min(len(ordered) - 1, int(self.p * len(ordered)))]
+        return self.heights[2]
+
+class OnlineCalibrator:
+    """
+    Online threshold and weight calibration for ThreatDetectionModel
+
+    Observed flows update one P-square sketch per (device group, feature)
+    plus a global group, so memory is fixed per group and ``max_groups``
+    bounds the number of groups. Thresholds are proposed at each feature's
+    target percentile of observed traffic. The model has one set of
+    thresholds, so only the global proposals are applied; per-group
+    proposals are reported for comparison. Analyst feedback nudges weights
+    with one gradient step on the model score, so history is never rescanned.
+
+    Sketches only see the traffic this worker serves. With several workers,
+    set ``publisher`` so applied thresholds go to every worker (which call
+    ``apply_changes``) instead of only changing this worker's model.
+
+    Args:
+        model: ThreatDetectionModel to calibrate
+        percentiles: Target percentile per calibrated feature
+        min_samples: Observations a sketch needs before it proposes a threshold
+        max_groups: Device groups tracked individually; later groups share OVERFLOW_GROUP
+        max_step: Largest factor a threshold may move by in one apply
+        learning_rate: Step size of feedback weight updates
+        min_weight: Floor for any feature weight
+        auto_apply_every: Apply global proposals every N observations (0 disables)
+        publisher: Called with the threshold changes of an apply instead of applying them locally
+    """
+
+    def __init__(
+        self,
+        model,
+        percentiles: Optional[Dict[str, float]] = None,
+        min_samples: int = 500,
+        max_groups: int = 256,
+        max_step: float = 2.0,
+        learning_rate: float = 0.05,
+        min_weight: float = 0.01,
+        auto_apply_every: int = 0,
+        publisher: Optional[Callable[[Dict[str, float]], None]] = None
+    ):
+        self.model = model
+        self.percentiles = {
+            feature: p for feature, p in (percentiles or DEFAULT_PERCENTILES).items()
+            if feature in model.features
+        }
+        self.min_samples = min_samples
+        self.max_groups = max_groups
+        self.max_step = max_step
+        self.learning_rate = learning_rate
+        self.min_weight = min_weight
+        self.auto_apply_every = auto_apply_every
+        self.publisher = publisher
+
+        self.groups: Dict[str, Dict[str, P2Quantile]] = {}
+        self.lock = threading.Lock()
+        self.since_apply = 0
+        self.stats = {
+            "observed": 0,
+            "applies": 0,
+            "feedback": 0,
+            "overflowed": 0
+        }
+
+    def _sketches(self, group: str) -> Dict[str, P2Quantile]:
+        sketches = self.groups.get(group)
+        if sketches is None:
+            tracked = len(self.groups) - (GLOBAL_GROUP in self.groups) - (OVERFLOW_GROUP in self.groups)
+            if tracked >= self.max_groups and group not in (GLOBAL_GROUP, OVERFLOW_GROUP):
+                self.stats["overflowed"] += 1
+                return self._sketches(OVERFLOW_GROUP)
+            sketches = self.groups[group] = {
+                feature: P2Quantile(p) for feature, p in self.percentiles.items()
+            }
+        return sketches
+
+    def observe(self, features: Dict[str, float], group: Optional[str] = None) -> None:
+        """Feed one flow's raw features into the global and per-group sketches"""
+        self.observe_batch([features], group)
+
+    def observe_batch(self, feature_rows: Sequence[Dict[str, float]], group: Optional[str] = None) -> None:
+        """Feed many flows from one device group"""
+        with self.lock:
+            targets = [self._sketches(GLOBAL_GROUP)]
+            if group and group != GLOBAL_GROUP:
+                targets.append(self._sketches(group))
+            for features in feature_rows:
+                for feature in self.percentiles:
+                    value = features.get(feature)
+                    if value is not None:
+                        for sketches in targets:
+                            sketches[feature].add(float(value))
+            self.stats["observed"] += len(feature_rows)
+            self.since_apply += len(feature_rows)
+            due = self.auto_apply_every and self.since_apply >= self.auto_apply_every
+
+        if due:
+            self.apply()
+
+    def propose(self, group: str = GLOBAL_GROUP) -> Dict[str, Dict[str, Any]]:
+        """
+        Threshold proposals for a device group
+
+        Returns:
+            Dict of feature -> current threshold, sketch estimate, the proposal
+            after the ``max_step`` clamp, and sample count. ``proposed`` is
+            None until the sketch has ``min_samples`` observations.
+        """
+        with self.lock:
+            sketches = self.groups.get(group, {})
+            proposals = {}
+            for feature, p in self.percentiles.items():
+                sketch = sketches.get(feature)
+                current = self.model.thresholds[feature]
+                estimate = sketch.value() if sketch is not None else None
+                proposed = None
+                if estimate is not None and estimate > 0 and sketch.count >= self.min_samples:
+                    proposed = min(max(estimate, current / self.max_step), current * self.max_step)
+                proposals[feature] = {
+                    "percentile": p,
+                    "current": current,
+                    "estimate": estimate,
+                    "proposed": proposed,
+                    "samples": sketch.count if sketch is not None else 0
+                }
+            return proposals
+
+    def apply(self) -> Dict[str, float]:
+        """
+        Apply the global group's ready proposals; returns the thresholds changed
+
+        The thresholds are shared by all device groups, so a single group's
+        percentiles are never applied.
+        """
+        changes = self.take_changes()
+        if changes and self.publisher is not None:
+            self.publisher(changes)
+        else:
+            self.apply_changes(changes)
+        return changes
+
+    def take_changes(self) -> Dict[str, float]:
+        """Global ready proposals, for the caller to apply or publish; restarts the auto-apply count"""
+        changes = {
+            feature: proposal["proposed"]
+            for feature, proposal in self.propose(GLOBAL_GROUP).items()
+            if proposal["proposed"] is not None
+        }
+        with self.lock:
+            self.since_apply = 0
+        return changes
+
+    def apply_changes(self, changes: Dict[str, float]) -> None:
+        """Set thresholds chosen by an apply, on this or another worker"""
+        if changes:
+            self.model.update_thresholds(changes)
+            logger.info(f"Calibrated thresholds: {changes}")
+        with self.lock:
+            self.stats["applies"] += 1
+
+    def feedback(self, features: Dict[str, float], status: str,
+                 previous_status: Optional[str] = None) -> Optional[Dict[str, float]]:
+        """
+        Adjust weights from an analyst verdict on an alert raised by the model
+
+        Each alert trains once: only its first transition into a
+        FEEDBACK_LABELS status is used.
+
+        Args:
+            features: Raw features of the flow behind the alert
+            status: New alert status
+            previous_status: Status before the change
+
+        Returns:
+            The updated weights, or None if the change carries no feedback
+        """
+        target = FEEDBACK_LABELS.get(status)
+        if target is None or previous_status in FEEDBACK_LABELS or not features:
+            return None
+
+        normalized = self.model._normalize(features)
+        weights = self.model.weights
+        score = sum(normalized[f] * weights[f] for f in self.model.features)
+        error = target - score
+        new_weights = {
+            feature: max(self.min_weight, weights[feature] + self.learning_rate * error * normalized[feature])
+            for feature in self.model.features
+        }
+        self.model.update_weights(new_weights)
+        with self.lock:
+            self.stats["feedback"] += 1
+        return dict(self.model.weights)
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            groups = {
+                group: min((s.count for s in sketches.values()), default=0)
+                for group, sketches in self.groups.items()
+            }
+        return {
+            "percentiles": self.percentiles,
+            "min_samples": self.min_samples,
+            "groups": groups,
+            "weights": dict(self.model.weights),
+            "thresholds": dict(self.model.thresholds),
+            **self.stats
+        }
+
+# Sketch accuracy and memory check
+if __name__ == "__main__":
+    import random
+    import sys
+
+    random.seed(7)
+    values = [random.lognormvariate(10, 1.2) for _ in range(200000)]
+    sketch = P2Quantile(0.99)
+    for v in values:
+        sketch.add(v)
+    exact = sorted(values)[int(0.99 * len(values))]
+    print(f"p99 exact {exact:,.0f}  P2 {sketch.value():,.0f}  "
+          f"error {abs(sketch.value() - exact) / exact * 100:.2f}%  "
+          f"({sys.getsizeof(sketch.heights) + sys.getsizeof(sketch.positions)} bytes of markers)")
@@ -0,0 +1,445 @@
+"""
+Streaming alert correlation
+
+Alerts for the same device are merged into incidents. Each device keeps its
+open incidents as disjoint time intervals sorted by start; a new alert at
+time ``t`` joins the incident whose interval, widened by the window,
+contains ``t``. Because intervals closer than the window are merged, only
+the two neighbours found by bisection can qualify, so placing an alert is
+O(log k) for k open incidents on the device. Incidents are closed from a
+global expiry heap with lazy deletion (amortized O(log n) per alert), driven
+by the newest alert time minus an allowed lateness, so correlation is deterministic for a given alert
+order: every worker fed by the alert bus derives the same incidents.
+
+Memory is bounded by ``max_devices`` (least recently active devices are
+closed first), ``max_open_per_device``, ``max_alert_ids`` per incident and
+the size of the closed-incident log.
+"""
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from datetime import datetime
+import heapq
+import logging
+import os
+import threading
+
+try:
+    import yaml
+    YAML_AVAILABLE = True
+except ImportError:
+    YAML_AVAILABLE = False
+
+from threat_rules import RuleError
+from detection_history import to_epoch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = os.getenv(
+    "CORRELATION_RULES_PATH",
+    os.path.join(os.path.dirname(__file__), "rules", "correlation.yaml")
+)
+
+SEVERITY_ORDER = ("low", "medium", "high", "critical")
+_SEVERITY_RANK = {severity: rank for rank, severity in enumerate(SEVERITY_ORDER)}
+
+# An incident takes the least advanced status of its alerts: open until every alert is handled
+STATUS_ORDER = ("open", "investigating", "confirmed", "resolved", "false_positive")
+_STATUS_RANK = {status: rank for rank, status in enumerate(STATUS_ORDER)}
+
+class CorrelationRule:
+    """One incident-level rule; see rules/correlation.yaml for the fields"""
+
+    __slots__ = ("name", "title", "min_alerts", "min_methods", "methods", "within", "boost", "severity")
+
+    def __init__(self, spec: Dict[str, Any]):
+        if not isinstance(spec, dict) or "name" not in spec:
+            raise RuleError(f"correlation rule {spec!r}: name is required")
+        self.name = str(spec["name"])
+        self.title = str(spec.get("title", self.name))
+        self.min_alerts = int(spec.get("min_alerts", 1))
+        self.min_methods = int(spec.get("min_methods", 1))
+        self.methods = frozenset(spec.get("methods") or ())
+        self.within = float(spec["within_seconds"]) if spec.get("within_seconds") is not None else None
+        self.boost = float(spec.get("boost", 1.0))
+        self.severity = spec.get("severity")
+        if self.severity is not None and self.severity not in _SEVERITY_RANK:
+            raise RuleError(f"correlation rule {self.name}: unknown severity {self.severity!r}")
+
+    def matches(self, incident: "Incident") -> bool:
+        return (
+            incident.alert_count >= self.min_alerts
+            and len(incident.method_confidence) >= self.min_methods
+            and self.methods.issubset(incident.method_confidence)
+            and (self.within is None or incident.end - incident.start <= self.within)
+        )
+
+class Incident:
+    """Correlated group of alerts for one device"""
+
+    __slots__ = ("id", "device_id", "start", "end", "first_seen", "last_seen", "alert_ids", "alert_count",
+                 "method_confidence", "threat_types", "severity", "rules", "score", "state", "expires_at",
+                 "merged_ids", "status", "alert_severity")
+
+    def __init__(self, alert_id: str, device_id: str, t: float):
+        self.id = f"inc-{alert_id}"
+        self.device_id = device_id
+        self.start = t
+        self.end = t
+        self.first_seen = ""
+        self.last_seen = ""
+        self.alert_ids: List[str] = []
+        self.alert_count = 0
+        self.method_confidence: Dict[str, float] = {}
+        self.threat_types: Dict[str, int] = {}
+        self.severity = "low"
+        self.alert_severity = "low"
+        self.rules: List[str] = []
+        self.score = 0.0
+        self.state = "open"
+        self.expires_at = t
+        self.merged_ids: List[str] = []
+        self.status = "open"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Alert-shaped wire form, so dashboards and subscription filters can treat it like an alert"""
+        threat_type = self.rules[0] if self.rules else max(self.threat_types, key=self.threat_types.get)
+        methods = sorted(self.method_confidence)
+        return {
+            "id": self.id,
+            "threat_type": threat_type,
+            "severity": self.severity,
+            "timestamp": self.last_seen,
+            "first_seen": self.first_seen,
+            "status": self.status,
+            "state": self.state,
+            "device_id": self.device_id,
+            "description": f"{self.alert_count} correlated alert(s) from {', '.join(methods)} "
+                           f"over {self.end - self.start:.0f}s",
+            "detection_method": "correlated",
+            "confidence": round(self.score, 4),
+            "metrics": {
+                "alert_count": self.alert_count,
+                "alert_ids": list(self.alert_ids),
+                "detection_methods": methods,
+                "method_confidence": dict(self.method_confidence),
+                "threat_types": dict(self.threat_types),
+                "rules": list(self.rules),
+                "merged_incidents": list(self.merged_ids),
+                "span_seconds": round(self.end - self.start, 3)
+            }
+        }
+
+class AlertCorrelator:
+    """
+    Merges a stream of alerts into per-device incidents
+
+    Args:
+        path: YAML rule file; ``None`` for DEFAULT_RULES_PATH
+        spec: Already-parsed rule spec, used instead of ``path``
+        max_devices: Devices with open incidents kept at once
+        max_open_per_device: Open incidents kept per device (oldest closed first)
+        max_alert_ids: Alert ids listed per incident (the count keeps growing)
+        max_closed: Closed incidents kept for the API
+    """
+
+    def __init__(self, path: Optional[str] = None, spec: Optional[Dict[str, Any]] = None,
+                 max_devices: int = 10000, max_open_per_device: int = 16,
+                 max_alert_ids: int = 50, max_closed: int = 1000):
+        self.path = path or DEFAULT_RULES_PATH
+        self.max_devices = max_devices
+        self.max_open_per_device = max_open_per_device
+        self.max_alert_ids = max_alert_ids
+        self.lock = threading.Lock()
+        self._apply_spec(spec if spec is not None else load_correlation_spec(self.path))
+
+        # device_id -> (starts, incidents) sorted by start
+        self.devices: "OrderedDict[str, Tuple[List[float], List[Incident]]]" = OrderedDict()
+        self.by_id: Dict[str, Incident] = {}
+        self.expiry: List[Tuple[float, str]] = []
+        self.closed: deque = deque(maxlen=max_closed)
+        self.watermark = float("-inf")
+        self.stats = {"alerts": 0, "incidents": 0, "merged": 0, "closed": 0, "evicted": 0, "rule_hits": {}}
+
+    @staticmethod
+    def parse_spec(spec: Dict[str, Any]) -> Tuple[float, float, float, List[CorrelationRule]]:
+        """Validate a spec; returns (window, max_span, lateness, rules strongest first)"""
+        window = float(spec.get("window_seconds", 300))
+        max_span = float(spec.get("max_span_seconds", 3600))
+        lateness = float(spec.get("allowed_lateness_seconds", 30))
+        if window <= 0 or max_span <= 0 or lateness < 0:
+            raise RuleError("window_seconds and max_span_seconds must be positive, allowed_lateness_seconds not negative")
+        rules = sorted((CorrelationRule(rule) for rule in spec.get("rules") or []), key=lambda rule: -rule.boost)
+        return window, max_span, lateness, rules
+
+    def _apply_spec(self, spec: Dict[str, Any]) -> None:
+        # Validate everything before touching the active settings
+        self.window, self.max_span, self.lateness, self.rules = self.parse_spec(spec)
+
+    def reload(self, path: Optional[str] = None, spec: Optional[Dict[str, Any]] = None) -> int:
+        """Swap in new windows and rules; open incidents are kept and rescored on their next alert"""
+        spec = spec if spec is not None else load_correlation_spec(path or self.path)
+        with self.lock:
+            if path:
+                self.path = path
+            self._apply_spec(spec)
+        return len(self.rules)
+
+    def observe(self, alert) -> Incident:
+        """
+        Add an alert (Alert or its dict form) and return the incident it now belongs to
+
+        The returned incident is live; serialize it with ``to_dict`` before
+        handing it to another thread.
+        """
+        t = to_epoch(alert.get("timestamp"))
+        device_id = alert.get("device_id", "unknown")
+        with self.lock:
+            self.stats["alerts"] += 1
+            if t > self.watermark:
+                self.watermark = t
+                self._expire(t - self.lateness)
+
+            entry = self.devices.get(device_id)
+            if entry is None:
+                entry = self.devices[device_id] = ([], [])
+                if len(self.devices) > self.max_devices:
+                    self._evict_device(next(iter(self.devices)))
+            else:
+                self.devices.move_to_end(device_id)
+            starts, incidents = entry
+
+            # Only the incidents either side of t can be within the window
+            i = bisect_right(starts, t)
+            before = incidents[i - 1] if i > 0 and incidents[i - 1].end + self.window >= t \
+                and t - incidents[i - 1].start <= self.max_span else None
+            after = incidents[i] if i < len(incidents) and incidents[i].start - self.window <= t \
+                and incidents[i].end - t <= self.max_span else None
+
+            if before is not None and after is not None and after.end - before.start <= self.max_span:
+                self._merge(entry, before, after)
+                incident = before
+            else:
+                incident = before or after
+            if incident is None:
+                incident = Incident(alert.get("id"), device_id, t)
+                starts.insert(i, t)
+                incidents.insert(i, incident)
+                self.by_id[incident.id] = incident
+                self.stats["incidents"] += 1
+                if len(incidents) > self.max_open_per_device:
+                    self._close(incidents[0])
+            elif t < incident.start:
+                # Out-of-order alert extends the interval backwards; order is unchanged
+                starts[incidents.index(incident)] = t
+                incident.start = t
+
+            self._add(incident, alert, t)
+            return incident
+
+    def _add(self, incident: Incident, alert, t: float) -> None:
+        timestamp = str(alert.get("timestamp"))
+        if t >= incident.end:
+            incident.end = t
+            incident.last_seen = timestamp
+        if not incident.first_seen or t <= incident.start:
+            incident.first_seen = timestamp
+        if len(incident.alert_ids) < self.max_alert_ids:
+            incident.alert_ids.append(alert.get("id"))
+        incident.alert_count += 1
+        status = alert.get("status", "open")
+        if _STATUS_RANK.get(status, 0) < _STATUS_RANK[incident.status]:
+            incident.status = status
+
+        method = alert.get("detection_method", "unknown")
+        confidence = min(max(float(alert.get("confidence", 0.0) or 0.0), 0.0), 1.0)
+        incident.method_confidence[method] = max(incident.method_confidence.get(method, 0.0), confidence)
+        threat_type = alert.get("threat_type", "unknown")
+        incident.threat_types[threat_type] = incident.threat_types.get(threat_type, 0) + 1
+        severity = alert.get("severity", "low")
+        if _SEVERITY_RANK.get(severity, 0) > _SEVERITY_RANK[incident.alert_severity]:
+            incident.alert_severity = severity
+        self._score(incident)
+
+        incident.expires_at = incident.end + self.window
+        heapq.heappush(self.expiry, (incident.expires_at, incident.id))
+        if len(self.expiry) > 4 * len(self.by_id) + 1024:
+            # Mostly stale entries: rebuild from live incidents (amortized over the pushes)
+            self.expiry = [(i.expires_at, i.id) for i in self.by_id.values()]
+            heapq.heapify(self.expiry)
+
+    def _score(self, incident: Incident) -> None:
+        # Noisy-OR over detectors: one chatty detector counts once, independent ones reinforce
+        miss = 1.0
+        for confidence in incident.method_confidence.values():
+            miss *= 1.0 - min(confidence, 0.999)
+        # Rules are re-evaluated every time: a within_seconds rule stops matching once the span outgrows it
+        matched = [rule for rule in self.rules if rule.matches(incident)]
+        severity = incident.alert_severity
+        for rule in matched:
+            if rule.title not in incident.rules:
+                hits = self.stats["rule_hits"]
+                hits[rule.name] = hits.get(rule.name, 0) + 1
+            if rule.severity is not None and _SEVERITY_RANK[rule.severity] > _SEVERITY_RANK[severity]:
+                severity = rule.severity
+        # Strongest rule first; it names the incident
+        incident.rules = [rule.title for rule in matched]
+        incident.severity = severity
+        boost = matched[0].boost if matched else 1.0
+        incident.score = min(1.0, (1.0 - miss) * boost)
+
+    def _merge(self, entry, keep: Incident, other: Incident) -> None:
+        starts, incidents = entry
+        index = incidents.index(other)
+        del starts[index], incidents[index]
+        del self.by_id[other.id]
+        keep.end = max(keep.end, other.end)
+        if other.end >= keep.end:
+            keep.last_seen = other.last_seen
+        keep.alert_ids.extend(other.alert_ids[:max(0, self.max_alert_ids - len(keep.alert_ids))])
+        keep.alert_count += other.alert_count
+        for method, confidence in other.method_confidence.items():
+            keep.method_confidence[method] = max(keep.method_confidence.get(method, 0.0), confidence)
+        for threat_type, count in other.threat_types.items():
+            keep.threat_types[threat_type] = keep.threat_types.get(threat_type, 0) + count
+        if _SEVERITY_RANK[other.alert_severity] > _SEVERITY_RANK[keep.alert_severity]:
+            keep.alert_severity = other.alert_severity
+        if _STATUS_RANK[other.status] < _STATUS_RANK[keep.status]:
+            keep.status = other.status
+        # Clients drop incidents listed here; they live on in ``keep``
+        keep.merged_ids = (keep.merged_ids + [other.id] + other.merged_ids)[-self.max_alert_ids:]
+        self.stats["merged"] += 1
+
+    def _expire(self, now: float) -> None:
+        while self.expiry and self.expiry[0][0] < now:
+            expires_at, incident_id = heapq.heappop(self.expiry)
+            incident = self.by_id.get(incident_id)
+            # Stale entries belong to incidents that were extended, merged or closed since
+            if incident is not None and incident.expires_at == expires_at:
+                self._close(incident)
+
+    def _close(self, incident: Incident) -> None:
+        entry = self.devices.get(incident.device_id)
+        if entry is not None:
+            starts, incidents = entry
+            index = incidents.index(incident)
+            del starts[index], incidents[index]
+            if not incidents:
+                del self.devices[incident.device_id]
+        self.by_id.pop(incident.id, None)
+        incident.state = "closed"
+        self.closed.append(incident)
+        self.stats["closed"] += 1
+
+    def _evict_device(self, device_id: str) -> None:
+        for incident in list(self.devices[device_id][1]):
+            self._close(incident)
+        self.stats["evicted"] += 1
+
+    def update_status(self, alert, status_of: Callable[[str], Optional[str]]) -> Optional[Dict[str, Any]]:
+        """
+        Re-derive the status of the incident holding ``alert`` after an analyst change
+
+        Args:
+            alert: The changed alert (Alert or its dict form)
+            status_of: Current status of an alert id, None if unknown
+
+        Returns:
+            The updated incident dict, or None if no incident lists the alert
+        """
+        alert_id = alert.get("id")
+        device_id = alert.get("device_id", "unknown")
+        with self.lock:
+            entry = self.devices.get(device_id)
+            candidates = list(entry[1]) if entry else []
+            candidates.extend(i for i in reversed(self.closed) if i.device_id == device_id)
+            incident = next((i for i in candidates if alert_id in i.alert_ids), None)
+            if incident is None:
+                return None
+            statuses = [status for status in map(status_of, incident.alert_ids) if status in _STATUS_RANK]
+            incident.status = min(statuses, key=_STATUS_RANK.get) if statuses else "open"
+            return incident.to_dict()
+
+    def get(self, incident_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            incident = self.by_id.get(incident_id)
+            if incident is None:
+                incident = next((i for i in self.closed if i.id == incident_id), None)
+            return incident.to_dict() if incident is not None else None
+
+    def incidents(self, state: str = "open", device_id: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Open or recently closed incidents, newest first"""
+        with self.lock:
+            if state == "open":
+                if device_id is not None:
+                    entry = self.devices.get(device_id)
+                    pool = list(entry[1]) if entry else []
+                else:
+                    pool = list(self.by_id.values())
+                pool.sort(key=lambda incident: incident.end, reverse=True)
+            else:
+                pool = [i for i in reversed(self.closed) if device_id is None or i.device_id == device_id]
+            return [incident.to_dict() for incident in pool[:limit]]
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "path": self.path,
+                "window_seconds": self.window,
+                "max_span_seconds": self.max_span,
+                "allowed_lateness_seconds": self.lateness,
+                "rules": [rule.name for rule in self.rules],
+                "open_incidents": len(self.by_id),
+                "devices": len(self.devices),
+                "expiry_heap": len(self.expiry),
+                **{key: (dict(value) if isinstance(value, dict) else value) for key, value in self.stats.items()}
+            }
+
+def load_correlation_spec(path: str) -> Dict[str, Any]:
+    """Read a YAML correlation spec"""
+    if not YAML_AVAILABLE:
+        raise ImportError("pyyaml is required to load correlation rules")
+    with open(path, "r") as f:
+        spec = yaml.safe_load(f) or {}
+    if not isinstance(spec, dict):
+        raise RuleError(f"{path}: correlation spec must be a mapping")
+    return spec
+
+# Throughput benchmark
+if __name__ == "__main__":
+    import random
+    import time
+    import tracemalloc
+
+    methods = ["signature", "behavioral", "encrypted", "ml_model", "trained_model", "social_engineering"]
+    random.seed(0)
+    base = datetime(2026, 1, 1).timestamp()
+    count = 500_000
+    alerts = [
+        {
+            "id": f"a{n}",
+            "timestamp": datetime.fromtimestamp(base + n * 0.05 + random.uniform(-2, 2)).isoformat(),
+            "device_id": f"dev-{random.randrange(20000)}",
+            "detection_method": random.choice(methods),
+            "threat_type": "Test",
+            "severity": random.choice(SEVERITY_ORDER),
+            "confidence": random.random()
+        }
+        for n in range(count)
+    ]
+
+    correlator = AlertCorrelator(max_devices=5000)
+    start = time.perf_counter()
+    for alert in alerts:
+        correlator.observe(alert)
+    elapsed = time.perf_counter() - start
+    print(f"{count:,} alerts in {elapsed:.2f} s ({elapsed / count * 1e6:.1f} us/alert)")
+
+    # Memory stays flat once devices and windows are saturated
+    tracemalloc.start()
+    for alert in alerts[:100_000]:
+        alert = dict(alert, id="b" + alert["id"])
+        correlator.observe(alert)
+    current, peak = tracemalloc.get_traced_memory()
+    print(f"100,000 more alerts: {current / 2**20:.1f} MiB retained, peak {peak / 2**20:.1f} MiB")
+    print(correlator.summary())
@@ -0,0 +1,417 @@
+"""
+Columnar, chunked detection history with time-bucketed aggregation
+
+Each detection is one row of fixed-width columns: epoch timestamp, score
+and dictionary-encoded codes for threat_type, severity, device_id and
+detection_method. Rows go into preallocated chunks of ``chunk_size``.
+Sealed chunks older than ``raw_retention`` (or beyond ``max_raw_rows``)
+are rolled up into per-``rollup_bucket`` counts, score sums and maxima,
+so weeks of history fit in bounded memory while recent data keeps full
+resolution. Compaction runs whenever a chunk fills and at most every
+``compact_interval`` seconds on record or query, so retention also
+applies to stores that never fill a chunk. Bucket labels are UTC.
+"""
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+from datetime import datetime, timezone
+import logging
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ("threat_type", "severity", "device_id", "detection_method")
+
+BUCKETS = {
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400
+}
+
+def to_epoch(timestamp: Any) -> float:
+    """Epoch seconds from an ISO-8601 string, datetime or number"""
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    return datetime.fromisoformat(str(timestamp).replace("Z", "+00:00")).timestamp()
+
+class DictionaryEncoder:
+    """Maps recurring strings to dense int32 codes"""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value: Any) -> int:
+        value = "unknown" if value is None else str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: str) -> Optional[int]:
+        return self.codes.get(value)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+class HistoryChunk:
+    """Preallocated column arrays for ``capacity`` rows"""
+
+    def __init__(self, capacity: int):
+        self.size = 0
+        self.timestamps = np.empty(capacity, dtype=np.float64)
+        self.scores = np.empty(capacity, dtype=np.float64)
+        self.codes = np.empty((len(DIMENSIONS), capacity), dtype=np.int32)
+        self.min_timestamp = np.inf
+        self.max_timestamp = -np.inf
+
+    @property
+    def full(self) -> bool:
+        return self.size == len(self.timestamps)
+
+    def columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.timestamps[:self.size], self.scores[:self.size], self.codes[:, :self.size]
+
+    def keep(self, mask: np.ndarray) -> None:
+        """Drop rows where ``mask`` is False, compacting the rest in place"""
+        kept = int(mask.sum())
+        self.timestamps[:kept] = self.timestamps[:self.size][mask]
+        self.scores[:kept] = self.scores[:self.size][mask]
+        self.codes[:, :kept] = self.codes[:, :self.size][:, mask]
+        self.size = kept
+        self.min_timestamp = self.timestamps[:kept].min() if kept else np.inf
+        self.max_timestamp = self.timestamps[:kept].max() if kept else -np.inf
+
+class Rollups:
+    """Downsampled aggregates: one row per (bucket, dimension codes)"""
+
+    def __init__(self):
+        self.buckets = np.empty(0, dtype=np.float64)
+        self.codes = np.empty((len(DIMENSIONS), 0), dtype=np.int32)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.score_sums = np.empty(0, dtype=np.float64)
+        self.score_maxes = np.empty(0, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.buckets)
+
+    def extend(self, buckets, codes, counts, score_sums, score_maxes) -> None:
+        self.buckets = np.concatenate([self.buckets, buckets])
+        self.codes = np.concatenate([self.codes, codes], axis=1)
+        self.counts = np.concatenate([self.counts, counts])
+        self.score_sums = np.concatenate([self.score_sums, score_sums])
+        self.score_maxes = np.concatenate([self.score_maxes, score_maxes])
+
+    def drop_before(self, cutoff: float) -> None:
+        keep = self.buckets >= cutoff
+        if not keep.all():
+            self.buckets = self.buckets[keep]
+            self.codes = self.codes[:, keep]
+            self.counts = self.counts[keep]
+            self.score_sums = self.score_sums[keep]
+            self.score_maxes = self.score_maxes[keep]
+
+def _group(buckets: np.ndarray, codes: np.ndarray, counts: np.ndarray, score_sums: np.ndarray,
+           score_maxes: np.ndarray, cardinalities: Sequence[int], step: float):
+    """
+    Sum counts and scores per distinct (bucket, codes) combination
+
+    Keys are packed into one int64 per row (mixed radix over the bucket
+    index and code cardinalities). Small key ranges are grouped with a
+    dense bincount, larger ones through np.unique.
+    """
+    if len(buckets) == 0:
+        return buckets, codes, counts, score_sums, score_maxes
+    origin = buckets.min()
+    key = np.rint((buckets - origin) / step).astype(np.int64)
+    for row, cardinality in zip(codes, cardinalities):
+        key = key * max(cardinality, 1) + row
+
+    key_range = int(key.max()) + 1
+    if key_range <= max(4 * len(key), 1 << 16):
+        present = np.bincount(key, minlength=key_range) > 0
+        unique_keys = np.flatnonzero(present)
+        dense = np.full(key_range, -1, dtype=np.int64)
+        dense[unique_keys] = np.arange(len(unique_keys))
+        inverse = dense[key]
+        first = np.empty(len(unique_keys), dtype=np.int64)
+        first[inverse[::-1]] = np.arange(len(key) - 1, -1, -1)
+    else:
+        unique_keys, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+
+    group_maxes = np.full(len(unique_keys), -np.inf, dtype=np.float64)
+    np.maximum.at(group_maxes, inverse, score_maxes)
+    return (
+        buckets[first],
+        codes[:, first],
+        np.bincount(inverse, weights=counts, minlength=len(unique_keys)).astype(np.int64),
+        np.bincount(inverse, weights=score_sums, minlength=len(unique_keys)),
+        group_maxes
+    )
+
+class DetectionHistory:
+    """
+    Append-only detection history supporting vectorized group-by queries
+
+    Args:
+        chunk_size: Rows per raw chunk
+        raw_retention: Seconds of full-resolution history to keep
+        max_raw_rows: Cap on full-resolution rows; older chunks are rolled up early
+        rollup_bucket: Rollup resolution in seconds
+        rollup_retention: Seconds of rollups to keep
+        compact_interval: Minimum seconds between time-based compactions
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 65536,
+        raw_retention: float = 7 * 86400,
+        max_raw_rows: int = 2_000_000,
+        rollup_bucket: int = 3600,
+        rollup_retention: float = 180 * 86400,
+        compact_interval: float = 60.0
+    ):
+        self.chunk_size = chunk_size
+        self.raw_retention = raw_retention
+        self.max_raw_rows = max_raw_rows
+        self.rollup_bucket = rollup_bucket
+        self.rollup_retention = rollup_retention
+        self.compact_interval = compact_interval
+        self.next_compact = time.monotonic() + compact_interval
+
+        self.encoders = {dimension: DictionaryEncoder() for dimension in DIMENSIONS}
+        self.chunks: List[HistoryChunk] = [HistoryChunk(chunk_size)]
+        self.rollups = Rollups()
+        self.lock = threading.Lock()
+        self.total = 0
+        self.rolled_rows = 0
+
+    def record(self, timestamp: Any, threat_type: str, severity: str, device_id: str,
+               detection_method: str, score: float = 0.0) -> None:
+        """Append one detection"""
+        ts = to_epoch(timestamp)
+        with self.lock:
+            chunk = self.chunks[-1]
+            i = chunk.size
+            chunk.timestamps[i] = ts
+            chunk.scores[i] = score
+            for d, value in enumerate((threat_type, severity, device_id, detection_method)):
+                chunk.codes[d, i] = self.encoders[DIMENSIONS[d]].encode(value)
+            chunk.size += 1
+            chunk.min_timestamp = min(chunk.min_timestamp, ts)
+            chunk.max_timestamp = max(chunk.max_timestamp, ts)
+            self.total += 1
+            if chunk.full:
+                self.chunks.append(HistoryChunk(self.chunk_size))
+                self._compact()
+            elif time.monotonic() >= self.next_compact:
+                self._compact()
+
+    def record_alert(self, alert) -> None:
+        """Append the detection behind an alert (Alert record or wire dict)"""
+        self.record(alert["timestamp"], alert["threat_type"], alert["severity"],
+                    alert["device_id"], alert["detection_method"], alert.get("confidence", 0.0))
+
+    def compact(self, now: Optional[float] = None) -> None:
+        """Apply raw and rollup retention now"""
+        with self.lock:
+            self._compact(now)
+
+    def _roll(self, timestamps: np.ndarray, scores: np.ndarray, codes: np.ndarray) -> None:
+        buckets = np.floor(timestamps / self.rollup_bucket) * self.rollup_bucket
+        self.rollups.extend(buckets, codes, np.ones(len(buckets), dtype=np.int64), scores, scores)
+        self.rolled_rows += len(timestamps)
+
+    def _compact(self, now: Optional[float] = None) -> None:
+        """
+        Roll expired or excess raw rows into rollups (lock held)
+
+        Whole chunks are rolled while the raw row count exceeds
+        ``max_raw_rows``; otherwise only rows older than ``raw_retention``
+        are, which may leave a chunk (including the live one) partly filled.
+        """
+        now = time.time() if now is None else now
+        self.next_compact = time.monotonic() + self.compact_interval
+        cutoff = now - self.raw_retention
+        raw_rows = sum(chunk.size for chunk in self.chunks)
+        rolled = False
+        while len(self.chunks) > 1 and raw_rows > self.max_raw_rows:
+            oldest = self.chunks.pop(0)
+            self._roll(*oldest.columns())
+            raw_rows -= oldest.size
+            rolled = True
+        for chunk in list(self.chunks):
+            if chunk.min_timestamp >= cutoff:
+                continue
+            timestamps, scores, codes = chunk.columns()
+            expired = timestamps < cutoff
+            self._roll(timestamps[expired], scores[expired], codes[:, expired])
+            chunk.keep(~expired)
+            if chunk.size == 0 and chunk is not self.chunks[-1]:
+                self.chunks.remove(chunk)
+            rolled = True
+        if rolled:
+            # Merge rows for the same bucket and codes coming from different chunks
+            r = self.rollups
+            merged = _group(r.buckets, r.codes, r.counts, r.score_sums, r.score_maxes,
+                            self._cardinalities(), self.rollup_bucket)
+            self.rollups = Rollups()
+            self.rollups.extend(*merged)
+        self.rollups.drop_before(now - self.rollup_retention)
+
+    def _cardinalities(self) -> List[int]:
+        return [len(self.encoders[dimension]) for dimension in DIMENSIONS]
+
+    def _filter_codes(self, filters: Dict[str, Optional[str]]) -> Optional[Dict[int, int]]:
+        """Dimension index -> code for equality filters; None if a value was never seen"""
+        wanted = {}
+        for d, dimension in enumerate(DIMENSIONS):
+            value = filters.get(dimension)
+            if value is not None:
+                code = self.encoders[dimension].lookup(value)
+                if code is None:
+                    return None
+                wanted[d] = code
+        return wanted
+
+    def aggregate(
+        self,
+        group_by: Sequence[str] = (),
+        bucket: Optional[int] = None,
+        since: Any = None,
+        until: Any = None,
+        filters: Optional[Dict[str, Optional[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Count detections per time bucket and dimension values
+
+        Args:
+            group_by: Subset of DIMENSIONS to group by
+            bucket: Bucket width in seconds; None for a single bucket. Rolled-up
+                    ranges are only available at ``rollup_bucket`` resolution.
+            since, until: Inclusive time range (ISO-8601 or epoch seconds)
+            filters: Equality filters on DIMENSIONS
+
+        Returns:
+            Rows with ``bucket`` (ISO start, if bucketed), the grouped
+            dimension values, ``count``, ``avg_score`` and ``max_score``,
+            ordered by bucket then count descending
+        """
+        unknown = [dimension for dimension in group_by if dimension not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Cannot group by {', '.join(unknown)}")
+        low = to_epoch(since) if since is not None else -np.inf
+        high = to_epoch(until) if until is not None else np.inf
+        group_dims = [DIMENSIONS.index(dimension) for dimension in group_by]
+
+        with self.lock:
+            if time.monotonic() >= self.next_compact:
+                self._compact()
+            wanted = self._filter_codes(filters or {})
+            if wanted is None:
+                return []
+            cardinalities = self._cardinalities()
+            parts = []
+            sources = [chunk.columns() for chunk in self.chunks if chunk.size]
+            for timestamps, scores, codes in sources:
+                parts.append((timestamps, codes, np.ones(len(timestamps), dtype=np.int64),
+                              scores, scores))
+            if len(self.rollups):
+                r = self.rollups
+                parts.append((r.buckets, r.codes, r.counts, r.score_sums, r.score_maxes))
+
+            selected = []
+            for timestamps, codes, counts, score_sums, score_maxes in parts:
+                if not wanted and low <= timestamps.min() and timestamps.max() <= high:
+                    selected.append((timestamps, codes[group_dims], counts, score_sums, score_maxes))
+                    continue
+                mask = (timestamps >= low) & (timestamps <= high)
+                for d, code in wanted.items():
+                    mask &= codes[d] == code
+                if mask.any():
+                    selected.append((timestamps[mask], codes[group_dims][:, mask], counts[mask],
+                                     score_sums[mask], score_maxes[mask]))
+
+        if not selected:
+            return []
+        timestamps = np.concatenate([s[0] for s in selected])
+        codes = np.concatenate([s[1] for s in selected], axis=1)
+        counts = np.concatenate([s[2] for s in selected])
+        score_sums = np.concatenate([s[3] for s in selected])
+        score_maxes = np.concatenate([s[4] for s in selected])
+
+        buckets = np.floor(timestamps / bucket) * bucket if bucket else np.zeros(len(timestamps))
+        buckets, codes, counts, score_sums, score_maxes = _group(
+            buckets, codes, counts, score_sums, score_maxes,
+            [cardinalities[d] for d in group_dims], bucket or 1
+        )
+
+        order = np.lexsort((-counts, buckets))
+        labels = {b: datetime.fromtimestamp(b, tz=timezone.utc).isoformat() for b in np.unique(buckets).tolist()} if bucket else {}
+        columns = [
+            [self.encoders[DIMENSIONS[d]].values[code] for code in row]
+            for d, row in zip(group_dims, codes[:, order].tolist())
+        ]
+        rows = []
+        for i, (b, count, score_sum, score_max) in enumerate(zip(
+            buckets[order].tolist(), counts[order].tolist(),
+            score_sums[order].tolist(), score_maxes[order].tolist()
+        )):
+            row = {"bucket": labels[b]} if bucket else {}
+            for dimension, column in zip(group_by, columns):
+                row[dimension] = column[i]
+            row["count"] = count
+            row["avg_score"] = score_sum / count
+            row["max_score"] = score_max
+            rows.append(row)
+        return rows
+
+    def recent(self, limit: int) -> List[Dict[str, Any]]:
+        """Newest full-resolution detections, oldest first"""
+        rows = []
+        with self.lock:
+            for chunk in reversed(self.chunks):
+                for i in range(chunk.size - 1, -1, -1):
+                    if len(rows) >= limit:
+                        break
+                    row = {"timestamp": datetime.fromtimestamp(chunk.timestamps[i], tz=timezone.utc).isoformat()}
+                    for d, dimension in enumerate(DIMENSIONS):
+                        row[dimension] = self.encoders[dimension].values[chunk.codes[d, i]]
+                    row["score"] = float(chunk.scores[i])
+                    rows.append(row)
+        return rows[::-1]
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "total": self.total,
+                "raw_rows": sum(chunk.size for chunk in self.chunks),
+                "chunks": len(self.chunks),
+                "rolled_rows": self.rolled_rows,
+                "rollup_rows": len(self.rollups),
+                "cardinalities": dict(zip(DIMENSIONS, self._cardinalities()))
+            }
+
+# Aggregation benchmark
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    history = DetectionHistory(raw_retention=3 * 86400)
+    now = time.time()
+    count = 1_000_000
+    timestamps = np.sort(now - rng.random(count) * 21 * 86400)
+    threat_types = [f"Threat {i}" for i in range(12)]
+    severities = ["low", "medium", "high", "critical"]
+
+    start = time.perf_counter()
+    for i in range(count):
+        history.record(timestamps[i], threat_types[i % 12], severities[i % 4], f"device-{i % 500}", "ml_model", 0.7)
+    print(f"record: {(time.perf_counter() - start) / count * 1e6:.2f} us/row, {history.summary()}")
+
+    for group_by, bucket in ((["threat_type"], 3600), (["severity", "device_id"], 86400), ([], 60)):
+        start = time.perf_counter()
+        rows = history.aggregate(group_by, bucket, since=now - 21 * 86400)
+        print(f"group_by={group_by} bucket={bucket}: {len(rows)} rows in {(time.perf_counter() - start) * 1000:.1f} ms")
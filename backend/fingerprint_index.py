@@ -0,0 +1,378 @@
+"""
+Compiled TLS fingerprint index for threat-intel lookups
+
+Indicators (JA3/JA3S hashes, SNI names, certificate fingerprints) from
+local IOC files are hashed to 64-bit keys and compiled into a model bundle
+holding:
+
+- a Bloom filter, small enough to stay cache-resident, that rejects almost
+  all clean lookups without touching the table
+- an open-addressing hash table (linear probing, load factor <= 0.5) of
+  keys and label ids, so a hit costs O(1) probes
+
+The bundle is published through shared_models, so every worker maps the
+same pages and a rebuilt index replaces the old one atomically.
+
+IOC files (``*.csv``, ``*.txt``, ``*.ndjson``, ``*.jsonl``) hold one
+indicator per line, either ``kind,value[,label[,severity]]`` or a JSON
+object with those fields. ``#`` starts a comment line.
+"""
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Iterator
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from shared_models import ModelPublisher, SharedModelRegistry, DEFAULT_SHARED_DIR, source_checksum
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "fingerprints"
+# Part of the source checksum; bump when compile_index changes the layout
+INDEX_FORMAT = "fingerprints-1"
+DEFAULT_IOC_DIR = os.getenv("FINGERPRINT_IOC_DIR", os.path.join(os.path.dirname(__file__), "ioc"))
+
+KINDS = ("ja3", "ja3s", "sni", "cert_sha1", "cert_sha256")
+_KIND_ALIASES = {"domain": "sni", "server_name": "sni", "cert_fingerprint": "cert", "cert": "cert"}
+SEVERITIES = ("low", "medium", "high", "critical")
+
+BLOOM_BITS_PER_KEY = 10
+BLOOM_HASHES = 7
+
+def normalize_indicator(kind: str, value: str) -> Optional[Tuple[str, str]]:
+    """Canonical (kind, value), or None for unsupported kinds"""
+    kind = _KIND_ALIASES.get(kind.strip().lower(), kind.strip().lower())
+    value = value.strip().lower()
+    if kind == "sni":
+        value = value.rstrip(".")
+    else:
+        value = value.replace(":", "")
+    if kind == "cert":
+        kind = "cert_sha1" if len(value) == 40 else "cert_sha256" if len(value) == 64 else None
+    if kind not in KINDS or not value:
+        return None
+    return kind, value
+
+def indicator_key(kind: str, value: str) -> int:
+    """64-bit key of a normalized indicator; 0 is reserved for empty table slots"""
+    key = int.from_bytes(hashlib.blake2b(f"{kind}:{value}".encode("utf-8"), digest_size=8).digest(), "little")
+    return key or 1
+
+def _bloom_positions(keys: np.ndarray, bits: int) -> np.ndarray:
+    """Bit positions, shape (len(keys), BLOOM_HASHES), by double hashing the key halves"""
+    h1 = keys & np.uint64(0xFFFFFFFF)
+    h2 = (keys >> np.uint64(32)) | np.uint64(1)
+    i = np.arange(BLOOM_HASHES, dtype=np.uint64)
+    return ((h1[:, None] + i[None, :] * h2[:, None]) % np.uint64(bits)).astype(np.int64)
+
+def _mix(keys: np.ndarray, mask: int) -> np.ndarray:
+    # High bits choose the slot; the Bloom filter already uses the low half
+    return ((keys >> np.uint64(17)) & np.uint64(mask)).astype(np.int64)
+
+def ioc_paths(directory: str) -> List[str]:
+    """IOC files in a directory, in compile order"""
+    patterns = ("*.csv", "*.txt", "*.ndjson", "*.jsonl")
+    return sorted(p for pattern in patterns for p in glob.glob(os.path.join(directory, pattern)))
+
+def iter_ioc_records(directory: str) -> Iterator[Dict[str, Any]]:
+    """Yield raw indicator records from every IOC file in a directory"""
+    for path in ioc_paths(directory):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("{"):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                else:
+                    parts = [part.strip() for part in line.split(",")]
+                    if len(parts) < 2:
+                        continue
+                    record = dict(zip(("kind", "value", "label", "severity"), parts))
+                record.setdefault("source", os.path.basename(path))
+                yield record
+
+def compile_index(records, load_factor: float = 0.5) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Compile indicator records into bundle arrays
+
+    Args:
+        records: Iterable of dicts with kind, value and optional label, severity
+        load_factor: Maximum fraction of occupied hash table slots
+
+    Returns:
+        (arrays, metadata) for save_bundle / ModelPublisher.publish
+    """
+    labels: List[str] = []
+    label_ids: Dict[Tuple[str, str], int] = {}
+    label_severity: List[str] = []
+    keys = []
+    values = []
+    seen = set()
+    skipped = 0
+    for record in records:
+        normalized = normalize_indicator(str(record.get("kind", "")), str(record.get("value", "")))
+        if normalized is None:
+            skipped += 1
+            continue
+        key = indicator_key(*normalized)
+        if key in seen:
+            continue
+        seen.add(key)
+        label = str(record.get("label") or record.get("source") or "ioc")
+        severity = str(record.get("severity") or "high").lower()
+        severity = severity if severity in SEVERITIES else "high"
+        label_id = label_ids.get((label, severity))
+        if label_id is None:
+            label_id = label_ids[(label, severity)] = len(labels)
+            labels.append(label)
+            label_severity.append(severity)
+        keys.append(key)
+        values.append(label_id)
+
+    keys = np.array(keys, dtype=np.uint64)
+    values = np.array(values, dtype=np.uint32)
+
+    size = 1 << max(4, int(np.ceil(np.log2(max(1, len(keys)) / load_factor))))
+    table_keys = np.zeros(size, dtype=np.uint64)
+    table_values = np.zeros(size, dtype=np.uint32)
+
+    # Vectorized linear probing: each round, the first key claiming an empty slot wins it
+    pending = np.arange(len(keys))
+    positions = _mix(keys, size - 1)
+    while len(pending):
+        slots = positions[pending]
+        free = table_keys[slots] == 0
+        _, first = np.unique(slots, return_index=True)
+        winners = np.zeros(len(pending), dtype=bool)
+        winners[first] = True
+        winners &= free
+        table_keys[slots[winners]] = keys[pending[winners]]
+        table_values[slots[winners]] = values[pending[winners]]
+        pending = pending[~winners]
+        positions[pending] = (positions[pending] + 1) & (size - 1)
+
+    bloom_bits = max(64, len(keys) * BLOOM_BITS_PER_KEY)
+    bloom_bits = (bloom_bits + 63) // 64 * 64
+    bloom = np.zeros(bloom_bits // 8, dtype=np.uint8)
+    if len(keys):
+        bits = _bloom_positions(keys, bloom_bits).ravel()
+        np.bitwise_or.at(bloom, bits >> 3, (1 << (bits & 7)).astype(np.uint8))
+
+    metadata = {
+        "indicators": int(len(keys)),
+        "skipped": skipped,
+        "labels": labels,
+        "label_severity": label_severity,
+        "bloom_bits": bloom_bits,
+        "bloom_hashes": BLOOM_HASHES
+    }
+    return {"table_keys": table_keys, "table_values": table_values, "bloom": bloom}, metadata
+
+class FingerprintView:
+    """Lookups over one attached index bundle"""
+
+    def __init__(self, bundle):
+        self.bundle = bundle
+        self.table_keys = bundle.array("table_keys")
+        self.table_values = bundle.array("table_values")
+        self.bloom = bundle.array("bloom")
+        self.bloom_bits = bundle.metadata["bloom_bits"]
+        self.labels = bundle.metadata["labels"]
+        self.label_severity = bundle.metadata["label_severity"]
+        self.mask = len(self.table_keys) - 1
+
+    def lookup_keys(self, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Returns:
+            (label id per key or -1, Bloom pass mask, table probes performed)
+        """
+        result = np.full(len(keys), -1, dtype=np.int64)
+        bits = _bloom_positions(keys, self.bloom_bits)
+        maybe = np.all((self.bloom[bits >> 3] >> (bits & 7)) & 1, axis=1)
+
+        pending = np.flatnonzero(maybe)
+        positions = _mix(keys[pending], self.mask)
+        probes = 0
+        while len(pending):
+            probes += len(pending)
+            slots = self.table_keys[positions]
+            found = slots == keys[pending]
+            result[pending[found]] = self.table_values[positions[found]]
+            unresolved = ~found & (slots != 0)
+            pending = pending[unresolved]
+            positions = (positions[unresolved] + 1) & self.mask
+        return result, maybe, probes
+
+class FingerprintIndex:
+    """
+    Reloadable, shared fingerprint index
+
+    Args:
+        ioc_dir: Directory of IOC files compiled by ``rebuild``
+        registry: Shared registry the compiled index is attached from
+        publisher: Publisher used by ``rebuild``; defaults to the registry's directory
+    """
+
+    def __init__(self, ioc_dir: str = DEFAULT_IOC_DIR, registry: Optional[SharedModelRegistry] = None,
+                 publisher: Optional[ModelPublisher] = None):
+        self.ioc_dir = ioc_dir
+        self.registry = registry or SharedModelRegistry(DEFAULT_SHARED_DIR)
+        self.publisher = publisher or ModelPublisher(self.registry.directory)
+        self._view: Optional[FingerprintView] = None
+        self.lock = threading.Lock()
+        self.stats = {"lookups": 0, "bloom_rejected": 0, "probes": 0, "hits": 0, "rebuilds": 0}
+
+    def source_checksum(self) -> str:
+        """Checksum of the IOC files the index would be compiled from"""
+        return source_checksum(ioc_paths(self.ioc_dir) if os.path.isdir(self.ioc_dir) else [], INDEX_FORMAT)
+
+    def rebuild(self, checksum: Optional[str] = None) -> Dict[str, Any]:
+        """Compile the IOC directory and publish it to all workers"""
+        checksum = checksum or self.source_checksum()
+        records = iter_ioc_records(self.ioc_dir) if os.path.isdir(self.ioc_dir) else iter(())
+        arrays, metadata = compile_index(records)
+        self.publisher.publish(INDEX_NAME, arrays, {**metadata, "source_checksum": checksum})
+        self.stats["rebuilds"] += 1
+        logger.info(f"Compiled fingerprint index: {metadata['indicators']} indicators, {metadata['skipped']} skipped")
+        return {"indicators": metadata["indicators"], "skipped": metadata["skipped"], "labels": len(metadata["labels"])}
+
+    def ensure_loaded(self) -> None:
+        """Build the index unless the published one was compiled from the current IOC files"""
+        checksum = self.source_checksum()
+        if self.registry.available(INDEX_NAME):
+            try:
+                if self.registry.get(INDEX_NAME).metadata.get("source_checksum") == checksum:
+                    return
+                logger.info("Published fingerprint index is stale, rebuilding")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Cannot attach published fingerprint index, rebuilding: {e}")
+        self.rebuild(checksum)
+
+    def _current(self) -> FingerprintView:
+        bundle = self.registry.get(INDEX_NAME)
+        view = self._view
+        if view is None or view.bundle is not bundle:
+            view = self._view = FingerprintView(bundle)
+        return view
+
+    def lookup_batch(self, indicators: Sequence[Tuple[str, str]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Look up many (kind, value) indicators at once
+
+        Returns:
+            One entry per indicator: None when clean or unsupported, otherwise
+            a dict with kind, value, label and severity
+        """
+        normalized = [normalize_indicator(kind, value) for kind, value in indicators]
+        positions = [i for i, n in enumerate(normalized) if n is not None]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(indicators)
+        if not positions:
+            return results
+
+        view = self._current()
+        keys = np.array([indicator_key(*normalized[i]) for i in positions], dtype=np.uint64)
+        label_ids, maybe, probes = view.lookup_keys(keys)
+        for i, label_id in zip(positions, label_ids.tolist()):
+            if label_id >= 0:
+                kind, value = normalized[i]
+                results[i] = {
+                    "kind": kind,
+                    "value": value,
+                    "label": view.labels[label_id],
+                    "severity": view.label_severity[label_id]
+                }
+
+        with self.lock:
+            self.stats["lookups"] += len(keys)
+            self.stats["bloom_rejected"] += int(len(keys) - maybe.sum())
+            self.stats["probes"] += probes
+            self.stats["hits"] += int((label_ids >= 0).sum())
+        return results
+
+    def summary(self) -> Dict[str, Any]:
+        view = self._current()
+        return {
+            "ioc_dir": self.ioc_dir,
+            "version": self.registry.versions().get(INDEX_NAME),
+            "indicators": view.bundle.metadata["indicators"],
+            "table_slots": len(view.table_keys),
+            "bloom_bytes": len(view.bloom),
+            **self.stats
+        }
+
+def extract_indicators(network_data: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Pull TLS fingerprints out of a network_data payload (top level or per connection)"""
+    sessions = network_data.get("connections") or network_data.get("sessions") or [network_data]
+    indicators = []
+    for session in sessions:
+        if not isinstance(session, dict):
+            continue
+        for field, kind in (("ja3", "ja3"), ("ja3_hash", "ja3"), ("ja3s", "ja3s"), ("ja3s_hash", "ja3s"),
+                            ("sni", "sni"), ("server_name", "sni"),
+                            ("cert_sha1", "cert_sha1"), ("cert_sha256", "cert_sha256"),
+                            ("cert_fingerprint", "cert")):
+            value = session.get(field)
+            if isinstance(value, str) and value:
+                indicators.append((kind, value))
+    return indicators
+
+# Risk score (0-10 scale of the encrypted detector) contributed by a match
+SEVERITY_RISK = {"low": 3.0, "medium": 5.0, "high": 8.0, "critical": 10.0}
+
+def merge_matches(result: Dict[str, Any], matches: Sequence[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Fold fingerprint matches into an encrypted detector result in place"""
+    hits = [match for match in matches if match is not None]
+    result["fingerprint_matches"] = hits
+    if not hits:
+        return result
+    result.setdefault("threats_detected", []).extend(
+        {"type": "known_bad_fingerprint", **match} for match in hits
+    )
+    types = result.setdefault("threat_types", [])
+    if "known_bad_fingerprint" not in types:
+        types.append("known_bad_fingerprint")
+    score = max(result.get("overall_risk_score", 0.0), max(SEVERITY_RISK[m["severity"]] for m in hits))
+    result["overall_risk_score"] = score
+    result["threat_level"] = "CRITICAL" if score >= 9 else "HIGH" if score >= 7 else "MEDIUM" if score >= 4 else "LOW"
+    return result
+
+# Build and lookup benchmark
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    count = 1_000_000
+    rng = np.random.default_rng(0)
+    print(f"Generating {count:,} indicators...")
+    records = (
+        {"kind": KINDS[i % 4], "value": f"{rng.integers(1 << 62):032x}" if i % 4 != 2 else f"host{i}.example-bad.net",
+         "label": f"feed-{i % 16}", "severity": SEVERITIES[i % 4]}
+        for i in range(count)
+    )
+
+    directory = tempfile.mkdtemp()
+    index = FingerprintIndex(registry=SharedModelRegistry(directory), publisher=ModelPublisher(directory))
+    start = time.perf_counter()
+    arrays, metadata = compile_index(records)
+    index.publisher.publish(INDEX_NAME, arrays, metadata)
+    print(f"compile+publish: {time.perf_counter() - start:.2f} s, "
+          f"{sum(a.nbytes for a in arrays.values()) / 2**20:.1f} MiB "
+          f"(table {arrays['table_keys'].nbytes / 2**20:.1f} MiB, bloom {arrays['bloom'].nbytes / 2**20:.1f} MiB)")
+
+    batch = [("sni", f"host{i}.example-bad.net") for i in range(2, 4000, 4)] + \
+            [("ja3", f"{rng.integers(1 << 62):032x}") for _ in range(99000)]
+    index.lookup_batch(batch[:10])
+    start = time.perf_counter()
+    results = index.lookup_batch(batch)
+    elapsed = time.perf_counter() - start
+    print(f"batch lookup: {len(batch):,} indicators in {elapsed * 1000:.0f} ms "
+          f"({elapsed / len(batch) * 1e6:.2f} us each), {sum(r is not None for r in results)} hits")
+    print(index.summary())
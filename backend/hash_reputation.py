@@ -0,0 +1,422 @@
+"""
+Local hash-reputation tier for signature detection
+
+Known-good and known-bad file hashes (MD5, SHA-1, SHA-256) from local hash
+lists are compiled into a model bundle of sorted arrays: per set and
+algorithm, the first 8 bytes of each digest as a sorted uint64 array
+(binary-searched) plus the aligned full digests to confirm a hit. The
+bundle is published through shared_models, so workers share the pages and
+pick up rebuilt lists atomically.
+
+``HashReputation`` answers from these sets first and only consults the
+external lookup (VirusTotal, or a local stand-in in tests) for hashes that
+are in neither set; the heavyweight scanners (YARA, ClamAV) run only for
+files still unknown after that.
+
+Hash lists live in ``HASH_REPUTATION_DIR``: files named ``known_good*`` or
+``known_bad*`` (``.txt``/``.csv``) with one ``hash[,label]`` per line.
+"""
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+import glob
+import hashlib
+import json
+import logging
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+from shared_models import ModelPublisher, SharedModelRegistry, DEFAULT_SHARED_DIR, source_checksum
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "hash_reputation"
+# Part of the source checksum; bump when compile_hash_sets changes the layout
+INDEX_FORMAT = "hash_reputation-1"
+DEFAULT_HASH_DIR = os.getenv("HASH_REPUTATION_DIR", os.path.join(os.path.dirname(__file__), "hashes"))
+
+SETS = ("known_bad", "known_good")
+ALGORITHMS = {32: "md5", 40: "sha1", 64: "sha256"}
+_HEX = set("0123456789abcdef")
+
+def parse_hash(value: str) -> Optional[Tuple[str, bytes]]:
+    """(algorithm, digest) of a hex hash, or None if it is not MD5/SHA-1/SHA-256"""
+    value = value.strip().lower()
+    algorithm = ALGORITHMS.get(len(value))
+    if algorithm is None or not set(value) <= _HEX:
+        return None
+    return algorithm, bytes.fromhex(value)
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> Dict[str, str]:
+    """MD5, SHA-1 and SHA-256 of a file in one read"""
+    digests = {name: hashlib.new(name) for name in ("md5", "sha1", "sha256")}
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            for digest in digests.values():
+                digest.update(chunk)
+    return {name: digest.hexdigest() for name, digest in digests.items()}
+
+def _prefix(digests: np.ndarray) -> np.ndarray:
+    # Big-endian first 8 bytes keep numeric order equal to digest order
+    if not len(digests):
+        return np.zeros(0, dtype=np.uint64)
+    raw = np.frombuffer(digests.tobytes(), dtype=np.uint8).reshape(len(digests), digests.dtype.itemsize)
+    return np.ascontiguousarray(raw[:, :8]).view(">u8").ravel().astype(np.uint64)
+
+def hash_list_paths(directory: str) -> List[str]:
+    """Hash list files in a directory, in compile order"""
+    return [
+        path for path in sorted(glob.glob(os.path.join(directory, "*")))
+        if os.path.basename(path).startswith(SETS) and path.endswith((".txt", ".csv"))
+    ]
+
+def iter_hash_lists(directory: str):
+    """Yield (set, hash, label) from every hash list in a directory"""
+    for path in hash_list_paths(directory):
+        name = os.path.basename(path)
+        hash_set = next(s for s in SETS if name.startswith(s))
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                value, _, label = line.partition(",")
+                yield hash_set, value, label.strip() or os.path.splitext(name)[0]
+
+def compile_hash_sets(entries) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Compile (set, hash, label) entries into bundle arrays
+
+    Returns:
+        (arrays, metadata) for ModelPublisher.publish
+    """
+    buckets: Dict[Tuple[str, str], Dict[bytes, int]] = {}
+    labels: List[str] = []
+    label_ids: Dict[str, int] = {}
+    skipped = 0
+    for hash_set, value, label in entries:
+        parsed = parse_hash(value)
+        if parsed is None or hash_set not in SETS:
+            skipped += 1
+            continue
+        algorithm, digest = parsed
+        label_id = label_ids.get(label)
+        if label_id is None:
+            label_id = label_ids[label] = len(labels)
+            labels.append(label)
+        buckets.setdefault((hash_set, algorithm), {}).setdefault(digest, label_id)
+
+    arrays: Dict[str, np.ndarray] = {}
+    counts: Dict[str, int] = {}
+    for (hash_set, algorithm), digests in buckets.items():
+        size = {"md5": 16, "sha1": 20, "sha256": 32}[algorithm]
+        ordered = sorted(digests)
+        key = f"{hash_set}_{algorithm}"
+        arrays[f"{key}_digest"] = np.array(ordered, dtype=f"S{size}")
+        arrays[f"{key}_prefix"] = _prefix(arrays[f"{key}_digest"])
+        arrays[f"{key}_label"] = np.array([digests[d] for d in ordered], dtype=np.uint32)
+        counts[key] = len(ordered)
+    return arrays, {"counts": counts, "labels": labels, "skipped": skipped}
+
+class HashSetView:
+    """Batch membership queries over one attached bundle"""
+
+    def __init__(self, bundle):
+        self.bundle = bundle
+        self.labels = bundle.metadata["labels"]
+        self.tables = {
+            key: (bundle.array(f"{key}_prefix"), bundle.array(f"{key}_digest"), bundle.array(f"{key}_label"))
+            for key in bundle.metadata["counts"]
+        }
+
+    def find(self, hash_set: str, algorithm: str, digests: Sequence[bytes]) -> np.ndarray:
+        """Label id per digest, -1 where the digest is not in the set"""
+        result = np.full(len(digests), -1, dtype=np.int64)
+        table = self.tables.get(f"{hash_set}_{algorithm}")
+        if table is None or not len(digests):
+            return result
+        prefixes, stored, label_ids = table
+        query = np.array(digests, dtype=stored.dtype)
+        query_prefix = _prefix(query)
+        position = np.searchsorted(prefixes, query_prefix, side="left")
+        # Walk the (rare) runs of equal prefixes until the full digest matches
+        pending = np.arange(len(query))
+        while len(pending):
+            at = position[pending]
+            valid = at < len(prefixes)
+            pending, at = pending[valid], at[valid]
+            same_prefix = prefixes[at] == query_prefix[pending]
+            pending, at = pending[same_prefix], at[same_prefix]
+            hit = stored[at] == query[pending]
+            result[pending[hit]] = label_ids[at[hit]]
+            pending = pending[~hit]
+            position[pending] += 1
+        return result
+
+class LocalReputationLookup:
+    """
+    Stand-in for VirusTotal backed by a dict of sha256 -> verdict
+
+    Verdicts are "malicious", "suspicious" or "clean" (or dicts with a
+    "verdict" key); unknown hashes return None, like a VirusTotal 404.
+    """
+
+    name = "local"
+
+    def __init__(self, verdicts: Optional[Dict[str, Any]] = None):
+        self.verdicts = {key.lower(): value for key, value in (verdicts or {}).items()}
+        self.calls = 0
+
+    @classmethod
+    def from_file(cls, path: str) -> "LocalReputationLookup":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def lookup(self, sha256: str) -> Optional[Dict[str, Any]]:
+        self.calls += 1
+        verdict = self.verdicts.get(sha256.lower())
+        if verdict is None:
+            return None
+        return dict(verdict) if isinstance(verdict, dict) else {"verdict": verdict}
+
+class VirusTotalLookup:
+    """File reputation from the VirusTotal v3 API"""
+
+    name = "virustotal"
+    URL = "https://www.virustotal.com/api/v3/files/{}"
+
+    def __init__(self, api_key: str, timeout: float = 10.0, malicious_threshold: int = 3):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.malicious_threshold = malicious_threshold
+
+    def lookup(self, sha256: str) -> Optional[Dict[str, Any]]:
+        request = urllib.request.Request(self.URL.format(sha256), headers={"x-apikey": self.api_key})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+        stats = data.get("data", {}).get("attributes", {}).get("last_analysis_stats", {})
+        positives = int(stats.get("malicious", 0))
+        verdict = "malicious" if positives >= self.malicious_threshold else \
+            "suspicious" if positives or stats.get("suspicious") else "clean"
+        return {"verdict": verdict, "positives": positives, "engines": sum(int(v) for v in stats.values())}
+
+def create_lookup() -> Optional[Any]:
+    """External lookup chosen by HASH_LOOKUP (virustotal, local or none)"""
+    mode = os.getenv("HASH_LOOKUP", "virustotal" if os.getenv("VIRUSTOTAL_API_KEY") else "none")
+    if mode == "virustotal" and os.getenv("VIRUSTOTAL_API_KEY"):
+        return VirusTotalLookup(os.getenv("VIRUSTOTAL_API_KEY"))
+    if mode == "local" and os.getenv("HASH_LOOKUP_FILE"):
+        return LocalReputationLookup.from_file(os.getenv("HASH_LOOKUP_FILE"))
+    return None
+
+class HashReputation:
+    """
+    Known-good / known-bad prefilter in front of the signature scanners
+
+    Args:
+        hash_dir: Directory of hash lists compiled by ``rebuild``
+        registry: Shared registry the compiled sets are attached from
+        publisher: Publisher used by ``rebuild``; defaults to the registry's directory
+        lookup: External reputation source with ``lookup(sha256)``; None to skip
+        cache_size: External lookup results remembered (LRU)
+    """
+
+    def __init__(self, hash_dir: str = DEFAULT_HASH_DIR, registry: Optional[SharedModelRegistry] = None,
+                 publisher: Optional[ModelPublisher] = None, lookup: Any = None, cache_size: int = 10000):
+        self.hash_dir = hash_dir
+        self.registry = registry or SharedModelRegistry(DEFAULT_SHARED_DIR)
+        self.publisher = publisher or ModelPublisher(self.registry.directory)
+        self.lookup = lookup
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+        self._view: Optional[HashSetView] = None
+        self.lock = threading.Lock()
+        self.stats = {
+            "checked": 0, "known_bad": 0, "known_good": 0, "unknown": 0, "invalid": 0, "file_errors": 0,
+            "external_calls": 0, "external_cache_hits": 0, "external_hits": 0, "external_decided": 0,
+            "external_errors": 0, "rebuilds": 0
+        }
+
+    def source_checksum(self) -> str:
+        """Checksum of the hash lists the sets would be compiled from"""
+        return source_checksum(hash_list_paths(self.hash_dir) if os.path.isdir(self.hash_dir) else [], INDEX_FORMAT)
+
+    def rebuild(self, checksum: Optional[str] = None) -> Dict[str, Any]:
+        """Compile the hash lists and publish them to all workers"""
+        checksum = checksum or self.source_checksum()
+        entries = iter_hash_lists(self.hash_dir) if os.path.isdir(self.hash_dir) else iter(())
+        arrays, metadata = compile_hash_sets(entries)
+        self.publisher.publish(INDEX_NAME, arrays, {**metadata, "source_checksum": checksum})
+        self.stats["rebuilds"] += 1
+        logger.info(f"Compiled hash reputation sets: {metadata['counts']}, {metadata['skipped']} skipped")
+        return {"counts": metadata["counts"], "skipped": metadata["skipped"]}
+
+    def ensure_loaded(self) -> None:
+        """Build the sets unless the published ones were compiled from the current hash lists"""
+        checksum = self.source_checksum()
+        if self.registry.available(INDEX_NAME):
+            try:
+                if self.registry.get(INDEX_NAME).metadata.get("source_checksum") == checksum:
+                    return
+                logger.info("Published hash reputation sets are stale, rebuilding")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Cannot attach published hash reputation sets, rebuilding: {e}")
+        self.rebuild(checksum)
+
+    def _current(self) -> HashSetView:
+        bundle = self.registry.get(INDEX_NAME)
+        view = self._view
+        if view is None or view.bundle is not bundle:
+            view = self._view = HashSetView(bundle)
+        return view
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self.lock:
+            self.stats[key] += n
+
+    def check_hashes(self, hashes: Sequence[str]) -> List[Dict[str, Any]]:
+        """
+        Local verdicts for many hashes at once (no external lookup)
+
+        Returns:
+            One dict per hash with "verdict" (malicious, clean, unknown or
+            invalid), "source" and, for hits, "label"
+        """
+        return self._check([[value] for value in hashes])
+
+    def _check(self, groups: Sequence[Sequence[str]]) -> List[Dict[str, Any]]:
+        # Each group holds the hashes of one sample (e.g. md5, sha1 and sha256 of a file)
+        view = self._current()
+        results: List[Dict[str, Any]] = [{"verdict": "unknown", "source": None} for _ in groups]
+        queries: Dict[str, List[Tuple[int, bytes]]] = {}
+        for i, group in enumerate(groups):
+            parsed = [p for p in map(parse_hash, group) if p is not None]
+            if not parsed:
+                results[i] = {"verdict": "invalid", "source": None}
+            for algorithm, digest in parsed:
+                queries.setdefault(algorithm, []).append((i, digest))
+
+        # Known-bad wins over known-good when a sample is in both
+        for hash_set, verdict in (("known_good", "clean"), ("known_bad", "malicious")):
+            for algorithm, items in queries.items():
+                found = view.find(hash_set, algorithm, [digest for _, digest in items])
+                for (i, _), label_id in zip(items, found.tolist()):
+                    if label_id >= 0:
+                        results[i] = {"verdict": verdict, "source": hash_set, "label": view.labels[label_id]}
+
+        with self.lock:
+            self.stats["checked"] += len(groups)
+            for result in results:
+                key = result["source"] or result["verdict"]
+                self.stats[key] += 1
+        return results
+
+    def external(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """External verdict for a hash not in the local sets, cached"""
+        if self.lookup is None:
+            return None
+        with self.lock:
+            if sha256 in self.cache:
+                self.cache.move_to_end(sha256)
+                self.stats["external_cache_hits"] += 1
+                return self.cache[sha256]
+        self._count("external_calls")
+        try:
+            result = self.lookup.lookup(sha256)
+        except Exception as e:
+            logger.warning(f"{self.lookup.name} lookup failed for {sha256}: {e}")
+            self._count("external_errors")
+            return None
+        if result is not None:
+            result["source"] = self.lookup.name
+            self._count("external_hits")
+        with self.lock:
+            self.cache[sha256] = result
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return result
+
+    def check_files(self, paths: Sequence[str], external: bool = True) -> List[Dict[str, Any]]:
+        """
+        Hash files and give local (then optionally external) verdicts
+
+        Returns:
+            One dict per path with "verdict", "source", "hashes" and
+            "short_circuit" (True when no scanner needs to run)
+        """
+        results: List[Dict[str, Any]] = []
+        hashed: List[Tuple[Dict[str, Any], Dict[str, str]]] = []
+        for path in paths:
+            try:
+                file_hashes = hash_file(path)
+            except OSError as e:
+                self._count("file_errors")
+                results.append({"file_path": path, "verdict": "error", "source": None, "error": str(e),
+                                "hashes": None, "short_circuit": False})
+                continue
+            result = {"file_path": path}
+            results.append(result)
+            hashed.append((result, file_hashes))
+
+        verdicts = self._check([list(file_hashes.values()) for _, file_hashes in hashed])
+        for (result, file_hashes), verdict in zip(hashed, verdicts):
+            result.update(verdict, hashes=file_hashes)
+            if result["verdict"] == "unknown" and external:
+                remote = self.external(file_hashes["sha256"])
+                if remote is not None:
+                    result.update(remote)
+                    if result["verdict"] in ("malicious", "clean"):
+                        self._count("external_decided")
+            result["short_circuit"] = result["verdict"] in ("malicious", "clean")
+        return results
+
+    def summary(self) -> Dict[str, Any]:
+        view = self._current()
+        with self.lock:
+            stats = dict(self.stats)
+        decided = stats["known_bad"] + stats["known_good"] + stats["external_decided"]
+        return {
+            "hash_dir": self.hash_dir,
+            "version": self.registry.versions().get(INDEX_NAME),
+            "counts": view.bundle.metadata["counts"],
+            "lookup": self.lookup.name if self.lookup is not None else None,
+            "short_circuit_rate": round(decided / stats["checked"], 4) if stats["checked"] else 0.0,
+            **stats
+        }
+
+# Build and lookup benchmark
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    rng = np.random.default_rng(0)
+    good = [bytes(d).hex() for d in rng.integers(0, 256, size=(2_000_000, 32), dtype=np.uint8)]
+    bad = [bytes(d).hex() for d in rng.integers(0, 256, size=(500_000, 16), dtype=np.uint8)]
+
+    directory = tempfile.mkdtemp()
+    reputation = HashReputation(hash_dir=directory, registry=SharedModelRegistry(directory),
+                                publisher=ModelPublisher(directory), lookup=LocalReputationLookup())
+    start = time.perf_counter()
+    arrays, metadata = compile_hash_sets(
+        [("known_good", h, "nsrl") for h in good] + [("known_bad", h, "feed") for h in bad])
+    reputation.publisher.publish(INDEX_NAME, arrays, metadata)
+    print(f"compile+publish {len(good) + len(bad):,} hashes: {time.perf_counter() - start:.2f} s, "
+          f"{sum(a.nbytes for a in arrays.values()) / 2**20:.1f} MiB")
+
+    batch = good[:50_000] + bad[:10_000] + [bytes(d).hex() for d in rng.integers(0, 256, size=(40_000, 32), dtype=np.uint8)]
+    start = time.perf_counter()
+    results = reputation.check_hashes(batch)
+    elapsed = time.perf_counter() - start
+    print(f"batch of {len(batch):,}: {elapsed * 1000:.0f} ms ({elapsed / len(batch) * 1e6:.2f} us/hash)")
+    print({key: value for key, value in reputation.summary().items() if key != "hash_dir"})
@@ -2,17 +2,73 @@ import numpy as np
 import json
 import pickle
 import os
+from collections import OrderedDict
 from typing import Dict, Any, List, Tuple
 import logging
 
+from model_bundle import save_bundle, load_bundle, is_bundle
+from threat_rules import ThreatRuleEngine, RuleError, BUILTIN_SPEC
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class VerdictMemo:
+    """
+    Bounded LRU cache of predict results keyed by the normalized feature tuple
+    
+    A result depends only on the normalized features, so keying on their
+    exact values keeps predict output unchanged. Repeats still collapse:
+    integer features such as ports repeat exactly and anything above its
+    threshold saturates at 1.0.
+    """
+    
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0
+        }
+    
+    def key(self, normalized: Dict[str, float], features: List[str]) -> Tuple[float, ...]:
+        return tuple(normalized[f] for f in features)
+    
+    def get(self, key: Tuple[float, ...]):
+        result = self.entries.get(key)
+        if result is None:
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return result
+    
+    def put(self, key: Tuple[float, ...], result: Dict[str, Any]) -> None:
+        self.entries[key] = result
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+    
+    def clear(self) -> None:
+        if self.entries:
+            self.entries.clear()
+        self.stats["invalidations"] += 1
+    
+    def summary(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            **self.stats
+        }
+
 class ThreatDetectionModel:
     """Simple threat detection model implementation"""
     
-    def __init__(self, model_path: str = None):
+    def __init__(self, model_path: str = None, memo_size: int = 0, rules_path: str = None):
         self.features = [
             "packet_count", "connection_duration", "bytes_transferred",
             "packet_rate", "port_number", "protocol_type", "flag_count"
@@ -40,6 +96,13 @@ class ThreatDetectionModel:
             "flag_count": 0.15
         }
         
+        # Optional verdict memo for repetitive flows
+        self.memo = VerdictMemo(memo_size) if memo_size > 0 else None
+        
+        # Declarative threat-type rules (rules/threat_types.yaml by default)
+        self.rules_path = rules_path
+        self.rules = self._load_rules()
+        
         # Load model if path provided
         if model_path and os.path.exists(model_path):
             self.load_model(model_path)
@@ -47,32 +110,59 @@ class ThreatDetectionModel:
         else:
             logger.info("Using default model parameters")
     
-    def load_model(self, model_path: str) -> None:
-        """Load model parameters from file"""
+    def load_model(self, model_path: str, allow_pickle: bool = False) -> None:
+        """
+        Load model parameters from file
+        
+        Args:
+            model_path: Path to a model bundle (see model_bundle.py)
+            allow_pickle: Also accept legacy pickle files. Only use this for
+                          trusted files; convert them with model_bundle.py instead.
+        """
         try:
-            with open(model_path, 'rb') as f:
-                model_data = pickle.load(f)
+            if is_bundle(model_path):
+                bundle = load_bundle(model_path)
+                features = bundle.metadata.get('features', self.features)
+                thresholds = bundle.array('thresholds')
+                weights = bundle.array('weights')
                 
-            # Update model parameters
-            self.thresholds = model_data.get('thresholds', self.thresholds)
-            self.weights = model_data.get('weights', self.weights)
-            self.features = model_data.get('features', self.features)
+                # Update model parameters
+                self.features = list(features)
+                self.thresholds = {f: float(v) for f, v in zip(features, thresholds)}
+                self.weights = {f: float(v) for f, v in zip(features, weights)}
+                if self.rules.columns[:-1] != self.features:
+                    self.rules = self._load_rules()
+            elif allow_pickle:
+                logger.warning(f"Loading legacy pickle model {model_path}; convert it to a bundle")
+                with open(model_path, 'rb') as f:
+                    model_data = pickle.load(f)
+                    
+                # Update model parameters
+                self.thresholds = model_data.get('thresholds', self.thresholds)
+                self.weights = model_data.get('weights', self.weights)
+                self.features = model_data.get('features', self.features)
+            else:
+                raise ValueError(f"{model_path} is not a model bundle; legacy pickle loading is disabled")
+            self._invalidate_memo()
             
             logger.info("Model loaded successfully")
         except Exception as e:
             logger.error(f"Error loading model: {e}")
     
     def save_model(self, model_path: str) -> None:
-        """Save model parameters to file"""
+        """Save model parameters to a model bundle"""
         try:
-            model_data = {
-                'thresholds': self.thresholds,
-                'weights': self.weights,
-                'features': self.features
-            }
-            
-            with open(model_path, 'wb') as f:
-                pickle.dump(model_data, f)
+            save_bundle(
+                model_path,
+                {
+                    'thresholds': np.array([self.thresholds[f] for f in self.features], dtype=np.float64),
+                    'weights': np.array([self.weights[f] for f in self.features], dtype=np.float64)
+                },
+                {
+                    'model_type': 'ThreatDetectionModel',
+                    'features': self.features
+                }
+            )
                 
             logger.info(f"Model saved to {model_path}")
         except Exception as e:
@@ -91,7 +181,23 @@ class ThreatDetectionModel:
             - Confidence score (0.0 to 1.0)
             - Additional details
         """
-        # Normalize features based on thresholds
+        normalized_features = self._normalize(features)
+        
+        if self.memo is None:
+            result = self._evaluate(normalized_features)
+        else:
+            key = self.memo.key(normalized_features, self.features)
+            result = self.memo.get(key)
+            if result is None:
+                result = self._evaluate(normalized_features)
+                self.memo.put(key, result)
+            # Callers get their own copy of the cached result
+            result = dict(result, feature_contributions=dict(result["feature_contributions"]))
+        
+        return (result["label"], result["confidence"], result)
+    
+    def _normalize(self, features: Dict[str, float]) -> Dict[str, float]:
+        """Normalize features based on thresholds into [0, 1]"""
         normalized_features = {}
         for feature in self.features:
             if feature in features:
@@ -103,7 +209,10 @@ class ThreatDetectionModel:
                     normalized_features[feature] = min(1.0, features[feature] / self.thresholds[feature])
             else:
                 normalized_features[feature] = 0.0
-        
+        return normalized_features
+    
+    def _evaluate(self, normalized_features: Dict[str, float]) -> Dict[str, Any]:
+        """Score normalized features and build the result dict"""
         # Calculate weighted score
         score = 0.0
         for feature in self.features:
@@ -117,33 +226,89 @@ class ThreatDetectionModel:
         for feature in self.features:
             contributions[feature] = normalized_features[feature] * self.weights[feature]
         
-        # Determine threat type based on feature patterns
-        threat_type = self._determine_threat_type(normalized_features, score)
-        
-        result = {
+        return {
             "label": "threat" if is_threat else "normal",
             "confidence": score,
-            "threat_type": threat_type if is_threat else None,
+            "threat_type": self._determine_threat_type(normalized_features, score) if is_threat else None,
             "feature_contributions": contributions,
             "severity": self._determine_severity(score)
         }
+    
+    def predict_batch(self, feature_rows: List[Dict[str, float]]) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """
+        Predict many flows at once
         
-        return (result["label"], result["confidence"], result)
+        Normalization, scoring and threat-type rules run as array operations
+        over the whole batch. The verdict memo is not consulted.
+        
+        Args:
+            feature_rows: Feature dicts as accepted by predict
+            
+        Returns:
+            One (label, confidence, details) tuple per row, as from predict
+        """
+        if not feature_rows:
+            return []
+        thresholds = np.array([self.thresholds[f] for f in self.features], dtype=np.float64)
+        weights = np.array([self.weights[f] for f in self.features], dtype=np.float64)
+        raw = np.array([[row.get(f, np.nan) for f in self.features] for row in feature_rows], dtype=np.float64)
+        
+        # Same normalization as _normalize: lower ports are more suspicious, missing features are 0
+        normalized = np.minimum(1.0, raw / thresholds)
+        if "port_number" in self.features:
+            port = self.features.index("port_number")
+            normalized[:, port] = 1.0 - normalized[:, port]
+        normalized[np.isnan(raw)] = 0.0
+        
+        contributions = normalized * weights
+        scores = contributions.sum(axis=1)
+        is_threat = scores > 0.6
+        threat_types = np.full(len(scores), None, dtype=object)
+        if is_threat.any():
+            threat_types[is_threat] = self.rules.classify(normalized[is_threat], scores[is_threat])
+        severities = np.select(
+            [scores > 0.9, scores > 0.75, scores > 0.6],
+            ["critical", "high", "medium"],
+            default="low"
+        )
+        
+        results = []
+        for i in range(len(scores)):
+            label = "threat" if is_threat[i] else "normal"
+            score = float(scores[i])
+            results.append((label, score, {
+                "label": label,
+                "confidence": score,
+                "threat_type": threat_types[i],
+                "feature_contributions": dict(zip(self.features, contributions[i].tolist())),
+                "severity": str(severities[i])
+            }))
+        return results
+    
+    def _load_rules(self) -> ThreatRuleEngine:
+        try:
+            return ThreatRuleEngine(self.features, self.rules_path)
+        except (ImportError, OSError, RuleError) as e:
+            logger.error(f"Error loading threat rules, using the built-in rules: {e}")
+        # Built-in rules need the default features; fail loudly rather than classify nothing
+        return ThreatRuleEngine(self.features, self.rules_path, spec=BUILTIN_SPEC)
     
     def _determine_threat_type(self, features: Dict[str, float], score: float) -> str:
         """Determine the type of threat based on feature patterns"""
-        if features["port_number"] > 0.8 and features["packet_rate"] > 0.7:
-            return "Port Scanning"
-        elif features["packet_rate"] > 0.9 and features["bytes_transferred"] > 0.8:
-            return "DDoS Attack"
-        elif features["connection_duration"] > 0.8 and features["port_number"] < 0.3:
-            return "Brute Force Attempt"
-        elif features["bytes_transferred"] > 0.7 and features["connection_duration"] < 0.3:
-            return "Data Exfiltration"
-        elif features["protocol_type"] > 0.8 and features["flag_count"] > 0.7:
-            return "Man-in-the-Middle"
-        else:
-            return "Unknown Threat"
+        return self.rules.classify_one(features, score)
+    
+    def reload_rules(self, rules_path: str = None) -> int:
+        """
+        Recompile the threat-type rules; the current rules stay active on error
+        
+        Returns:
+            Number of rules now active
+        """
+        count = self.rules.reload(rules_path)
+        if rules_path:
+            self.rules_path = rules_path
+        self._invalidate_memo()
+        return count
     
     def _determine_severity(self, score: float) -> str:
         """Determine the severity based on the confidence score"""
@@ -161,6 +326,7 @@ class ThreatDetectionModel:
         for feature, value in new_thresholds.items():
             if feature in self.thresholds:
                 self.thresholds[feature] = value
+        self._invalidate_memo()
     
     def update_weights(self, new_weights: Dict[str, float]) -> None:
         """Update feature weights"""
@@ -172,6 +338,35 @@ class ThreatDetectionModel:
         weight_sum = sum(self.weights.values())
         for feature in self.weights:
             self.weights[feature] /= weight_sum
+        self._invalidate_memo()
+    
+    def get_params(self) -> Dict[str, Any]:
+        """Current features, thresholds, weights and rule file, e.g. for worker processes"""
+        return {
+            "features": list(self.features),
+            "thresholds": dict(self.thresholds),
+            "weights": dict(self.weights),
+            "rules_path": self.rules_path
+        }
+
+    def set_params(self, params: Dict[str, Any]) -> None:
+        """Adopt parameters from get_params of another model instance"""
+        self.features = list(params["features"])
+        self.thresholds = dict(params["thresholds"])
+        self.weights = dict(params["weights"])
+        if params.get("rules_path") != self.rules_path or self.rules.columns[:-1] != self.features:
+            self.rules_path = params.get("rules_path")
+            self.rules = self._load_rules()
+        self._invalidate_memo()
+
+    def _invalidate_memo(self) -> None:
+        """Drop memoized verdicts computed with outdated parameters"""
+        if self.memo is not None:
+            self.memo.clear()
+    
+    def memo_stats(self) -> Dict[str, Any]:
+        """Get verdict memo hit rate and eviction statistics"""
+        return self.memo.summary() if self.memo is not None else {"enabled": False}
 
 # Create default model instance
 default_model = ThreatDetectionModel()
@@ -213,4 +408,33 @@ def process_data(raw_data: Dict[str, Any]) -> Dict[str, float]:
     else:
         features["flag_count"] = 0.0
     
-    return features 
\ No newline at end of file
+    return features 
+
+# Check that memoized predictions match uncached ones, and report the hit rate
+if __name__ == "__main__":
+    import random
+    import time
+
+    random.seed(0)
+    ports = [22, 53, 80, 443, 3389, 8080, 31337]
+    flows = [
+        process_data({
+            "packet_count": random.choice([random.randint(1, 3000), 5000]),
+            "connection_duration": random.choice([random.uniform(0.1, 600), 1.0]),
+            "bytes_transferred": random.choice([random.randint(1, 10**6), 10**6]),
+            "port": random.choice(ports),
+            "protocol": random.choice(["TCP", "UDP", "HTTPS"]),
+            "flags": ["S"] * random.randint(0, 8)
+        })
+        for _ in range(20000)
+    ]
+    plain = ThreatDetectionModel()
+    memoized = ThreatDetectionModel(memo_size=10000)
+    expected = [plain.predict(flow) for flow in flows]
+    start = time.perf_counter()
+    actual = [memoized.predict(flow) for flow in flows]
+    elapsed = time.perf_counter() - start
+    mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+    print(f"{len(flows):,} flows: {mismatches} mismatches, hit rate {memoized.memo_stats()['hit_rate']:.1%}, "
+          f"{elapsed / len(flows) * 1e6:.1f} us/predict")
+    assert mismatches == 0
@@ -0,0 +1,190 @@
+"""
+Versioned, checksummed binary bundle for model parameters
+
+Layout::
+
+    magic    8 bytes   b"NSMBNDL\\0"
+    version  uint32    little-endian format version
+    hlen     uint32    length of the JSON header in bytes
+    header   hlen      UTF-8 JSON: metadata, array table, data checksum
+    padding            up to the next ALIGNMENT boundary
+    data               arrays, each contiguous and ALIGNMENT-aligned
+
+Arrays are read through ``np.memmap``, so worker processes loading the
+same bundle share one physical copy through the page cache and nothing
+is unpickled at startup.
+"""
+from typing import Dict, Any, Optional
+import hashlib
+import json
+import logging
+import os
+import struct
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"NSMBNDL\0"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_PREFIX = struct.Struct("<8sII")
+
+class BundleError(ValueError):
+    """Raised for malformed, unsupported or corrupted model bundles"""
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def is_bundle(path: str) -> bool:
+    """Check whether a file starts with the bundle magic"""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+def save_bundle(path: str, arrays: Dict[str, np.ndarray], metadata: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Write arrays and JSON metadata to a bundle file
+
+    The file is written to a temporary path and renamed into place, so
+    readers never observe a partially written bundle.
+
+    Args:
+        path: Destination file
+        arrays: Named numeric arrays; stored little-endian and C-contiguous
+        metadata: JSON-serializable metadata stored in the header
+    """
+    table = {}
+    blobs = []
+    offset = 0
+    digest = hashlib.sha256()
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        array = array.astype(array.dtype.newbyteorder("<"), copy=False)
+        offset = _align(offset)
+        table[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        blobs.append((offset, array.tobytes()))
+        offset += array.nbytes
+
+    data = bytearray(offset)
+    for start, blob in blobs:
+        data[start:start + len(blob)] = blob
+    digest.update(data)
+
+    header = json.dumps({
+        "metadata": metadata or {},
+        "arrays": table,
+        "data_size": len(data),
+        "sha256": digest.hexdigest()
+    }).encode("utf-8")
+
+    data_offset = _align(_PREFIX.size + len(header))
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        f.write(b"\0" * (data_offset - _PREFIX.size - len(header)))
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class ModelBundle:
+    """Read-only view of a bundle; arrays are memory-mapped, not copied"""
+
+    def __init__(self, path: str, verify: bool = True):
+        self.path = path
+        with open(path, "rb") as f:
+            prefix = f.read(_PREFIX.size)
+            if len(prefix) != _PREFIX.size:
+                raise BundleError(f"{path}: truncated bundle")
+            magic, version, header_len = _PREFIX.unpack(prefix)
+            if magic != MAGIC:
+                raise BundleError(f"{path}: not a model bundle")
+            if version > FORMAT_VERSION:
+                raise BundleError(f"{path}: unsupported bundle version {version}")
+            try:
+                header = json.loads(f.read(header_len).decode("utf-8"))
+            except ValueError as e:
+                raise BundleError(f"{path}: corrupt header: {e}")
+
+        self.version = version
+        self.metadata: Dict[str, Any] = header["metadata"]
+        self.table: Dict[str, Dict[str, Any]] = header["arrays"]
+        self.checksum = header["sha256"]
+        self.data_offset = _align(_PREFIX.size + header_len)
+        self.data_size = header["data_size"]
+
+        if os.path.getsize(path) < self.data_offset + self.data_size:
+            raise BundleError(f"{path}: truncated data section")
+
+        self.data = np.memmap(path, dtype=np.uint8, mode="r", offset=self.data_offset,
+                              shape=(self.data_size,)) if self.data_size else np.zeros(0, dtype=np.uint8)
+        if verify:
+            self.verify()
+
+    def verify(self) -> None:
+        """Check the data section against the header checksum"""
+        if hashlib.sha256(self.data).hexdigest() != self.checksum:
+            raise BundleError(f"{self.path}: checksum mismatch")
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.table
+
+    def array(self, name: str) -> np.ndarray:
+        """Get a read-only array view backed by the mapped file"""
+        entry = self.table.get(name)
+        if entry is None:
+            raise KeyError(name)
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"])) if entry["shape"] else 1
+        start = entry["offset"]
+        view = self.data[start:start + count * dtype.itemsize].view(dtype)
+        return view.reshape(entry["shape"])
+
+def load_bundle(path: str, verify: bool = True) -> ModelBundle:
+    return ModelBundle(path, verify=verify)
+
+class ArrayScaler:
+    """StandardScaler-compatible transform backed by bundle arrays"""
+
+    def __init__(self, mean: np.ndarray, scale: np.ndarray):
+        self.mean_ = mean
+        self.scale_ = scale
+
+    def transform(self, X) -> np.ndarray:
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+def export_scaler(scaler, path: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+    """Write a fitted StandardScaler's mean_/scale_ to a bundle"""
+    arrays = {"scaler_mean": np.asarray(scaler.mean_, dtype=np.float64)}
+    scale = getattr(scaler, "scale_", None)
+    arrays["scaler_scale"] = np.ones_like(arrays["scaler_mean"]) if scale is None else np.asarray(scale, dtype=np.float64)
+    save_bundle(path, arrays, {"model_type": "StandardScaler", **(metadata or {})})
+
+# One-time conversion of trusted legacy artifacts
+if __name__ == "__main__":
+    import argparse
+    import pickle
+
+    parser = argparse.ArgumentParser(description="Convert legacy pickle/joblib model files to bundles")
+    parser.add_argument("kind", choices=["threat-model", "scaler"])
+    parser.add_argument("source")
+    parser.add_argument("destination")
+    args = parser.parse_args()
+
+    if args.kind == "scaler":
+        import joblib
+        export_scaler(joblib.load(args.source), args.destination)
+    else:
+        from ml_model import ThreatDetectionModel
+        model = ThreatDetectionModel()
+        with open(args.source, "rb") as f:
+            legacy = pickle.load(f)
+        model.features = legacy.get("features", model.features)
+        model.thresholds.update(legacy.get("thresholds", {}))
+        model.weights.update(legacy.get("weights", {}))
+        model.save_model(args.destination)
+
+    bundle = load_bundle(args.destination)
+    print(f"Wrote {args.destination}: {', '.join(bundle.table)} ({bundle.data_size} bytes, sha256 {bundle.checksum[:12]})")
@@ -0,0 +1,290 @@
+"""
+Live-process diagnostics: statistical stack sampler and event-loop lag monitor
+
+``StackSampler`` snapshots the stacks of every thread (event loop, executor
+workers, collector threads) with ``sys._current_frames`` at a fixed interval
+from its own thread and aggregates them as collapsed stacks, the
+``frame;frame;frame count`` format read by flamegraph.pl, speedscope and
+inferno.
+
+``LoopLagMonitor`` runs a heartbeat task on the event loop and a watchdog
+thread. When the heartbeat is late by more than the threshold the watchdog
+captures what the loop thread is executing, i.e. the code blocking it, and
+the heartbeat records the stall with its length once the loop recovers.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from collections import Counter, deque
+from datetime import datetime
+import asyncio
+import inspect
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_PROFILE_SECONDS = 60.0
+MIN_INTERVAL = 0.001
+
+def _frame_label(code, lineno: int) -> str:
+    path = code.co_filename
+    short = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+    return f"{code.co_name} ({short}:{lineno})"
+
+def frame_stack(frame, limit: int = 128) -> List[str]:
+    """Labels of a frame and its callers, outermost first"""
+    labels = []
+    while frame is not None and len(labels) < limit:
+        labels.append(_frame_label(frame.f_code, frame.f_lineno))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+def _innermost_coroutine(frame) -> Optional[str]:
+    while frame is not None:
+        if frame.f_code.co_flags & inspect.CO_COROUTINE:
+            return frame.f_code.co_qualname if hasattr(frame.f_code, "co_qualname") else frame.f_code.co_name
+        frame = frame.f_back
+    return None
+
+def is_idle(frame) -> bool:
+    """Whether a thread's leaf frame is a known blocking wait"""
+    return (frame.f_globals.get("__name__"), frame.f_code.co_name) in StackSampler.IDLE_FRAMES
+
+class StackSampler:
+    """
+    Statistical sampler over all threads of the process
+
+    Args:
+        interval: Seconds between samples
+        include_idle: Keep stacks of threads parked in known wait calls
+    """
+
+    # Leaf (module, function) of threads parked in a blocking call; matched by module too so
+    # application functions that share a name (``get``, ``wait``) are still sampled
+    IDLE_FRAMES = frozenset({
+        ("threading", "wait"),
+        ("threading", "_wait_for_tstate_lock"),
+        ("selectors", "select"),
+        ("queue", "get"),
+        ("concurrent.futures.thread", "_worker"),
+        ("socket", "accept"),
+        ("socket", "readinto"),
+        ("ssl", "read"),
+        ("multiprocessing.connection", "_recv"),
+        ("multiprocessing.connection", "wait")
+    })
+
+    # One profile at a time per process
+    lock = threading.Lock()
+
+    def __init__(self, interval: float = 0.005, include_idle: bool = False):
+        self.interval = max(MIN_INTERVAL, interval)
+        self.include_idle = include_idle
+
+    def sample(self, duration: float) -> Dict[str, Any]:
+        """
+        Sample for ``duration`` seconds from the calling thread
+
+        Returns:
+            Dict with collapsed stack counts, sample count and timing
+        """
+        duration = min(max(0.0, duration), MAX_PROFILE_SECONDS)
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            return self._sample(duration)
+        finally:
+            self.lock.release()
+
+    def _sample(self, duration: float) -> Dict[str, Any]:
+        own = threading.get_ident()
+        labels: Dict[Tuple[Any, int], str] = {}
+        stacks: Counter = Counter()
+        samples = 0
+        overhead = 0.0
+        frame = None
+        start = time.perf_counter()
+        deadline = start + duration
+        while True:
+            tick = time.perf_counter()
+            if tick >= deadline:
+                break
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if not self.include_idle and is_idle(frame):
+                    continue
+                parts = []
+                while frame is not None:
+                    key = (frame.f_code, frame.f_lineno)
+                    label = labels.get(key)
+                    if label is None:
+                        label = labels[key] = _frame_label(*key)
+                    parts.append(label)
+                    frame = frame.f_back
+                parts.append(names.get(ident, f"thread-{ident}"))
+                parts.reverse()
+                stacks[";".join(parts)] += 1
+            samples += 1
+            done = time.perf_counter()
+            overhead += done - tick
+            time.sleep(max(0.0, self.interval - (done - tick)))
+        del frame
+
+        elapsed = time.perf_counter() - start
+        return {
+            "stacks": stacks,
+            "samples": samples,
+            "duration": round(elapsed, 3),
+            "interval_ms": self.interval * 1000,
+            "sampler_busy_fraction": round(overhead / elapsed, 4) if elapsed else 0.0
+        }
+
+def collapsed(stacks: Counter) -> str:
+    """Collapsed-stack text, one ``stack count`` line per distinct stack"""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+def top_frames(stacks: Counter, limit: int = 20) -> List[Dict[str, Any]]:
+    """Functions by self samples (leaf frame) with their inclusive samples"""
+    own: Counter = Counter()
+    inclusive: Counter = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")[1:]
+        if not frames:
+            continue
+        own[frames[-1]] += count
+        for frame in set(frames):
+            inclusive[frame] += count
+    return [
+        {"frame": frame, "self": count, "inclusive": inclusive[frame]}
+        for frame, count in own.most_common(limit)
+    ]
+
+class LoopLagMonitor:
+    """
+    Detects coroutines that block the event loop
+
+    Args:
+        threshold: Lag in seconds that counts as a stall
+        interval: Heartbeat period in seconds
+        max_events: Stall records kept (most recent)
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05, max_events: int = 100):
+        self.threshold = threshold
+        self.interval = interval
+        self.events: deque = deque(maxlen=max_events)
+        self.lags: deque = deque(maxlen=1200)
+        self.stalls = 0
+        self.max_lag = 0.0
+        self._heartbeat = 0.0
+        self._pending: Optional[Dict[str, Any]] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Start monitoring the running event loop"""
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _beat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - expected)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                self.stalls += 1
+                pending, self._pending = self._pending, None
+                self.events.append({
+                    "timestamp": datetime.now().isoformat(),
+                    "lag_ms": round(lag * 1000, 1),
+                    "coroutine": pending["coroutine"] if pending else None,
+                    "stack": pending["stack"] if pending else []
+                })
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms"
+                               + (f" in {pending['coroutine']}" if pending and pending["coroutine"] else ""))
+
+    def _watch(self) -> None:
+        # Check several times per threshold so the stall is caught while it is happening
+        period = max(0.005, self.threshold / 4)
+        while not self._stop.wait(period):
+            if self._pending is not None:
+                continue
+            if time.monotonic() - self._heartbeat < self.interval + self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            self._pending = {"coroutine": _innermost_coroutine(frame), "stack": frame_stack(frame)}
+            del frame
+
+    def summary(self, events: int = 20) -> Dict[str, Any]:
+        lags = sorted(self.lags)
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "threshold_ms": self.threshold * 1000,
+            "interval_ms": self.interval * 1000,
+            "stalls": self.stalls,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "recent_p50_ms": round(lags[len(lags) // 2] * 1000, 2) if lags else 0.0,
+            "recent_p99_ms": round(lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000, 2) if lags else 0.0,
+            "events": list(self.events)[-events:]
+        }
+
+# Demo: profile a busy worker thread and a loop that blocks
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    def busy(stop: threading.Event) -> None:
+        while not stop.is_set():
+            sum(i * i for i in range(10000))
+
+    async def blocking_handler() -> None:
+        time.sleep(0.3)
+
+    async def main() -> None:
+        monitor = LoopLagMonitor(threshold=0.1)
+        monitor.start()
+        stop = threading.Event()
+        threading.Thread(target=busy, args=(stop,), name="busy-worker", daemon=True).start()
+
+        loop = asyncio.get_running_loop()
+        profile = loop.run_in_executor(None, StackSampler().sample, 1.0)
+        await asyncio.sleep(0.2)
+        await blocking_handler()
+        result = await profile
+        stop.set()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+
+        print(f"{result['samples']} samples in {result['duration']} s, "
+              f"sampler busy {result['sampler_busy_fraction']:.1%}")
+        for row in top_frames(result["stacks"], 5):
+            print(f"  {row['self']:5d} {row['inclusive']:5d}  {row['frame']}")
+        print(monitor.summary(events=1))
+
+    asyncio.run(main())
@@ -0,0 +1,451 @@
+"""
+Bulk re-scoring of captured flow and Windows counter records
+
+Streams NDJSON or CSV files (optionally gzip-compressed) through
+read -> parse -> featurize -> batched predict -> sink. Only a bounded
+number of batches is in flight at any time, so memory stays constant
+however large the input is. With ``workers > 0``, parsing and scoring run
+in a process pool; each worker loads its own model once.
+
+Modes:
+    flows:     raw network records -> process_data -> ThreatDetectionModel.predict_batch
+    windows10: counter records keyed by feature name -> Windows10ThreatDetector.detect_batch
+
+Usage::
+
+    python replay.py flows captures/2024-05-*.ndjson.gz -o rescored.ndjson
+    python replay.py windows10 counters.csv -o rescored/ --format bundle --workers 4
+
+Records whose feature values cannot be parsed as numbers, and lines that
+are not valid JSON, are skipped and counted in the ``skipped`` total.
+"""
+from typing import Dict, Any, List, Optional, Iterator, Iterable, Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+# The models package lives at the repository root, as for app.py
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from model_bundle import save_bundle
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MODES = ("flows", "windows10")
+FORMATS = ("ndjson", "parquet", "bundle")
+
+# Record fields copied to the output so results can be joined back to their input
+PASSTHROUGH_FIELDS = ("id", "device_id", "timestamp", "ts")
+
+def open_input(path: str):
+    """Open a text input, transparently decompressing gzip"""
+    with open(path, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+    if gzipped:
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+def input_format(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.endswith(".csv") else "ndjson"
+
+def read_batches(path: str, batch_size: int) -> Iterator[tuple]:
+    """
+    Yield (header, lines) batches of raw text lines
+
+    ``header`` is the parsed CSV header, or None for NDJSON. Lines are left
+    unparsed so parsing can happen in the worker processes.
+    """
+    kind = input_format(path)
+    with open_input(path) as f:
+        header = next(csv.reader([f.readline()])) if kind == "csv" else None
+        batch = []
+        for line in f:
+            if line.strip():
+                batch.append(line)
+                if len(batch) >= batch_size:
+                    yield header, batch
+                    batch = []
+        if batch:
+            yield header, batch
+
+def parse_lines(header: Optional[List[str]], lines: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Parse raw NDJSON lines or CSV rows into record dicts; unparsable lines are skipped
+
+    CSV cells stay strings: scorers convert the features they use, and ids
+    and other pass-through columns are copied to the output unchanged.
+    """
+    if header is not None:
+        return [
+            {name: value for name, value in zip(header, row) if value != ""}
+            for row in csv.reader(lines)
+        ]
+    records = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict):
+            records.append(record)
+    return records
+
+def _passthrough(record: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: record[field] for field in PASSTHROUGH_FIELDS if field in record}
+
+class FlowScorer:
+    """Scores raw network records with ThreatDetectionModel"""
+
+    def __init__(self, model=None, model_path: Optional[str] = None, params: Optional[Dict[str, Any]] = None):
+        from ml_model import ThreatDetectionModel, process_data
+        self.process_data = process_data
+        self.model = model if model is not None else ThreatDetectionModel(model_path)
+        # Parameters of a live model (calibrated thresholds, reloaded rules) win over the file
+        if params is not None:
+            self.model.set_params(params)
+
+    def score(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Score records; records with a non-numeric feature are left out"""
+        features = []
+        valid = []
+        for record in records:
+            # CSV captures store flags as a "|"-separated cell
+            if isinstance(record.get("flags"), str):
+                record["flags"] = [flag for flag in record["flags"].split("|") if flag]
+            try:
+                features.append(self.process_data(record))
+            except (TypeError, ValueError):
+                continue
+            valid.append(record)
+        records = valid
+        predictions = self.model.predict_batch(features)
+        return [
+            {
+                **_passthrough(record),
+                "is_threat": label == "threat",
+                "confidence": confidence,
+                "threat_type": details["threat_type"],
+                "severity": details["severity"]
+            }
+            for record, (label, confidence, details) in zip(records, predictions)
+        ]
+
+class Windows10Scorer:
+    """Scores counter records keyed by feature name with Windows10ThreatDetector"""
+
+    def __init__(self, detector=None, model_dir: Optional[str] = None, shared_dir: Optional[str] = None,
+                 allow_pickle: bool = False):
+        if detector is None:
+            try:
+                from models.windows10_threat_detector import Windows10ThreatDetector
+            except ImportError as e:
+                raise ImportError(f"windows10 replay needs the Windows10 detector and its dependencies "
+                                  f"(lightgbm, joblib): {e}") from e
+            if shared_dir is not None:
+                from shared_models import SharedModelRegistry, SharedWindows10Model
+                detector = Windows10ThreatDetector.from_shared(SharedWindows10Model(SharedModelRegistry(shared_dir)))
+            else:
+                detector = Windows10ThreatDetector(model_dir or os.path.join(ROOT_DIR, "models"),
+                                                   allow_pickle=allow_pickle)
+        self.detector = detector
+
+    def score(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Score records; records with a non-numeric feature are left out"""
+        # Missing features are scored as 0, like Windows10ThreatDetector.vectorize
+        rows = []
+        valid = []
+        for record in records:
+            try:
+                rows.append([float(record.get(feature, 0) or 0) for feature in self.detector.feature_names])
+            except (TypeError, ValueError):
+                continue
+            valid.append(record)
+        records = valid
+        rows = np.array(rows, dtype=np.float64).reshape(len(records), len(self.detector.feature_names))
+        results = self.detector.detect_batch(rows) if len(records) else []
+        return [
+            {
+                **_passthrough(record),
+                "is_threat": result["is_threat"],
+                "confidence": result["confidence"],
+                "prediction": result["prediction"]
+            }
+            for record, result in zip(records, results)
+        ]
+
+def create_scorer(mode: str, model_path: Optional[str] = None, params: Optional[Dict[str, Any]] = None):
+    """
+    Build a scorer for ``mode``
+
+    Args:
+        model_path: Model file (flows) or model directory (windows10)
+        params: flows: ThreatDetectionModel.get_params of the live model;
+                windows10: {"shared_dir": ...} to attach to published shared models,
+                {"allow_pickle": True} to accept a legacy pickled scaler
+    """
+    if mode == "flows":
+        return FlowScorer(model_path=model_path, params=params)
+    if mode == "windows10":
+        params = params or {}
+        return Windows10Scorer(model_dir=model_path, shared_dir=params.get("shared_dir"),
+                               allow_pickle=params.get("allow_pickle", False))
+    raise ValueError(f"mode must be one of {', '.join(MODES)}")
+
+# Per-process scorer for pool workers
+_worker_scorer = None
+
+def _init_worker(mode: str, model_path: Optional[str], params: Optional[Dict[str, Any]]) -> None:
+    global _worker_scorer
+    logging.getLogger().setLevel(logging.WARNING)
+    _worker_scorer = create_scorer(mode, model_path, params)
+
+def score_lines(scorer, header: Optional[List[str]], lines: Sequence[str]) -> tuple:
+    """Parse and score raw lines; returns (results, number of lines skipped)"""
+    results = scorer.score(parse_lines(header, lines))
+    return results, len(lines) - len(results)
+
+def _score_in_worker(header: Optional[List[str]], lines: List[str]) -> tuple:
+    return score_lines(_worker_scorer, header, lines)
+
+class NDJSONSink:
+    """Writes one JSON result per line; gzip when the path ends in .gz"""
+
+    def __init__(self, path: str):
+        self.file = gzip.open(path, "wt", encoding="utf-8") if path.endswith(".gz") else open(path, "w", encoding="utf-8")
+
+    def write(self, results: List[Dict[str, Any]]) -> None:
+        if results:
+            self.file.write("\n".join(json.dumps(result) for result in results) + "\n")
+
+    def close(self) -> None:
+        self.file.close()
+
+def _columns(results: List[Dict[str, Any]]) -> Dict[str, list]:
+    names = []
+    for result in results:
+        for name in result:
+            if name not in names:
+                names.append(name)
+    return {name: [result.get(name) for result in results] for name in names}
+
+class ParquetSink:
+    """Writes one Parquet row group per batch"""
+
+    def __init__(self, path: str):
+        if not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow is required for parquet output; use --format bundle instead")
+        self.path = path
+        self.writer = None
+
+    def write(self, results: List[Dict[str, Any]]) -> None:
+        if not results:
+            return
+        table = pa.Table.from_pydict(_columns(results))
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+class BundleSink:
+    """
+    Columnar output without extra dependencies: one model bundle per batch
+
+    Numeric and boolean columns are stored as arrays; string columns are
+    dictionary-encoded into int32 codes with the dictionary in the part's
+    metadata. Parts are written to ``<directory>/part-NNNNN.nsmb``.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.parts = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, results: List[Dict[str, Any]]) -> None:
+        if not results:
+            return
+        arrays = {}
+        dictionaries = {}
+        for name, values in _columns(results).items():
+            if all(isinstance(v, (bool, np.bool_)) for v in values):
+                arrays[name] = np.array(values, dtype=np.bool_)
+            elif all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+                arrays[name] = np.array(values, dtype=np.float64)
+            else:
+                strings = ["" if v is None else str(v) for v in values]
+                dictionary, codes = np.unique(np.array(strings, dtype=object), return_inverse=True)
+                arrays[name] = codes.astype(np.int32)
+                dictionaries[name] = dictionary.tolist()
+        save_bundle(
+            os.path.join(self.directory, f"part-{self.parts:05d}.nsmb"),
+            arrays,
+            {"rows": len(results), "dictionaries": dictionaries}
+        )
+        self.parts += 1
+
+    def close(self) -> None:
+        pass
+
+def create_sink(path: str, output_format: str = "ndjson"):
+    if output_format == "ndjson":
+        return NDJSONSink(path)
+    if output_format == "parquet":
+        return ParquetSink(path)
+    if output_format == "bundle":
+        return BundleSink(path)
+    raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+
+class ReplayProgress:
+    """Running totals of a replay, reported every ``report_every`` seconds"""
+
+    def __init__(self, report_every: float = 5.0, callback: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.report_every = report_every
+        self.callback = callback
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.files = 0
+        self.records = 0
+        self.threats = 0
+        self.skipped = 0
+        self.finished = False
+        self.error: Optional[str] = None
+
+    def update(self, results: List[Dict[str, Any]], skipped: int = 0) -> None:
+        self.records += len(results)
+        self.skipped += skipped
+        self.threats += sum(1 for result in results if result["is_threat"])
+        now = time.monotonic()
+        if now - self.last_report >= self.report_every:
+            self.last_report = now
+            self.report()
+
+    def report(self) -> None:
+        snapshot = self.to_dict()
+        if self.callback is not None:
+            self.callback(snapshot)
+        else:
+            logger.info(f"Replay: {snapshot['records']} records, {snapshot['threats']} threats, "
+                        f"{snapshot['skipped']} skipped, {snapshot['records_per_second']:.0f} records/s")
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        return {
+            "files": self.files,
+            "records": self.records,
+            "threats": self.threats,
+            "skipped": self.skipped,
+            "elapsed": elapsed,
+            "records_per_second": self.records / elapsed if elapsed > 0 else 0.0,
+            "finished": self.finished,
+            "error": self.error
+        }
+
+def replay(
+    paths: Iterable[str],
+    mode: str,
+    sink,
+    scorer=None,
+    model_path: Optional[str] = None,
+    model_params: Optional[Dict[str, Any]] = None,
+    batch_size: int = 5000,
+    workers: int = 0,
+    progress: Optional[ReplayProgress] = None
+) -> ReplayProgress:
+    """
+    Re-score every record in ``paths`` and write the results to ``sink``
+
+    Args:
+        paths: NDJSON/CSV files, optionally gzip-compressed
+        mode: One of MODES
+        sink: Object with ``write(results)``; not closed here
+        scorer: Scorer to use in-process (workers == 0); built from mode if None
+        model_path: Model file (flows) or model directory (windows10) for new scorers
+        model_params: Parameters for new scorers, see create_scorer
+        batch_size: Records per predict call
+        workers: Process-pool size; 0 scores in the calling process
+        progress: Progress tracker to update
+
+    Returns:
+        The progress tracker with final totals; results keep input order
+    """
+    progress = progress or ReplayProgress()
+
+    if workers <= 0:
+        scorer = scorer or create_scorer(mode, model_path, model_params)
+        for path in paths:
+            for header, lines in read_batches(path, batch_size):
+                results, skipped = score_lines(scorer, header, lines)
+                sink.write(results)
+                progress.update(results, skipped)
+            progress.files += 1
+    else:
+        # Bounded in-flight window keeps memory constant and output ordered
+        max_in_flight = workers * 2
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(mode, model_path, model_params)) as pool:
+            pending = deque()
+            for path in paths:
+                for header, lines in read_batches(path, batch_size):
+                    pending.append(pool.submit(_score_in_worker, header, lines))
+                    if len(pending) >= max_in_flight:
+                        results, skipped = pending.popleft().result()
+                        sink.write(results)
+                        progress.update(results, skipped)
+                progress.files += 1
+            while pending:
+                results, skipped = pending.popleft().result()
+                sink.write(results)
+                progress.update(results, skipped)
+
+    progress.finished = True
+    progress.report()
+    return progress
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s", stream=sys.stderr)
+
+    parser = argparse.ArgumentParser(description="Re-score captured flow or Windows counter records")
+    parser.add_argument("mode", choices=MODES)
+    parser.add_argument("inputs", nargs="+", help="NDJSON/CSV files, optionally .gz")
+    parser.add_argument("-o", "--output", required=True, help="Output file (ndjson, parquet) or directory (bundle)")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--model", default=None, help="Model bundle (flows) or model directory (windows10)")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=0, help="Process-pool size (0 = score in this process)")
+    parser.add_argument("--progress-every", type=float, default=5.0, help="Seconds between progress reports")
+    args = parser.parse_args()
+
+    sink = create_sink(args.output, args.format)
+    try:
+        totals = replay(
+            args.inputs, args.mode, sink,
+            model_path=args.model,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            progress=ReplayProgress(args.progress_every)
+        )
+    finally:
+        sink.close()
+    print(json.dumps(totals.to_dict()))
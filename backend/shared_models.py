@@ -0,0 +1,426 @@
+"""
+Shared-memory model serving for multi-worker deployments
+
+One loader process publishes model parameters as model bundles into a
+shared directory (tmpfs such as /dev/shm by default). Workers attach to
+them read-only through np.memmap, so every worker maps the same physical
+pages and adding workers costs almost no model memory. LightGBM boosters
+are flattened into node arrays and evaluated with NumPy, because a
+Booster always builds its own private copy of the trees.
+
+Each published model is a versioned file ``<name>.<version>.nsmb`` plus a
+``<name>.current`` pointer that is swapped with an atomic rename, so a
+reload never exposes a half-written segment to workers.
+"""
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from model_bundle import save_bundle, load_bundle, ModelBundle, ArrayScaler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARED_DIR = os.getenv("MODEL_SHM_DIR", "/dev/shm/neuroscan-models")
+
+# LightGBM missing_type encodings
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+_MISSING_TYPES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+_ZERO_THRESHOLD = 1e-35
+
+def flatten_lgb_model(model_dump: Dict[str, Any]) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Flatten a LightGBM ``Booster.dump_model()`` into contiguous node arrays
+
+    Args:
+        model_dump: Parsed JSON from ``Booster.dump_model()``
+
+    Returns:
+        Tuple of (arrays, metadata). Node arrays are indexed globally across
+        all trees; leaves have ``node_feature == -1``. ``node_value`` holds
+        the internal value of split nodes and the leaf value of leaves.
+
+    Raises:
+        ValueError: For categorical splits, which the evaluator does not support
+    """
+    features, thresholds, lefts, rights = [], [], [], []
+    default_left, missing_type, values = [], [], []
+    roots = []
+
+    def add(node: Dict[str, Any]) -> int:
+        index = len(features)
+        features.append(-1)
+        thresholds.append(0.0)
+        lefts.append(-1)
+        rights.append(-1)
+        default_left.append(0)
+        missing_type.append(MISSING_NONE)
+        if "leaf_value" in node:
+            values.append(float(node["leaf_value"]))
+            return index
+        if node.get("decision_type", "<=") != "<=":
+            raise ValueError(f"Unsupported split decision type {node.get('decision_type')!r}")
+        values.append(float(node.get("internal_value", 0.0)))
+        features[index] = int(node["split_feature"])
+        thresholds[index] = float(node["threshold"])
+        default_left[index] = 1 if node.get("default_left", True) else 0
+        missing_type[index] = _MISSING_TYPES.get(node.get("missing_type", "None"), MISSING_NONE)
+        lefts[index] = add(node["left_child"])
+        rights[index] = add(node["right_child"])
+        return index
+
+    for tree in model_dump["tree_info"]:
+        roots.append(add(tree["tree_structure"]))
+
+    objective = model_dump.get("objective", "")
+    sigmoid = 1.0
+    for part in objective.split():
+        if part.startswith("sigmoid:"):
+            sigmoid = float(part.split(":", 1)[1])
+
+    arrays = {
+        "tree_roots": np.array(roots, dtype=np.int32),
+        "node_feature": np.array(features, dtype=np.int32),
+        "node_threshold": np.array(thresholds, dtype=np.float64),
+        "node_left": np.array(lefts, dtype=np.int32),
+        "node_right": np.array(rights, dtype=np.int32),
+        "node_default_left": np.array(default_left, dtype=np.uint8),
+        "node_missing_type": np.array(missing_type, dtype=np.uint8),
+        "node_value": np.array(values, dtype=np.float64)
+    }
+    metadata = {
+        "objective": objective.split()[0] if objective else "regression",
+        "sigmoid": sigmoid,
+        "num_class": int(model_dump.get("num_class", 1)),
+        "num_tree_per_iteration": int(model_dump.get("num_tree_per_iteration", 1)),
+        "max_feature_idx": int(model_dump.get("max_feature_idx", max(features + [0])))
+    }
+    return arrays, metadata
+
+class SharedTreeModel:
+    """Booster-compatible ``predict`` over flattened trees in a model bundle"""
+
+    def __init__(self, bundle: ModelBundle):
+        self.bundle = bundle
+        self.roots = bundle.array("tree_roots")
+        self.feature = bundle.array("node_feature")
+        self.threshold = bundle.array("node_threshold")
+        self.left = bundle.array("node_left")
+        self.right = bundle.array("node_right")
+        self.default_left = bundle.array("node_default_left").astype(bool)
+        self.missing_type = bundle.array("node_missing_type")
+        self.value = bundle.array("node_value")
+        self.objective = bundle.metadata.get("objective", "binary")
+        self.sigmoid = bundle.metadata.get("sigmoid", 1.0)
+        self.num_class = bundle.metadata.get("num_class", 1)
+        self.num_features = bundle.metadata.get("max_feature_idx", int(self.feature.max())) + 1
+
+    def _go_left(self, nodes: np.ndarray, x: np.ndarray) -> np.ndarray:
+        """Vectorized LightGBM numerical split decision, including missing-value routing"""
+        missing_type = self.missing_type[nodes]
+        nan = np.isnan(x)
+        x = np.where(nan & (missing_type != MISSING_NAN), 0.0, x)
+        missing = (nan & (missing_type == MISSING_NAN)) | (
+            (missing_type == MISSING_ZERO) & (np.abs(x) <= _ZERO_THRESHOLD))
+        return np.where(missing, self.default_left[nodes], x <= self.threshold[nodes])
+
+    def leaf_indices(self, X: np.ndarray, tree: int) -> np.ndarray:
+        """Global leaf node index reached by each row in one tree"""
+        nodes = np.full(len(X), self.roots[tree], dtype=np.int32)
+        rows = np.arange(len(X))
+        active = self.feature[nodes] >= 0
+        while active.any():
+            r = rows[active]
+            n = nodes[r]
+            go_left = self._go_left(n, X[r, self.feature[n]])
+            nodes[r] = np.where(go_left, self.left[n], self.right[n])
+            active = self.feature[nodes] >= 0
+        return nodes
+
+    def predict_raw(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        raw = np.zeros((len(X), self.num_class), dtype=np.float64)
+        for tree in range(len(self.roots)):
+            raw[:, tree % self.num_class] += self.value[self.leaf_indices(X, tree)]
+        return raw
+
+    def predict_contrib(self, X) -> np.ndarray:
+        """
+        Per-feature contributions to the raw score by tree-path attribution
+
+        Each split on a row's decision path credits its feature with the
+        change in node value (Saabas). Contributions plus the bias column
+        sum to the raw score. Layout matches ``pred_contrib=True``: one
+        block of n_features + 1 columns (bias last) per class.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        out = np.zeros((len(X), self.num_class, self.num_features + 1), dtype=np.float64)
+        rows = np.arange(len(X))
+        for tree in range(len(self.roots)):
+            c = tree % self.num_class
+            nodes = np.full(len(X), self.roots[tree], dtype=np.int32)
+            out[:, c, -1] += self.value[nodes]
+            active = self.feature[nodes] >= 0
+            while active.any():
+                r = rows[active]
+                n = nodes[r]
+                f = self.feature[n]
+                child = np.where(self._go_left(n, X[r, f]), self.left[n], self.right[n])
+                # Each row appears once per step, so plain fancy-index accumulation is safe
+                out[r, c, f] += self.value[child] - self.value[n]
+                nodes[r] = child
+                active = self.feature[nodes] >= 0
+        return out.reshape(len(X), -1)
+
+    def predict(self, X, pred_contrib: bool = False) -> np.ndarray:
+        """Same output shape and transform as ``lgb.Booster.predict``"""
+        if pred_contrib:
+            return self.predict_contrib(X)
+        raw = self.predict_raw(X)
+        if self.objective == "binary":
+            return 1.0 / (1.0 + np.exp(-self.sigmoid * raw[:, 0]))
+        if self.objective.startswith("multiclass") and self.num_class > 1:
+            exp = np.exp(raw - raw.max(axis=1, keepdims=True))
+            return exp / exp.sum(axis=1, keepdims=True)
+        return raw[:, 0] if self.num_class == 1 else raw
+
+def source_checksum(paths: Sequence[str], salt: str = "") -> str:
+    """
+    SHA-256 over the names and contents of the files a segment is compiled from
+
+    Stored in the segment metadata so a worker can tell whether a segment
+    left in the shared directory by an earlier run still matches its sources.
+
+    Args:
+        paths: Source files, in a stable order
+        salt: Compiled format tag; bump it when the compiler changes
+    """
+    digest = hashlib.sha256(salt.encode("utf-8"))
+    for path in paths:
+        digest.update(os.path.basename(path).encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class ModelPublisher:
+    """Loader-side writer of versioned, atomically swapped model segments"""
+
+    def __init__(self, directory: str = DEFAULT_SHARED_DIR, keep_versions: int = 2):
+        self.directory = directory
+        self.keep_versions = keep_versions
+        os.makedirs(directory, exist_ok=True)
+
+    def _pointer_path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.current")
+
+    def current_version(self, name: str) -> int:
+        try:
+            with open(self._pointer_path(name), "r") as f:
+                return int(json.load(f)["version"])
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    def publish(self, name: str, arrays: Dict[str, np.ndarray], metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Write a new version of a model and atomically point workers at it"""
+        version = self.current_version(name) + 1
+        filename = f"{name}.{version}.nsmb"
+        path = os.path.join(self.directory, filename)
+        save_bundle(path, arrays, {"name": name, "version": version, **(metadata or {})})
+        # Verify once here so workers can attach without re-hashing the segment
+        load_bundle(path, verify=True)
+
+        pointer = self._pointer_path(name)
+        tmp_pointer = f"{pointer}.tmp.{os.getpid()}"
+        with open(tmp_pointer, "w") as f:
+            json.dump({"version": version, "file": filename, "published": time.time()}, f)
+        os.replace(tmp_pointer, pointer)
+        logger.info(f"Published shared model {name} v{version}")
+
+        self._prune(name, version)
+        return filename
+
+    def _prune(self, name: str, version: int) -> None:
+        # Workers still mapping an unlinked segment keep it alive until they re-attach
+        for old in range(1, version - self.keep_versions + 1):
+            try:
+                os.unlink(os.path.join(self.directory, f"{name}.{old}.nsmb"))
+            except OSError:
+                pass
+
+class SharedModelRegistry:
+    """
+    Worker-side read-only attachment to published models
+
+    ``get`` re-reads a model's pointer at most every ``check_interval``
+    seconds and re-attaches when a newer version has been published.
+    """
+
+    def __init__(self, directory: str = DEFAULT_SHARED_DIR, check_interval: float = 2.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.attached: Dict[str, Tuple[int, ModelBundle]] = {}
+        self.last_check: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.stats = {"attaches": 0, "reloads": 0}
+
+    def available(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.directory, f"{name}.current"))
+
+    def get(self, name: str) -> ModelBundle:
+        """
+        Get the current bundle for a model
+
+        Raises:
+            FileNotFoundError: If the model has never been published
+        """
+        now = time.monotonic()
+        entry = self.attached.get(name)
+        if entry is not None and now - self.last_check.get(name, 0.0) < self.check_interval:
+            return entry[1]
+
+        with self.lock:
+            self.last_check[name] = now
+            with open(os.path.join(self.directory, f"{name}.current"), "r") as f:
+                pointer = json.load(f)
+            entry = self.attached.get(name)
+            if entry is not None and entry[0] == pointer["version"]:
+                return entry[1]
+
+            # ModelPublisher.publish verified this file before pointing workers at it
+            bundle = load_bundle(os.path.join(self.directory, pointer["file"]), verify=False)
+            if entry is not None:
+                self.stats["reloads"] += 1
+                logger.info(f"Re-attached shared model {name} v{entry[0]} -> v{pointer['version']}")
+            self.attached[name] = (pointer["version"], bundle)
+            self.stats["attaches"] += 1
+            return bundle
+
+    def path(self, name: str) -> str:
+        """File backing the currently attached version of a model"""
+        return self.get(name).path
+
+    def versions(self) -> Dict[str, int]:
+        return {name: version for name, (version, _) in self.attached.items()}
+
+class SharedModelVersion:
+    """Tree model and scaler of one published version, used together for a whole call"""
+
+    def __init__(self, bundle: ModelBundle):
+        self.bundle = bundle
+        self.version = bundle.metadata.get("version")
+        self.model = SharedTreeModel(bundle)
+        self.scaler = ArrayScaler(bundle.array("scaler_mean"), bundle.array("scaler_scale")) \
+            if "scaler_mean" in bundle else None
+
+class SharedWindows10Model:
+    """
+    Windows10ThreatDetector model/scaler pair that follows reloads of a shared segment
+
+    Callers that scale and then predict should take ``current()`` once and
+    use its model and scaler, so both come from the same version.
+    """
+
+    def __init__(self, registry: SharedModelRegistry, name: str = "windows10"):
+        self.registry = registry
+        self.name = name
+        self._current = SharedModelVersion(registry.get(name))
+
+    def current(self) -> SharedModelVersion:
+        """The newest published version (re-attaching if it changed)"""
+        bundle = self.registry.get(self.name)
+        current = self._current
+        if current.bundle is not bundle:
+            current = self._current = SharedModelVersion(bundle)
+        return current
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self.current().bundle.metadata
+
+    def predict(self, X, pred_contrib: bool = False) -> np.ndarray:
+        return self.current().model.predict(X, pred_contrib=pred_contrib)
+
+    def transform(self, X) -> np.ndarray:
+        return self.current().scaler.transform(X)
+
+    @property
+    def has_scaler(self) -> bool:
+        return self.current().scaler is not None
+
+def publish_windows10(publisher: ModelPublisher, model_dir: str = "models", name: str = "windows10",
+                      allow_pickle: bool = False) -> str:
+    """
+    Flatten the Windows10 LightGBM booster and scaler into one shared segment
+
+    Args:
+        allow_pickle: Also accept a legacy pickled scaler (trusted files only)
+    """
+    import lightgbm as lgb
+
+    booster = lgb.Booster(model_file=os.path.join(model_dir, "windows10_threat_detector.lgb"))
+    arrays, tree_metadata = flatten_lgb_model(booster.dump_model())
+
+    with open(os.path.join(model_dir, "windows10_threat_detector_metadata.json"), "r") as f:
+        metadata = json.load(f)
+
+    scaler_bundle = os.path.join(model_dir, "windows10_threat_detector_scaler.nsmb")
+    scaler_pickle = os.path.join(model_dir, "windows10_threat_detector_scaler.pkl")
+    if os.path.exists(scaler_bundle):
+        bundle = load_bundle(scaler_bundle)
+        arrays["scaler_mean"] = np.array(bundle.array("scaler_mean"))
+        arrays["scaler_scale"] = np.array(bundle.array("scaler_scale"))
+    elif os.path.exists(scaler_pickle):
+        if not allow_pickle:
+            raise ValueError(f"{scaler_pickle} is a pickle and legacy pickle loading is disabled; "
+                             f"convert it with model_bundle.py or pass --allow-pickle")
+        import joblib
+        scaler = joblib.load(scaler_pickle)
+        arrays["scaler_mean"] = np.asarray(scaler.mean_, dtype=np.float64)
+        arrays["scaler_scale"] = np.asarray(scaler.scale_, dtype=np.float64)
+
+    return publisher.publish(name, arrays, {
+        "feature_names": metadata["feature_names"],
+        "is_binary": metadata["is_binary"],
+        "top_features": metadata["top_features"],
+        **tree_metadata
+    })
+
+def publish_threat_model(publisher: ModelPublisher, model_path: Optional[str] = None, name: str = "threat_model") -> str:
+    """Publish ThreatDetectionModel thresholds and weights"""
+    from ml_model import ThreatDetectionModel
+
+    model = ThreatDetectionModel(model_path)
+    return publisher.publish(name, {
+        "thresholds": np.array([model.thresholds[f] for f in model.features], dtype=np.float64),
+        "weights": np.array([model.weights[f] for f in model.features], dtype=np.float64)
+    }, {"model_type": "ThreatDetectionModel", "features": model.features})
+
+# Loader process: publish (or re-publish after retraining) the shared models
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Publish models into shared memory for API workers")
+    parser.add_argument("--model-dir", default=os.path.join(os.path.dirname(__file__), "..", "models"))
+    parser.add_argument("--threat-model", default=None, help="ThreatDetectionModel bundle to publish")
+    parser.add_argument("--out", default=DEFAULT_SHARED_DIR)
+    parser.add_argument("--allow-pickle", action="store_true", help="Accept a legacy pickled scaler (trusted files only)")
+    args = parser.parse_args()
+
+    publisher = ModelPublisher(args.out)
+    published: List[str] = [publish_threat_model(publisher, args.threat_model)]
+    try:
+        published.append(publish_windows10(publisher, args.model_dir, allow_pickle=args.allow_pickle))
+    except ImportError as e:
+        logger.warning(f"Skipping Windows10 model: {e}")
+    print(f"Published to {args.out}: {', '.join(published)}")
@@ -0,0 +1,174 @@
+from typing import Dict, Any, Optional, Set, Iterable
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Alert fields a client can filter on by exact value
+FILTER_FIELDS = ("severity", "status", "device_id", "detection_method", "threat_type")
+
+def _value(alert: Dict[str, Any], field: str) -> Optional[str]:
+    # Filter values are strings; alerts may carry e.g. numeric device ids
+    value = alert.get(field)
+    return value if value is None or isinstance(value, str) else str(value)
+
+class Subscription:
+    """Compiled set of alert filter predicates for one client"""
+
+    def __init__(self, fields: Dict[str, frozenset], min_confidence: Optional[float] = None):
+        self.fields = fields
+        self.min_confidence = min_confidence
+
+    @property
+    def is_wildcard(self) -> bool:
+        return not self.fields and self.min_confidence is None
+
+    def matches(self, alert: Dict[str, Any]) -> bool:
+        """Check a single alert against the predicates"""
+        for field, values in self.fields.items():
+            if _value(alert, field) not in values:
+                return False
+        if self.min_confidence is not None and alert.get("confidence", 0.0) < self.min_confidence:
+            return False
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        filters = {field: sorted(values) for field, values in self.fields.items()}
+        if self.min_confidence is not None:
+            filters["min_confidence"] = self.min_confidence
+        return filters
+
+def compile_subscription(filters: Optional[Dict[str, Any]]) -> Subscription:
+    """
+    Compile client filters into a Subscription
+
+    Args:
+        filters: Mapping of alert field to a value or list of values, plus an
+                 optional ``min_confidence``. Empty or None subscribes to everything.
+
+    Returns:
+        Compiled Subscription
+
+    Raises:
+        ValueError: If a filter field or value is not supported
+    """
+    if filters is not None and not isinstance(filters, dict):
+        raise ValueError(f"Filters must be an object, got {type(filters).__name__}")
+    fields = {}
+    min_confidence = None
+
+    for field, value in (filters or {}).items():
+        if field == "min_confidence":
+            if value is not None:
+                min_confidence = float(value)
+            continue
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unsupported filter field: {field}")
+        if value is None:
+            continue
+        if isinstance(value, str):
+            values = [v for v in value.split(",") if v]
+        elif isinstance(value, (list, tuple, set)):
+            values = [str(v) for v in value]
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values = [str(value)]
+        else:
+            raise ValueError(f"Invalid filter value for {field}: {value!r}")
+        if values:
+            fields[field] = frozenset(values)
+
+    return Subscription(fields, min_confidence)
+
+class SubscriptionIndex:
+    """
+    Inverted index from alert field values to subscribed clients
+
+    Routing an alert touches only the clients subscribed to its values: each
+    filtered client counts how many of its constrained fields the alert
+    satisfies and matches when every constraint is met.
+    """
+
+    def __init__(self):
+        self.subscriptions: Dict[str, Subscription] = {}
+        self.wildcard_clients: Set[str] = set()
+        # Filtered clients that constrain no field (only min_confidence)
+        self.unconstrained_clients: Set[str] = set()
+        self.by_value: Dict[str, Dict[str, Set[str]]] = {field: {} for field in FILTER_FIELDS}
+        self.stats = {
+            "alerts_routed": 0,
+            "deliveries": 0,
+            "filtered_out": 0
+        }
+
+    def add(self, client_id: str, subscription: Optional[Subscription] = None) -> None:
+        """Register a client, replacing any previous subscription"""
+        self.remove(client_id)
+        subscription = subscription or Subscription({})
+        self.subscriptions[client_id] = subscription
+
+        if subscription.is_wildcard:
+            self.wildcard_clients.add(client_id)
+        elif not subscription.fields:
+            self.unconstrained_clients.add(client_id)
+        else:
+            for field, values in subscription.fields.items():
+                for value in values:
+                    self.by_value[field].setdefault(value, set()).add(client_id)
+
+    def remove(self, client_id: str) -> None:
+        subscription = self.subscriptions.pop(client_id, None)
+        if subscription is None:
+            return
+
+        self.wildcard_clients.discard(client_id)
+        self.unconstrained_clients.discard(client_id)
+        for field, values in subscription.fields.items():
+            index = self.by_value[field]
+            for value in values:
+                clients = index.get(value)
+                if clients is not None:
+                    clients.discard(client_id)
+                    if not clients:
+                        del index[value]
+
+    def get(self, client_id: str) -> Optional[Subscription]:
+        return self.subscriptions.get(client_id)
+
+    def match(self, alert: Dict[str, Any]) -> Set[str]:
+        """Get the ids of all clients whose subscription matches the alert"""
+        counts: Dict[str, int] = {}
+        for field in FILTER_FIELDS:
+            clients = self.by_value[field].get(_value(alert, field))
+            if clients:
+                for client_id in clients:
+                    counts[client_id] = counts.get(client_id, 0) + 1
+
+        matched = set(self.wildcard_clients)
+        for client_id, count in counts.items():
+            subscription = self.subscriptions[client_id]
+            if count == len(subscription.fields) and (
+                    subscription.min_confidence is None
+                    or alert.get("confidence", 0.0) >= subscription.min_confidence):
+                matched.add(client_id)
+        for client_id in self.unconstrained_clients:
+            if self.subscriptions[client_id].matches(alert):
+                matched.add(client_id)
+
+        self.stats["alerts_routed"] += 1
+        self.stats["deliveries"] += len(matched)
+        self.stats["filtered_out"] += len(self.subscriptions) - len(matched)
+        return matched
+
+    def filter(self, client_id: str, alerts: Iterable[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
+        """Lazily filter alerts through a client's subscription"""
+        subscription = self.subscriptions.get(client_id)
+        if subscription is None or subscription.is_wildcard:
+            return alerts
+        return (alert for alert in alerts if subscription.matches(alert))
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "subscribed_clients": len(self.subscriptions),
+            "wildcard_clients": len(self.wildcard_clients),
+            "indexed_values": {field: len(index) for field, index in self.by_value.items()},
+            **self.stats
+        }
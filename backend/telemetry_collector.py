@@ -0,0 +1,356 @@
+from typing import Dict, Any, List, Optional, Callable
+import logging
+import socket
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+# Windows10ThreatDetector features and their closest Linux/psutil equivalent.
+# Each entry maps to (source, key, kind): "gauge" values are used as sampled,
+# "rate" values are per-second deltas between two samples.
+FEATURE_SOURCES = {
+    "ts": ("clock", "epoch", "gauge"),
+    "Process_Virtual_Bytes": ("process", "vms", "gauge"),
+    "Process_Virtual_Bytes Peak": ("process", "vms_peak", "gauge"),
+    "Process_Thread Count": ("process", "num_threads", "gauge"),
+    "Process_Handle Count": ("process", "num_fds", "gauge"),
+    "Process_Working Set": ("process", "rss", "gauge"),
+    "Process_Working_Set_Peak": ("process", "rss_peak", "gauge"),
+    "Process_pct_ Processor_Time": ("cpu", "busy_all_cores", "gauge"),
+    "Process_pct_ Privileged_Time": ("cpu", "system_all_cores", "gauge"),
+    "Process_IO_Write Operations_sec": ("process", "write_count", "rate"),
+    "Process_IO Read_Operations_sec": ("process", "read_count", "rate"),
+    "Process_IO_Other_Bytes_sec": ("process", "other_bytes", "rate"),
+    "Processor_pct_ Processor_Time": ("cpu", "busy", "gauge"),
+    "Processor_pct_ Privileged_Time": ("cpu", "system", "gauge"),
+    "Processor_pct_ Interrupt_Time": ("cpu", "interrupt", "gauge"),
+    "Memory pct_ Committed Bytes In Use": ("meminfo", "committed_pct", "gauge"),
+    "Memory Commit Limit": ("meminfo", "CommitLimit", "gauge"),
+    "Memory Pool Nonpaged Bytes": ("meminfo", "SUnreclaim", "gauge"),
+    "Memory Pool Paged Bytes": ("meminfo", "SReclaimable", "gauge"),
+    "Memory Pool Paged Resident Bytes": ("meminfo", "SReclaimable", "gauge"),
+    "Memory Free & Zero Page List Bytes": ("meminfo", "MemFree", "gauge"),
+    "Memory Standby Cache Core Bytes": ("meminfo", "Active(file)", "gauge"),
+    "Memory Standby Cache Reserve Bytes": ("meminfo", "Inactive(file)", "gauge"),
+    "Memory Page Faults sec": ("vmstat", "pgfault", "rate"),
+    "Memory Transition Faults sec": ("vmstat", "pgminfault", "rate"),
+    "Memory Page Writes sec": ("vmstat", "pswpout", "rate"),
+    "Memory Pages Output sec": ("vmstat", "pgpgout", "rate"),
+    "Network_I(Intel R _82574L_GNC) Packets sec": ("net", "packets", "rate"),
+    "Network_I(Intel R _82574L_GNC) Packets Received sec": ("net", "packets_recv", "rate"),
+    "Network_I(Intel R _82574L_GNC) Packets Received Unicast sec": ("net", "packets_recv", "rate"),
+    "Network_I(Intel R _82574L_GNC) Packets Sent sec": ("net", "packets_sent", "rate"),
+    "Network_I(Intel R _82574L_GNC) Packets Sent Unicast sec": ("net", "packets_sent", "rate"),
+    "Network_I(Intel R _82574L_GNC) Bytes Received sec": ("net", "bytes_recv", "rate"),
+    "LogicalDisk(_Total) Disk Reads sec": ("disk", "read_count", "rate"),
+    "LogicalDisk(_Total) pct_ Disk Read Time": ("disk", "read_time_pct", "gauge"),
+    "LogicalDisk(_Total) Avg  Disk sec Transfer": ("disk", "sec_per_transfer", "gauge"),
+    "LogicalDisk(_Total) Avg  Disk sec Write": ("disk", "sec_per_write", "gauge"),
+    "LogicalDisk(_Total) pct_ Free Space": ("disk", "free_pct", "gauge"),
+    "LogicalDisk(_Total) Free Megabytes": ("disk", "free_mb", "gauge"),
+}
+
+def _read_kv_file(path: str, scale: int = 1) -> Dict[str, float]:
+    """Parse /proc style "key value" files, returning {} where unavailable"""
+    values = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                parts = line.replace(":", " ").split()
+                if len(parts) >= 2:
+                    values[parts[0]] = float(parts[1]) * scale
+    except OSError:
+        pass
+    return values
+
+class TelemetryCollector:
+    """
+    Background psutil sampler feeding the Windows10 detector in batches
+
+    Counters are sampled every ``interval`` seconds and converted to
+    per-second deltas where the feature is a rate. Samples are written into
+    a preallocated (batch_size, n_features) buffer and scored with one
+    ``detect_batch`` call when the buffer fills, or after ``max_batch_delay``
+    seconds, instead of one HTTP request per sample.
+    """
+
+    def __init__(
+        self,
+        detector,
+        interval: float = 5.0,
+        batch_size: int = 12,
+        max_batch_delay: float = 60.0,
+        device_id: str = None,
+        on_results: Callable[[str, List[Dict[str, Any]]], None] = None,
+        include_processes: bool = True,
+        disk_path: str = "/"
+    ):
+        if not PSUTIL_AVAILABLE:
+            raise RuntimeError("psutil is required for the telemetry collector")
+
+        self.detector = detector
+        self.interval = interval
+        self.max_batch_delay = max_batch_delay
+        self.device_id = device_id or socket.gethostname()
+        self.on_results = on_results
+        self.include_processes = include_processes
+        self.disk_path = disk_path
+
+        feature_names = detector.feature_names
+        self.feature_names = feature_names
+        # Precompiled (column, source, key, kind) plan; unmapped columns stay 0 like detect()
+        self.plan = [
+            (i, *FEATURE_SOURCES[name])
+            for i, name in enumerate(feature_names)
+            if name in FEATURE_SOURCES
+        ]
+        self.unmapped = [name for name in feature_names if name not in FEATURE_SOURCES]
+
+        self.batch = np.zeros((batch_size, len(feature_names)), dtype=np.float64)
+        self.batch_fill = 0
+        self.batch_started = None
+
+        self.previous: Optional[Dict[str, Dict[str, float]]] = None
+        self.previous_time = None
+        self.peaks = {"vms": 0.0, "rss": 0.0}
+        self.cpu_count = psutil.cpu_count() or 1
+
+        self.thread: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.stats = {
+            "samples": 0,
+            "batches_scored": 0,
+            "threats_detected": 0,
+            "errors": 0,
+            "last_sample_ms": 0.0,
+            "last_batch_ms": 0.0
+        }
+
+    def start(self) -> None:
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="telemetry-collector", daemon=True)
+        self.thread.start()
+        logger.info(f"Telemetry collector started for {self.device_id} every {self.interval}s "
+                    f"({len(self.plan)}/{len(self.feature_names)} features mapped)")
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.interval + 1)
+            self.thread = None
+        self.flush()
+
+    def current_interval(self) -> float:
+        """Sampling interval, paced by the detector when it is an AdaptiveScorer"""
+        if hasattr(self.detector, "next_interval"):
+            return self.detector.next_interval(self.device_id)
+        return self.interval
+
+    def _run(self) -> None:
+        next_tick = time.monotonic()
+        while not self.stop_event.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"Telemetry sampling failed: {e}")
+                self.stats["errors"] += 1
+            next_tick = max(next_tick + self.current_interval(), time.monotonic())
+            self.stop_event.wait(max(0.0, next_tick - time.monotonic()))
+
+    def _read_counters(self) -> Dict[str, Dict[str, float]]:
+        """Read raw cumulative counters and gauges from the OS"""
+        counters = {"clock": {"epoch": time.time()}}
+
+        cpu = psutil.cpu_times()
+        counters["cpu_raw"] = {
+            "total": sum(cpu),
+            "idle": cpu.idle + getattr(cpu, "iowait", 0.0),
+            "system": cpu.system,
+            "interrupt": getattr(cpu, "irq", 0.0) + getattr(cpu, "softirq", 0.0)
+        }
+
+        meminfo = _read_kv_file("/proc/meminfo", scale=1024)
+        if meminfo.get("CommitLimit"):
+            meminfo["committed_pct"] = 100.0 * meminfo.get("Committed_AS", 0.0) / meminfo["CommitLimit"]
+        else:
+            vm = psutil.virtual_memory()
+            meminfo.setdefault("MemFree", float(vm.free))
+            meminfo["committed_pct"] = float(vm.percent)
+        counters["meminfo"] = meminfo
+
+        vmstat = _read_kv_file("/proc/vmstat")
+        if vmstat:
+            vmstat["pgminfault"] = vmstat.get("pgfault", 0.0) - vmstat.get("pgmajfault", 0.0)
+        counters["vmstat"] = vmstat
+
+        net = psutil.net_io_counters()
+        counters["net"] = {
+            "packets": float(net.packets_sent + net.packets_recv),
+            "packets_recv": float(net.packets_recv),
+            "packets_sent": float(net.packets_sent),
+            "bytes_recv": float(net.bytes_recv)
+        }
+
+        disk = psutil.disk_io_counters()
+        usage = psutil.disk_usage(self.disk_path)
+        counters["disk_raw"] = {
+            "read_count": float(disk.read_count) if disk else 0.0,
+            "write_count": float(disk.write_count) if disk else 0.0,
+            "read_time": float(disk.read_time) if disk else 0.0,
+            "write_time": float(disk.write_time) if disk else 0.0
+        }
+        counters["disk"] = {
+            "read_count": counters["disk_raw"]["read_count"],
+            "free_pct": 100.0 - usage.percent,
+            "free_mb": usage.free / 2**20
+        }
+
+        if self.include_processes:
+            process = {"vms": 0.0, "rss": 0.0, "num_threads": 0.0, "num_fds": 0.0,
+                       "read_count": 0.0, "write_count": 0.0, "other_bytes": 0.0}
+            # process_iter caches Process objects between calls, so repeated sampling stays cheap
+            for proc in psutil.process_iter(["memory_info", "num_threads", "num_fds", "io_counters"]):
+                info = proc.info
+                mem = info.get("memory_info")
+                if mem is not None:
+                    process["vms"] += mem.vms
+                    process["rss"] += mem.rss
+                process["num_threads"] += info.get("num_threads") or 0
+                process["num_fds"] += info.get("num_fds") or 0
+                io = info.get("io_counters")
+                if io is not None:
+                    process["read_count"] += io.read_count
+                    process["write_count"] += io.write_count
+                    process["other_bytes"] += getattr(io, "other_bytes", 0)
+            self.peaks["vms"] = max(self.peaks["vms"], process["vms"])
+            self.peaks["rss"] = max(self.peaks["rss"], process["rss"])
+            process["vms_peak"] = self.peaks["vms"]
+            process["rss_peak"] = self.peaks["rss"]
+            counters["process"] = process
+
+        return counters
+
+    def _derive(self, current: Dict[str, Dict[str, float]], previous: Dict[str, Dict[str, float]]) -> None:
+        """Add interval-derived gauges (CPU and disk percentages) to ``current``"""
+        cur, prev = current["cpu_raw"], previous["cpu_raw"]
+        total = max(cur["total"] - prev["total"], 1e-9)
+        busy = 100.0 * (1.0 - (cur["idle"] - prev["idle"]) / total)
+        system = 100.0 * (cur["system"] - prev["system"]) / total
+        current["cpu"] = {
+            "busy": busy,
+            "system": system,
+            "interrupt": 100.0 * (cur["interrupt"] - prev["interrupt"]) / total,
+            "busy_all_cores": busy * self.cpu_count,
+            "system_all_cores": system * self.cpu_count
+        }
+
+        cur, prev = current["disk_raw"], previous["disk_raw"]
+        elapsed_ms = max((current["clock"]["epoch"] - previous["clock"]["epoch"]) * 1000.0, 1e-9)
+        reads = cur["read_count"] - prev["read_count"]
+        writes = cur["write_count"] - prev["write_count"]
+        read_ms = cur["read_time"] - prev["read_time"]
+        write_ms = cur["write_time"] - prev["write_time"]
+        disk = current["disk"]
+        disk["read_time_pct"] = min(100.0, 100.0 * read_ms / elapsed_ms)
+        disk["sec_per_transfer"] = (read_ms + write_ms) / 1000.0 / (reads + writes) if reads + writes else 0.0
+        disk["sec_per_write"] = write_ms / 1000.0 / writes if writes else 0.0
+
+    def sample(self) -> Optional[np.ndarray]:
+        """
+        Take one sample and append it to the batch buffer
+
+        Returns:
+            View of the buffered feature row, or None for the first call,
+            which only establishes the baseline for rate counters
+        """
+        started = time.perf_counter()
+        current = self._read_counters()
+        now = current["clock"]["epoch"]
+
+        with self.lock:
+            previous, previous_time = self.previous, self.previous_time
+            self.previous, self.previous_time = current, now
+            if previous is None:
+                return None
+
+            self._derive(current, previous)
+            elapsed = max(now - previous_time, 1e-9)
+
+            row = self.batch[self.batch_fill]
+            for column, source, key, kind in self.plan:
+                values = current.get(source, {})
+                if key not in values:
+                    row[column] = 0.0
+                elif kind == "rate":
+                    row[column] = max(0.0, values[key] - previous.get(source, {}).get(key, values[key])) / elapsed
+                else:
+                    row[column] = values[key]
+
+            self.batch_fill += 1
+            if self.batch_started is None:
+                self.batch_started = time.monotonic()
+            self.stats["samples"] += 1
+            self.stats["last_sample_ms"] = (time.perf_counter() - started) * 1000.0
+
+            full = self.batch_fill == len(self.batch)
+            stale = time.monotonic() - self.batch_started >= self.max_batch_delay
+            # Score every sample right away while the scheduler considers the device hot
+            hot = hasattr(self.detector, "is_hot") and self.detector.is_hot(self.device_id)
+
+        if full or stale or hot:
+            self.flush()
+        return row
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """Score all buffered samples with a single batched model call"""
+        with self.lock:
+            count = self.batch_fill
+            if count == 0:
+                return []
+            started = time.perf_counter()
+            try:
+                if hasattr(self.detector, "score_batch"):
+                    results = self.detector.score_batch([self.device_id] * count, self.batch[:count])
+                else:
+                    results = self.detector.detect_batch(self.batch[:count])
+            except Exception as e:
+                logger.error(f"Batched telemetry scoring failed: {e}")
+                self.stats["errors"] += 1
+                results = []
+            self.batch_fill = 0
+            self.batch_started = None
+            self.stats["batches_scored"] += 1
+            self.stats["threats_detected"] += sum(1 for r in results if r["is_threat"])
+            self.stats["last_batch_ms"] = (time.perf_counter() - started) * 1000.0
+
+        if results and self.on_results is not None:
+            try:
+                self.on_results(self.device_id, results)
+            except Exception as e:
+                logger.error(f"Telemetry result handler failed: {e}")
+                self.stats["errors"] += 1
+        return results
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "device_id": self.device_id,
+            "running": self.thread is not None and self.thread.is_alive(),
+            "interval": self.current_interval(),
+            "batch_size": len(self.batch),
+            "buffered": self.batch_fill,
+            "mapped_features": len(self.plan),
+            "unmapped_features": self.unmapped,
+            **self.stats
+        }
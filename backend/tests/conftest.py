@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# Backend modules import each other as top-level modules
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+@pytest.fixture
+def client():
+    """TestClient over the app with its startup/shutdown hooks run"""
+    from fastapi.testclient import TestClient
+    import app
+
+    with TestClient(app.app) as test_client:
+        yield test_client
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from adaptive_scheduler import AdaptiveScorer
+
+class CountingDetector:
+    feature_names = ["ts", "a", "b"]
+
+    def __init__(self, confidence=0.95, is_threat=False):
+        self.calls = []
+        self.confidence = confidence
+        self.is_threat = is_threat
+        self.fail = False
+
+    def detect_batch(self, rows):
+        if self.fail:
+            raise RuntimeError("model failed")
+        self.calls.append(len(rows))
+        return [{"is_threat": self.is_threat, "confidence": self.confidence,
+                 "timestamp": datetime.now().isoformat()} for _ in rows]
+
+    def vectorize(self, metrics):
+        return np.array([[metrics.get(name, 0.0) for name in self.feature_names]])
+
+def cached(results):
+    return [result["cached"] for result in results]
+
+def test_unchanged_samples_reuse_the_verdict():
+    detector = CountingDetector()
+    scorer = AdaptiveScorer(detector)
+    first = scorer.score_batch(["d"], [[1, 10, 20]])
+    # ts is ignored and 10 -> 10.2 is within the 5% tolerance
+    second = scorer.score_batch(["d"], [[2, 10.2, 20]])
+    assert detector.calls == [1]
+    assert cached(first + second) == [False, True]
+    assert second[0]["scored_at"] == first[0]["timestamp"]
+
+    scorer.score_batch(["d"], [[3, 12, 20]])
+    assert detector.calls == [1, 1]
+
+def test_rows_compare_against_the_previous_row_in_the_same_batch():
+    detector = CountingDetector()
+    scorer = AdaptiveScorer(detector)
+    results = scorer.score_batch(["d"] * 4, [[0, 1, 2], [0, 1, 2], [0, 5, 6], [0, 5, 6]])
+    assert detector.calls == [2]
+    assert cached(results) == [False, True, False, True]
+    assert results[1]["scored_at"] == results[0]["timestamp"]
+
+def test_devices_are_tracked_independently():
+    detector = CountingDetector()
+    scorer = AdaptiveScorer(detector)
+    results = scorer.score_batch(["a", "b", "a"], [[0, 1, 1], [0, 1, 1], [0, 1, 1]])
+    assert cached(results) == [False, False, True]
+
+def test_failed_scoring_restores_reference_rows():
+    detector = CountingDetector()
+    scorer = AdaptiveScorer(detector)
+    scorer.score_batch(["d"], [[0, 1, 1]])
+    detector.fail = True
+    with pytest.raises(RuntimeError):
+        scorer.score_batch(["d"], [[0, 9, 9]])
+    detector.fail = False
+    # The failed row never became the reference, so it is scored again
+    assert cached(scorer.score_batch(["d"], [[0, 9, 9]])) == [False]
+
+def test_threats_make_a_device_hot_and_calm_devices_back_off():
+    scorer = AdaptiveScorer(CountingDetector(is_threat=True), hot_samples=2)
+    scorer.score_batch(["d"], [[0, 1, 1]])
+    assert scorer.is_hot("d") and scorer.next_interval("d") == scorer.min_interval
+    # Hot devices are scored even when unchanged
+    assert cached(scorer.score_batch(["d"], [[0, 1, 1]])) == [False]
+
+    calm = AdaptiveScorer(CountingDetector(confidence=0.99), base_interval=4.0, backoff=2.0)
+    calm.score_batch(["d"], [[0, 1, 1]])
+    assert calm.next_interval("d") == 8.0
+    assert not calm.is_hot("d")
+
+def test_least_recently_seen_devices_are_forgotten():
+    scorer = AdaptiveScorer(CountingDetector(), max_devices=2)
+    for device_id in ("a", "b", "c"):
+        scorer.score_batch([device_id], [[0, 1, 1]])
+    assert list(scorer.devices) == ["b", "c"]
+    assert cached(scorer.score_batch(["a"], [[0, 1, 1]])) == [False]
+
+def test_score_vectorizes_metrics():
+    scorer = AdaptiveScorer(CountingDetector())
+    assert scorer.score("d", {"a": 1.0})["cached"] is False
+    assert scorer.device_stats("d")["d"]["scored"] == 1
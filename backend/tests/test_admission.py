@@ -0,0 +1,98 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from admission import AdmissionController, AdmissionMiddleware, TokenBucket
+
+@pytest.mark.parametrize("path, endpoint_class", [
+    ("/health", "exempt"),
+    ("/ws", "exempt"),
+    ("/api/replay", "bulk"),
+    ("/api/replay/job-1", "bulk"),
+    ("/api/replays", "query"),
+    ("/api/alerts", "query"),
+    ("/api/alerts/export", "bulk"),
+    ("/api/alerts/abc/status", "priority"),
+    ("/api/alerts/abc/other", "query"),
+    ("/api/signature/detect", "priority"),
+    ("/api/behavioral/analyze", "detect"),
+])
+def test_classify_matches_whole_segments(path, endpoint_class):
+    assert AdmissionController().classify(path) == endpoint_class
+
+def test_token_bucket_refills_and_caps_refunds():
+    bucket = TokenBucket(rate=2.0, burst=2.0, now=0.0)
+    assert bucket.take(0.0) == 0.0 and bucket.take(0.0) == 0.0
+    assert bucket.take(0.0) == pytest.approx(0.5)
+    assert bucket.take(0.5) == 0.0
+    bucket.refund()
+    bucket.refund()
+    assert bucket.tokens == 2.0
+
+def test_class_rate_limit_and_retry_after():
+    controller = AdmissionController(class_limits={"query": (1.0, 2.0)})
+    results = [controller.admit("query") for _ in range(3)]
+    assert [admitted for admitted, _, _ in results] == [True, True, False]
+    assert results[2][1] > 0 and results[2][2] == "class_rate"
+
+def test_noisy_device_does_not_drain_the_class_budget():
+    controller = AdmissionController(device_rate=0.001, device_burst=1.0, class_limits={"detect": (0.001, 3.0)})
+    assert controller.admit("detect", "noisy")[0]
+    for _ in range(10):
+        assert controller.admit("detect", "noisy")[2] == "device_rate"
+    assert controller.admit("detect", "quiet")[0]
+    assert controller.admit("detect", "other")[0]
+    assert controller.summary()["shed"] == {"detect": {"device_rate": 10}}
+
+def test_priority_reserve():
+    controller = AdmissionController(max_concurrency=3, priority_reserve=1, class_limits={})
+    assert controller.admit("query")[0] and controller.admit("query")[0]
+    assert controller.admit("query")[2] == "concurrency"
+    assert controller.admit("priority")[0]
+    assert controller.admit("priority")[2] == "concurrency"
+    controller.release()
+    assert controller.admit("priority")[0]
+
+def test_device_buckets_are_bounded():
+    controller = AdmissionController(max_devices=2, class_limits={})
+    for device_id in ("a", "b", "c"):
+        controller.admit("detect", device_id)
+        controller.release()
+    assert list(controller.device_buckets) == ["b", "c"]
+
+def make_client(controller):
+    app = FastAPI()
+
+    @app.post("/api/behavioral/analyze")
+    async def analyze(request: Request):
+        return await request.json()
+
+    @app.get("/api/alerts")
+    async def alerts():
+        return []
+
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+    return TestClient(app)
+
+def test_middleware_sniffs_device_and_replays_the_body():
+    controller = AdmissionController(device_rate=0.001, device_burst=1.0, class_limits={})
+    client = make_client(controller)
+    body = {"device_id": "dev-1", "data": [1, 2]}
+    assert client.post("/api/behavioral/analyze", json=body).json() == body
+
+    rejected = client.post("/api/behavioral/analyze", json=body)
+    assert rejected.status_code == 429
+    assert rejected.json()["reason"] == "device_rate"
+    assert int(rejected.headers["retry-after"]) >= 1
+    # Another device is unaffected
+    assert client.post("/api/behavioral/analyze", json={"device_id": "dev-2"}).status_code == 200
+
+def test_middleware_decodes_query_device_ids_and_answers_503_when_saturated():
+    controller = AdmissionController(device_rate=0.001, device_burst=1.0, class_limits={})
+    client = make_client(controller)
+    assert client.get("/api/alerts", params={"device_id": "a b"}).status_code == 200
+    assert client.get("/api/alerts?device_id=a+b").status_code == 429
+
+    saturated = AdmissionController(max_concurrency=1, priority_reserve=0, class_limits={})
+    saturated.in_flight = 1
+    assert make_client(saturated).get("/api/alerts").status_code == 503
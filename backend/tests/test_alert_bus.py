@@ -0,0 +1,80 @@
+import asyncio
+
+import numpy as np
+
+from alert_bus import InProcessAlertBus, UnixSocketAlertBus, create_alert_bus
+
+async def wait_for(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+def test_in_process_bus_delivers_and_counts_errors():
+    received = []
+
+    async def handler(alert):
+        if alert.get("fail"):
+            raise RuntimeError("boom")
+        received.append(alert["id"])
+
+    async def run():
+        bus = InProcessAlertBus()
+        await bus.start(handler)
+        await bus.publish({"id": "a"})
+        await bus.publish({"id": "b", "fail": True})
+        return bus
+
+    bus = asyncio.run(run())
+    assert received == ["a"]
+    assert bus.summary() == {"backend": "in_process", "published": 2, "delivered": 1, "errors": 1}
+
+def test_unix_socket_bus_delivers_in_one_order_to_every_worker(tmp_path):
+    path = str(tmp_path / "bus.sock")
+    received = {"hub": [], "worker": []}
+
+    def collect(name):
+        async def handler(alert):
+            received[name].append(alert["id"])
+        return handler
+
+    async def run():
+        hub = UnixSocketAlertBus(path, reconnect_delay=0.05)
+        await hub.start(collect("hub"))
+        await wait_for(lambda: hub.is_hub)
+        worker = UnixSocketAlertBus(path, reconnect_delay=0.05)
+        await worker.start(collect("worker"))
+        await wait_for(lambda: worker.writer is not None)
+
+        for n in range(20):
+            await (hub if n % 2 else worker).publish({"id": n, "score": np.float32(0.5)})
+        await wait_for(lambda: len(received["hub"]) == 20 and len(received["worker"]) == 20)
+        await worker.stop()
+        await hub.stop()
+        return hub, worker
+
+    hub, worker = asyncio.run(run())
+    assert received["hub"] == received["worker"]
+    assert sorted(received["hub"]) == list(range(20))
+    assert hub.stats["hub_elections_won"] == 1 and not worker.is_hub
+
+def test_unix_socket_bus_queues_until_the_hub_is_reachable(tmp_path):
+    path = str(tmp_path / "bus.sock")
+    received = []
+
+    async def handler(alert):
+        received.append(alert["id"])
+
+    async def run():
+        bus = UnixSocketAlertBus(path)
+        await bus.publish({"id": "early"})
+        assert len(bus.pending) == 1
+        await bus.start(handler)
+        await wait_for(lambda: received == ["early"])
+        await bus.stop()
+
+    asyncio.run(run())
+
+def test_create_alert_bus_falls_back_to_in_process():
+    assert isinstance(create_alert_bus("bogus"), InProcessAlertBus)
+    assert isinstance(create_alert_bus("unix_socket", "/tmp/unused.sock"), UnixSocketAlertBus)
@@ -0,0 +1,31 @@
+import pytest
+
+from alert_model import Alert, create_alert
+
+def test_round_trips_through_the_wire_shape():
+    alert = create_alert("Port Scan", "high", "d1", "scan", "behavioral", 0.7, metrics={"ports": 100})
+    data = alert.to_dict()
+    assert data["status"] == "open" and data["metrics"] == {"ports": 100}
+    assert Alert.from_dict(data).to_dict() == data
+
+def test_metrics_are_omitted_when_absent():
+    assert "metrics" not in create_alert("X", "low", "d1", "", "test").to_dict()
+
+def test_dict_style_access():
+    alert = create_alert("X", "low", "d1", "", "test", 0.5)
+    assert alert["severity"] == "low"
+    assert alert.get("metrics", {}) == {}
+    assert alert.get("missing", "default") == "default"
+    with pytest.raises(KeyError):
+        alert["missing"]
+
+def test_has_no_instance_dict_and_interns_enum_fields():
+    a = Alert.from_dict({"id": "1", "timestamp": "t", "device_id": "".join(["dev", "ice"])})
+    b = Alert.from_dict({"id": "2", "timestamp": "t", "device_id": "".join(["devi", "ce"])})
+    assert not hasattr(a, "__dict__")
+    assert a.device_id is b.device_id
+
+def test_from_dict_fills_defaults():
+    alert = Alert.from_dict({"id": "1", "timestamp": "t", "confidence": "0.25"})
+    assert (alert.severity, alert.status, alert.detection_method) == ("medium", "open", "unknown")
+    assert alert.confidence == 0.25
@@ -0,0 +1,94 @@
+import base64
+import json
+
+import pytest
+
+from alert_store import AlertStore, decode_cursor, encode_cursor, to_epoch
+
+def make_store(count=10):
+    store = AlertStore()
+    for n in range(count):
+        store.add({"id": f"a{n:02d}", "timestamp": f"2026-01-01T00:00:{n:02d}+00:00",
+                   "severity": "high" if n % 2 else "low"})
+    return store
+
+def ids(alerts):
+    return [alert["id"] for alert in alerts]
+
+def test_cursor_pages_cover_everything_once():
+    store = make_store()
+    seen, cursor = [], None
+    while True:
+        page, cursor = store.page(3, cursor=cursor)
+        seen.extend(ids(page))
+        if cursor is None:
+            break
+    assert seen == [f"a{n:02d}" for n in range(9, -1, -1)]
+
+def test_cursor_is_stable_while_alerts_arrive():
+    store = make_store()
+    page, cursor = store.page(4)
+    store.add({"id": "new", "timestamp": "2026-01-01T00:01:00+00:00", "severity": "low"})
+    page, _ = store.page(4, cursor=cursor)
+    assert ids(page) == ["a05", "a04", "a03", "a02"]
+
+def test_last_full_page_has_no_cursor():
+    page, cursor = make_store(4).page(4)
+    assert len(page) == 4 and cursor is None
+
+def test_time_range_compares_instants_across_offsets():
+    store = make_store()
+    # 01:00:03+01:00 is 00:00:03 UTC
+    page, _ = store.page(100, since=to_epoch("2026-01-01T01:00:03+01:00"),
+                         until=to_epoch("2026-01-01T00:00:05+00:00"))
+    assert ids(page) == ["a05", "a04", "a03"]
+
+def test_late_alerts_are_inserted_in_order():
+    store = make_store(3)
+    store.add({"id": "late", "timestamp": "2026-01-01T00:00:00.500000+00:00", "severity": "low"})
+    assert ids(store.latest(10)) == ["a02", "a01", "late", "a00"]
+
+def test_predicate_and_offset():
+    store = make_store()
+    page, cursor = store.page(2, predicate=lambda alert: alert["severity"] == "high", offset=1)
+    assert ids(page) == ["a07", "a05"]
+    page, _ = store.page(10, cursor=cursor, predicate=lambda alert: alert["severity"] == "high")
+    assert ids(page) == ["a03", "a01"]
+
+def test_iter_range_is_a_snapshot():
+    store = make_store(3)
+    alerts = store.iter_range()
+    store.add({"id": "new", "timestamp": "2026-01-01T00:01:00+00:00", "severity": "low"})
+    assert ids(alerts) == ["a00", "a01", "a02"]
+
+def test_legacy_iso_cursor_is_accepted():
+    legacy = base64.urlsafe_b64encode(json.dumps(["2026-01-01T00:00:05+00:00", "a05"]).encode()).decode()
+    assert decode_cursor(legacy) == decode_cursor(encode_cursor((to_epoch("2026-01-01T00:00:05+00:00"), "a05")))
+
+@pytest.mark.parametrize("cursor", ["not-base64!", base64.urlsafe_b64encode(b"[1]").decode()])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def test_alerts_endpoint_paginates_with_header(client):
+    for _ in range(3):
+        client.post("/test-alert")
+    response = client.get("/api/alerts", params={"limit": 2, "detection_method": "test"})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    cursor = response.headers["X-Next-Cursor"]
+
+    following = client.get("/api/alerts", params={"limit": 2, "detection_method": "test", "cursor": cursor}).json()
+    assert not {alert["id"] for alert in following} & {alert["id"] for alert in response.json()}
+
+def test_alerts_endpoint_rejects_bad_input(client):
+    assert client.get("/api/alerts", params={"cursor": "bogus"}).status_code == 400
+    assert client.get("/api/alerts", params={"since": "yesterday"}).status_code == 400
+
+def test_export_streams_ndjson_oldest_first(client):
+    client.post("/test-alert")
+    client.post("/test-alert")
+    response = client.get("/api/alerts/export", params={"detection_method": "test"})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) >= 2
+    assert [to_epoch(alert["timestamp"]) for alert in lines] == sorted(to_epoch(alert["timestamp"]) for alert in lines)
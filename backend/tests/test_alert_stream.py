@@ -0,0 +1,52 @@
+import json
+
+from alert_stream import AlertReplayLog
+
+def test_since_returns_missed_events():
+    log = AlertReplayLog(maxlen=10)
+    for n in range(5):
+        log.append("alert", {"n": n})
+
+    events = log.since(2)
+    assert [event["seq"] for event in events] == [3, 4, 5]
+    assert log.since(5) == []
+
+def test_since_requires_snapshot_when_out_of_range():
+    log = AlertReplayLog(maxlen=3)
+    for n in range(6):
+        log.append("alert", {"n": n})
+
+    assert log.first_seq == 4
+    # Seq 3 is the last one before the log, so the client is still in sync
+    assert [event["seq"] for event in log.since(3)] == [4, 5, 6]
+    assert log.since(2) is None
+    # Ahead of the server, e.g. after a restart
+    assert log.since(7) is None
+    assert log.stats["snapshots_served"] == 2
+
+def test_empty_log():
+    log = AlertReplayLog()
+    assert log.first_seq == 1
+    assert log.since(0) == []
+    assert log.since(1) is None
+
+def test_websocket_resume_sends_delta_with_summary(client):
+    with client.websocket_connect("/ws") as ws:
+        initial = json.loads(ws.receive_text())
+    assert initial["type"] == "initial"
+    seq = initial["seq"]
+
+    client.post("/test-alert")
+
+    with client.websocket_connect(f"/ws?since={seq}") as ws:
+        delta = json.loads(ws.receive_text())
+    assert delta["type"] == "delta"
+    assert delta["since"] == seq
+    assert [event["seq"] for event in delta["events"]] == [seq + 1]
+    assert "summary" in delta
+
+def test_websocket_resume_message_falls_back_to_snapshot(client):
+    with client.websocket_connect("/ws") as ws:
+        initial = json.loads(ws.receive_text())
+        ws.send_text(json.dumps({"type": "resume", "since": initial["seq"] + 100}))
+        assert json.loads(ws.receive_text())["type"] == "initial"
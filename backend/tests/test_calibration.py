@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from calibration import OVERFLOW_GROUP, OnlineCalibrator, P2Quantile
+from ml_model import ThreatDetectionModel
+
+def test_p2_quantile_tracks_the_exact_percentile():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(5, 1) for _ in range(20000)]
+    sketch = P2Quantile(0.9)
+    for value in values:
+        sketch.add(value)
+    exact = sorted(values)[int(0.9 * len(values))]
+    assert sketch.value() == pytest.approx(exact, rel=0.05)
+    assert P2Quantile(0.5).value() is None
+
+def feed(calibrator, value, count=20, group=None):
+    calibrator.observe_batch([{"packet_count": value}] * count, group)
+
+def test_apply_uses_only_global_proposals_clamped_by_max_step():
+    model = ThreatDetectionModel()
+    calibrator = OnlineCalibrator(model, min_samples=10, max_step=2.0)
+    feed(calibrator, 100.0, group="site-a")
+    # Per-group proposals are advisory
+    assert calibrator.propose("site-a")["packet_count"]["proposed"] == 500.0
+
+    assert calibrator.apply() == {"packet_count": 500.0}
+    assert model.thresholds["packet_count"] == 500.0
+    # Features without enough samples are left alone
+    assert model.thresholds["bytes_transferred"] == 500000
+
+def test_publisher_receives_changes_instead_of_the_local_model():
+    model = ThreatDetectionModel()
+    published = []
+    calibrator = OnlineCalibrator(model, min_samples=10, publisher=published.append)
+    feed(calibrator, 800.0)
+    calibrator.apply()
+    assert published == [{"packet_count": 800.0}]
+    assert model.thresholds["packet_count"] == 1000
+
+    calibrator.apply_changes(published[0])
+    assert model.thresholds["packet_count"] == 800.0
+
+def test_auto_apply_and_group_overflow():
+    model = ThreatDetectionModel()
+    calibrator = OnlineCalibrator(model, min_samples=10, max_groups=1, auto_apply_every=30)
+    feed(calibrator, 900.0, group="a")
+    feed(calibrator, 900.0, group="b")
+    assert model.thresholds["packet_count"] == 900.0
+    assert OVERFLOW_GROUP in calibrator.summary()["groups"]
+    assert calibrator.stats["overflowed"] == 1
+
+def test_feedback_trains_once_per_alert():
+    model = ThreatDetectionModel()
+    calibrator = OnlineCalibrator(model)
+    features = {"packet_count": 5000, "packet_rate": 500}
+    before = model.weights["packet_rate"]
+
+    weights = calibrator.feedback(features, "confirmed", "open")
+    assert weights["packet_rate"] > before
+    assert sum(weights.values()) == pytest.approx(1.0)
+    # Moving between verdicts, or to a status that is not a verdict, does not train again
+    assert calibrator.feedback(features, "false_positive", "confirmed") is None
+    assert calibrator.feedback(features, "resolved", "open") is None
+
+def test_apply_endpoint_rejects_groups_and_applies_globally(client, monkeypatch):
+    import app
+
+    model = ThreatDetectionModel()
+    calibrator = OnlineCalibrator(model, min_samples=10)
+    monkeypatch.setattr(app, "calibrator", calibrator)
+    feed(calibrator, 300.0, group="site-a")
+
+    assert client.post("/api/trained-models/calibration/apply", params={"group": "site-a"}).status_code == 400
+    response = client.post("/api/trained-models/calibration/apply").json()
+    assert response["applied"] == {"packet_count": 500.0}
+    # Applied through the alert bus control message
+    assert model.thresholds["packet_count"] == 500.0
+    assert calibrator.stats["applies"] == 1
@@ -0,0 +1,183 @@
+import pytest
+
+import app
+from correlation import AlertCorrelator, DEFAULT_RULES_PATH, load_correlation_spec
+from threat_rules import RuleError
+
+SPEC = {"window_seconds": 300, "max_span_seconds": 3600, "allowed_lateness_seconds": 30, "rules": []}
+
+def alert(alert_id, t, device_id="d", method="signature", confidence=0.5, severity="low", **fields):
+    return {"id": alert_id, "timestamp": t, "device_id": device_id, "detection_method": method,
+            "confidence": confidence, "severity": severity, "threat_type": "Test", **fields}
+
+def correlator(**spec):
+    return AlertCorrelator(spec={**SPEC, **spec})
+
+def test_alerts_within_the_window_join_one_incident():
+    c = correlator()
+    first = c.observe(alert("a1", 0))
+    assert c.observe(alert("a2", 250)) is first
+    assert c.observe(alert("a3", 500)) is first
+    # More than the window after the incident's last alert
+    assert c.observe(alert("a4", 801)) is not first
+    # Other devices never share incidents
+    assert c.observe(alert("b1", 801, device_id="other")).device_id == "other"
+    assert first.alert_ids == ["a1", "a2", "a3"]
+    assert c.summary()["incidents"] == 3
+
+def test_incidents_stop_growing_at_max_span():
+    c = correlator(max_span_seconds=400)
+    first = c.observe(alert("a1", 0))
+    c.observe(alert("a2", 250))
+    assert c.observe(alert("a3", 450)) is not first
+    assert first.end == 250
+
+def test_late_alert_bridges_two_incidents():
+    c = correlator(allowed_lateness_seconds=1000)
+    early = c.observe(alert("a1", 0, method="signature"))
+    late = c.observe(alert("a2", 500, method="encrypted", severity="high"))
+    assert early is not late
+
+    merged = c.observe(alert("a3", 250, method="behavioral"))
+    assert merged is early
+    assert (merged.start, merged.end) == (0, 500)
+    assert merged.alert_ids == ["a1", "a2", "a3"]
+    assert merged.merged_ids == [late.id]
+    assert merged.severity == "high"
+    assert c.get(late.id) is None
+    assert c.summary()["merged"] == 1
+    assert len(c.incidents()) == 1
+
+def test_out_of_order_alert_extends_the_start():
+    c = correlator()
+    incident = c.observe(alert("a1", 100))
+    c.observe(alert("a2", 20))
+    assert (incident.start, incident.end) == (20, 100)
+    assert incident.to_dict()["first_seen"] == "20"
+    assert incident.to_dict()["timestamp"] == "100"
+
+def test_noisy_or_score_counts_each_method_once():
+    c = correlator()
+    incident = c.observe(alert("a1", 0, method="signature", confidence=0.5))
+    c.observe(alert("a2", 1, method="signature", confidence=0.5))
+    assert incident.score == pytest.approx(0.5)
+    c.observe(alert("a3", 2, method="behavioral", confidence=0.5))
+    assert incident.score == pytest.approx(0.75)
+    c.observe(alert("a4", 3, method="behavioral", confidence=7))
+    assert incident.score == pytest.approx(0.9995)
+
+def test_within_seconds_rule_drops_off_with_its_severity():
+    c = AlertCorrelator(spec=load_correlation_spec(DEFAULT_RULES_PATH))
+    incident = c.observe(alert("a1", 0, method="ml_model"))
+    c.observe(alert("a2", 100, method="behavioral"))
+    c.observe(alert("a3", 200, method="encrypted"))
+    assert incident.rules == ["Multi-stage Intrusion"]
+    assert incident.severity == "critical"
+    assert incident.to_dict()["threat_type"] == "Multi-stage Intrusion"
+
+    c.observe(alert("a4", 450, method="ml_model"))
+    c.observe(alert("a5", 550, method="ml_model"))
+    assert incident.rules == ["Multi-stage Intrusion", "Repeated Detection"]
+    # The span outgrows within_seconds: the rule and the severity it raised both go
+    c.observe(alert("a6", 800, method="ml_model"))
+    assert incident.rules == ["Repeated Detection"]
+    assert incident.severity == "low"
+    assert incident.score == pytest.approx(min(1.0, (1 - 0.5 ** 3) * 1.1))
+    assert c.summary()["rule_hits"] == {"multi_stage_intrusion": 1, "repeated_detection": 1}
+
+def test_incidents_close_after_window_plus_lateness():
+    c = correlator()
+    first = c.observe(alert("a1", 0))
+    c.observe(alert("b1", 320, device_id="other"))
+    assert first.state == "open"
+    c.observe(alert("b2", 340, device_id="other"))
+    assert first.state == "closed"
+    assert [i["id"] for i in c.incidents("closed")] == [first.id]
+    assert c.get(first.id)["state"] == "closed"
+    # A later alert for the device starts a new incident
+    assert c.observe(alert("a2", 341)) is not first
+
+def test_least_recently_active_device_is_evicted():
+    c = correlator(allowed_lateness_seconds=10000)
+    c.max_devices = 2
+    a = c.observe(alert("a1", 0, device_id="a"))
+    c.observe(alert("b1", 1, device_id="b"))
+    c.observe(alert("a2", 2, device_id="a"))
+    c.observe(alert("c1", 3, device_id="c"))
+    assert list(c.devices) == ["a", "c"]
+    assert a.state == "open"
+    assert c.summary()["evicted"] == 1
+    assert c.incidents("closed", device_id="b")[0]["metrics"]["alert_ids"] == ["b1"]
+
+def test_open_incidents_per_device_are_bounded():
+    c = AlertCorrelator(spec={**SPEC, "allowed_lateness_seconds": 10000}, max_open_per_device=2, max_alert_ids=2)
+    first = c.observe(alert("a1", 0))
+    c.observe(alert("a2", 1000))
+    c.observe(alert("a3", 2000))
+    assert first.state == "closed"
+    assert len(c.incidents(device_id="d")) == 2
+
+    incident = c.observe(alert("a4", 2001))
+    c.observe(alert("a5", 2002))
+    assert incident.alert_ids == ["a3", "a4"]
+    assert incident.alert_count == 3
+
+def test_update_status_takes_the_least_advanced_alert_status():
+    c = correlator()
+    incident = c.observe(alert("a1", 0))
+    c.observe(alert("a2", 10, status="investigating"))
+    assert incident.status == "open"
+
+    statuses = {"a1": "resolved", "a2": "investigating"}
+    assert c.update_status(alert("a1", 0), statuses.get)["status"] == "investigating"
+    statuses["a2"] = "false_positive"
+    assert c.update_status(alert("a2", 10), statuses.get)["status"] == "resolved"
+    assert c.update_status(alert("zz", 0), statuses.get) is None
+    assert c.update_status(alert("a1", 0), {}.get)["status"] == "open"
+
+    # Closed incidents are still updated
+    c.observe(alert("b1", 1000, device_id="other"))
+    assert incident.state == "closed"
+    assert c.update_status(alert("a1", 0), statuses.get)["state"] == "closed"
+
+@pytest.mark.parametrize("spec, message", [
+    ({"window_seconds": 0}, "positive"),
+    ({"allowed_lateness_seconds": -1}, "not negative"),
+    ({"rules": [{"title": "No name"}]}, "name is required"),
+    ({"rules": [{"name": "r", "severity": "urgent"}]}, "unknown severity"),
+])
+def test_parse_spec_errors(spec, message):
+    with pytest.raises(RuleError, match=message):
+        AlertCorrelator.parse_spec(spec)
+
+def test_reload_keeps_open_incidents_and_rejects_bad_specs():
+    c = correlator()
+    incident = c.observe(alert("a1", 0))
+    assert c.reload(spec={**SPEC, "window_seconds": 60, "rules": [{"name": "pair", "min_alerts": 2}]}) == 1
+    assert c.by_id == {incident.id: incident}
+    c.observe(alert("a2", 50))
+    assert incident.rules == ["pair"]
+
+    with pytest.raises(RuleError):
+        c.reload(spec={"window_seconds": -5})
+    assert c.window == 60 and [rule.name for rule in c.rules] == ["pair"]
+
+def test_reload_endpoint_goes_through_the_bus(client, monkeypatch, tmp_path):
+    path = tmp_path / "correlation.yaml"
+    path.write_text("window_seconds: 120\nrules:\n  - {name: pair, min_alerts: 2}\n")
+    c = AlertCorrelator(path=str(path), spec=SPEC)
+    monkeypatch.setattr(app, "correlator", c)
+
+    response = client.post("/api/correlation/reload")
+    assert response.status_code == 200
+    assert response.json()["rules"] == 1
+    assert c.window == 120
+    assert client.get("/api/correlation/stats").json()["rules"] == ["pair"]
+
+    path.write_text("window_seconds: 0\n")
+    response = client.post("/api/correlation/reload")
+    assert response.status_code == 400
+    assert c.window == 120
+
+    monkeypatch.setattr(app, "correlator", None)
+    assert client.post("/api/correlation/reload").status_code == 503
@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from detection_history import DetectionHistory
+
+BASE = 1_767_225_600.0  # 2026-01-01T00:00:00Z
+
+def record(history, offset, threat_type="Scan", severity="low", device_id="d1", score=0.5):
+    history.record(BASE + offset, threat_type, severity, device_id, "ml_model", score)
+
+def test_group_by_bucket_and_dimension():
+    history = DetectionHistory()
+    record(history, 10, score=0.2)
+    record(history, 20, score=0.8)
+    record(history, 30, threat_type="DDoS")
+    record(history, 3700)
+
+    rows = history.aggregate(["threat_type"], bucket=3600)
+    assert rows == [
+        {"bucket": "2026-01-01T00:00:00+00:00", "threat_type": "Scan", "count": 2, "avg_score": 0.5, "max_score": 0.8},
+        {"bucket": "2026-01-01T00:00:00+00:00", "threat_type": "DDoS", "count": 1, "avg_score": 0.5, "max_score": 0.5},
+        {"bucket": "2026-01-01T01:00:00+00:00", "threat_type": "Scan", "count": 1, "avg_score": 0.5, "max_score": 0.5},
+    ]
+
+def test_bucket_labels_are_utc_whatever_the_local_zone(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    if hasattr(time, "tzset"):
+        time.tzset()
+    try:
+        history = DetectionHistory()
+        record(history, 60)
+        assert history.aggregate(bucket=3600)[0]["bucket"] == "2026-01-01T00:00:00+00:00"
+    finally:
+        monkeypatch.undo()
+        if hasattr(time, "tzset"):
+            time.tzset()
+
+def test_filters_and_time_range():
+    history = DetectionHistory()
+    record(history, 0, severity="high")
+    record(history, 100, severity="low")
+    record(history, 200, severity="high", device_id="d2")
+
+    assert history.aggregate(filters={"severity": "high"})[0]["count"] == 2
+    assert history.aggregate(filters={"severity": "never-seen"}) == []
+    assert history.aggregate(since=BASE + 50, until=BASE + 200)[0]["count"] == 2
+    with pytest.raises(ValueError):
+        history.aggregate(["score"])
+
+def test_full_chunks_beyond_max_raw_rows_are_rolled_up():
+    history = DetectionHistory(chunk_size=4, max_raw_rows=4, raw_retention=1e12, rollup_retention=1e12)
+    for n in range(10):
+        record(history, n)
+    summary = history.summary()
+    assert summary["rolled_rows"] == 4 and summary["raw_rows"] == 6
+    # Rolled rows still count at rollup resolution
+    assert history.aggregate()[0]["count"] == 10
+
+def test_raw_retention_applies_without_filling_a_chunk():
+    history = DetectionHistory(raw_retention=3600, rollup_retention=1e12, compact_interval=0)
+    now = time.time()
+    history.record(now - 7200, "Old", "low", "d1", "ml_model", 0.5)
+    history.record(now, "New", "low", "d1", "ml_model", 0.5)
+
+    summary = history.summary()
+    assert summary["chunks"] == 1
+    assert (summary["raw_rows"], summary["rolled_rows"], summary["rollup_rows"]) == (1, 1, 1)
+    assert [row["threat_type"] for row in history.recent(10)] == ["New"]
+    assert {row["threat_type"] for row in history.aggregate(["threat_type"])} == {"Old", "New"}
+
+def test_compaction_is_rate_limited():
+    history = DetectionHistory(raw_retention=3600, compact_interval=3600)
+    now = time.time()
+    history.record(now - 7200, "Old", "low", "d1", "ml_model", 0.5)
+    assert history.summary()["rolled_rows"] == 0
+    history.compact()
+    assert history.summary()["rolled_rows"] == 1
+
+def test_rollups_expire():
+    history = DetectionHistory(raw_retention=0, rollup_retention=3600, compact_interval=0)
+    record(history, 0)
+    history.compact()
+    assert history.summary()["rollup_rows"] == 0
+    assert history.aggregate() == []
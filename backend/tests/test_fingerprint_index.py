@@ -0,0 +1,188 @@
+import json
+
+import numpy as np
+import pytest
+
+import app
+from fingerprint_index import (
+    INDEX_NAME, FingerprintIndex, FingerprintView, compile_index, extract_indicators, indicator_key,
+    merge_matches, normalize_indicator
+)
+from model_bundle import save_bundle, load_bundle
+from shared_models import ModelPublisher, SharedModelRegistry, source_checksum
+
+JA3 = "e7d705a3286e19ea42f587b344ee6865"
+CERT_SHA1 = "AB:" * 19 + "CD"
+
+@pytest.fixture
+def ioc_dir(tmp_path):
+    directory = tmp_path / "ioc"
+    directory.mkdir()
+    (directory / "feed.csv").write_text(
+        "# kind,value,label,severity\n"
+        f"ja3,{JA3.upper()},cobalt-strike,critical\n"
+        "domain,Evil.Example.COM.,phishing,medium\n"
+        "bogus,whatever\n"
+        "incomplete\n"
+    )
+    (directory / "certs.jsonl").write_text(
+        json.dumps({"kind": "cert", "value": CERT_SHA1, "label": "bad-cert", "severity": "nonsense"}) + "\n"
+        "{not json\n"
+    )
+    return directory
+
+def make_index(tmp_path, ioc_dir):
+    shared = tmp_path / "shm"
+    return FingerprintIndex(str(ioc_dir), registry=SharedModelRegistry(str(shared), check_interval=0),
+                            publisher=ModelPublisher(str(shared)))
+
+def test_normalize_indicator():
+    assert normalize_indicator(" JA3 ", JA3.upper()) == ("ja3", JA3)
+    assert normalize_indicator("server_name", "Host.Example.") == ("sni", "host.example")
+    assert normalize_indicator("cert", CERT_SHA1) == ("cert_sha1", "ab" * 19 + "cd")
+    assert normalize_indicator("cert", "ab" * 32) == ("cert_sha256", "ab" * 32)
+    assert normalize_indicator("cert", "abc") is None
+    assert normalize_indicator("md5", "abc") is None
+    assert normalize_indicator("ja3", "  ") is None
+
+def test_compile_index_table_and_bloom():
+    records = [{"kind": "sni", "value": f"host{i}.bad", "label": f"feed-{i % 3}"} for i in range(500)]
+    records.append({"kind": "sni", "value": "HOST1.bad."})
+    records.append({"kind": "md5", "value": "x"})
+    arrays, metadata = compile_index(records)
+    assert metadata["indicators"] == 500
+    assert metadata["skipped"] == 1
+    assert metadata["labels"] == ["feed-0", "feed-1", "feed-2"]
+    assert metadata["label_severity"] == ["high"] * 3
+    # Power-of-two table at load factor <= 0.5
+    slots = len(arrays["table_keys"])
+    assert slots & (slots - 1) == 0 and np.count_nonzero(arrays["table_keys"]) / slots <= 0.5
+    assert metadata["bloom_bits"] % 64 == 0 and metadata["bloom_bits"] >= 500 * 10
+
+def test_view_finds_every_key_and_rejects_most_misses(tmp_path):
+    records = [{"kind": "ja3", "value": f"{i:032x}"} for i in range(2000)]
+    arrays, metadata = compile_index(records)
+    save_bundle(str(tmp_path / "index.nsmb"), arrays, metadata)
+    view = FingerprintView(load_bundle(str(tmp_path / "index.nsmb")))
+
+    keys = np.array([indicator_key("ja3", f"{i:032x}") for i in range(2000)], dtype=np.uint64)
+    labels, maybe, _ = view.lookup_keys(keys)
+    assert maybe.all() and (labels == 0).all()
+
+    misses = np.array([indicator_key("ja3", f"miss{i}") for i in range(5000)], dtype=np.uint64)
+    labels, maybe, probes = view.lookup_keys(misses)
+    assert (labels == -1).all()
+    assert maybe.mean() < 0.05
+    assert probes >= maybe.sum()
+
+def test_empty_index_has_no_hits(tmp_path):
+    arrays, metadata = compile_index([])
+    save_bundle(str(tmp_path / "empty.nsmb"), arrays, metadata)
+    view = FingerprintView(load_bundle(str(tmp_path / "empty.nsmb")))
+    labels, maybe, probes = view.lookup_keys(np.array([indicator_key("sni", "a.b")], dtype=np.uint64))
+    assert labels.tolist() == [-1] and not maybe.any() and probes == 0
+
+def test_lookup_batch_hits_and_misses(tmp_path, ioc_dir):
+    index = make_index(tmp_path, ioc_dir)
+    index.ensure_loaded()
+    results = index.lookup_batch([
+        ("ja3", JA3), ("sni", "evil.example.com"), ("cert_fingerprint", CERT_SHA1.lower()),
+        ("sni", "good.example.com"), ("md5", "x")
+    ])
+    assert results[0] == {"kind": "ja3", "value": JA3, "label": "cobalt-strike", "severity": "critical"}
+    assert results[1]["label"] == "phishing" and results[1]["severity"] == "medium"
+    # Unknown severities fall back to high
+    assert results[2]["label"] == "bad-cert" and results[2]["severity"] == "high"
+    assert results[3:] == [None, None]
+    assert index.stats["lookups"] == 4
+    assert index.stats["hits"] == 3
+    assert index.lookup_batch([("md5", "x")]) == [None]
+
+    summary = index.summary()
+    assert summary["indicators"] == 3
+    assert summary["version"] == 1
+
+def test_ensure_loaded_reuses_a_current_index(tmp_path, ioc_dir):
+    make_index(tmp_path, ioc_dir).ensure_loaded()
+    index = make_index(tmp_path, ioc_dir)
+    index.ensure_loaded()
+    assert index.stats["rebuilds"] == 0
+    assert index.registry.get(INDEX_NAME).metadata["version"] == 1
+
+def test_ensure_loaded_rebuilds_when_sources_change(tmp_path, ioc_dir):
+    make_index(tmp_path, ioc_dir).ensure_loaded()
+    with open(ioc_dir / "feed.csv", "a") as f:
+        f.write("sni,late.example,late-feed,low\n")
+
+    index = make_index(tmp_path, ioc_dir)
+    index.ensure_loaded()
+    assert index.stats["rebuilds"] == 1
+    assert index.lookup_batch([("sni", "late.example")])[0]["label"] == "late-feed"
+
+    # Removing a file is a change too
+    (ioc_dir / "certs.jsonl").unlink()
+    index.ensure_loaded()
+    assert index.stats["rebuilds"] == 2
+    assert index.lookup_batch([("cert", CERT_SHA1)]) == [None]
+
+def test_ensure_loaded_rebuilds_an_unreadable_segment(tmp_path, ioc_dir):
+    index = make_index(tmp_path, ioc_dir)
+    (tmp_path / "shm" / f"{INDEX_NAME}.current").write_text("{broken")
+    index.ensure_loaded()
+    assert index.stats["rebuilds"] == 1
+    assert index.lookup_batch([("ja3", JA3)])[0] is not None
+
+def test_source_checksum_tracks_content_and_format(tmp_path, ioc_dir):
+    index = make_index(tmp_path, ioc_dir)
+    before = index.source_checksum()
+    assert index.source_checksum() == before
+    (ioc_dir / "feed.csv").write_text("ja3,00,other\n")
+    assert index.source_checksum() != before
+
+    paths = [str(ioc_dir / "feed.csv")]
+    assert source_checksum(paths, "fingerprints-1") != source_checksum(paths, "fingerprints-2")
+
+    missing = make_index(tmp_path, tmp_path / "missing")
+    missing.ensure_loaded()
+    assert missing.lookup_batch([("ja3", JA3)]) == [None]
+
+def test_extract_indicators():
+    assert extract_indicators({"ja3": JA3, "sni": "a.example", "port": 443}) == [("ja3", JA3), ("sni", "a.example")]
+    sessions = {"connections": [{"ja3_hash": JA3}, "garbage", {"server_name": "b.example", "cert_fingerprint": "ab"}]}
+    assert extract_indicators(sessions) == [("ja3", JA3), ("sni", "b.example"), ("cert", "ab")]
+
+def test_merge_matches_raises_risk_and_level():
+    result = {"threats_detected": [], "threat_types": [], "threat_level": "LOW", "overall_risk_score": 2.0}
+    merge_matches(result, [None, {"kind": "ja3", "value": JA3, "label": "c2", "severity": "high"}])
+    assert result["overall_risk_score"] == 8.0
+    assert result["threat_level"] == "HIGH"
+    assert result["threat_types"] == ["known_bad_fingerprint"]
+    assert result["threats_detected"][0]["type"] == "known_bad_fingerprint"
+
+    # A higher existing score is kept and the threat type is not repeated
+    result["overall_risk_score"] = 9.5
+    merge_matches(result, [{"kind": "sni", "value": "x", "label": "l", "severity": "low"}])
+    assert result["overall_risk_score"] == 9.5 and result["threat_level"] == "CRITICAL"
+    assert result["threat_types"] == ["known_bad_fingerprint"]
+
+    clean = merge_matches({}, [None])
+    assert clean == {"fingerprint_matches": []}
+
+def test_lookup_and_reload_endpoints(client, monkeypatch, tmp_path, ioc_dir):
+    index = make_index(tmp_path, ioc_dir)
+    index.ensure_loaded()
+    monkeypatch.setattr(app, "fingerprint_index", index)
+
+    response = client.post("/api/encrypted/fingerprints/lookup",
+                           json={"indicators": [{"kind": "ja3", "value": JA3}, {"kind": "sni", "value": "ok.example"}]})
+    assert response.status_code == 200
+    assert response.json()["match_count"] == 1
+
+    (ioc_dir / "extra.txt").write_text("sni,ok.example,new-feed\n")
+    response = client.post("/api/encrypted/fingerprints/reload")
+    assert response.json()["indicators"] == 4
+    assert index.lookup_batch([("sni", "ok.example")])[0]["label"] == "new-feed"
+    assert client.get("/api/encrypted/fingerprints").json()["index"]["version"] == 2
+
+    monkeypatch.setattr(app, "fingerprint_index", None)
+    assert client.get("/api/encrypted/fingerprints").status_code == 503
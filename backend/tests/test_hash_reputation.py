@@ -0,0 +1,207 @@
+import hashlib
+
+import pytest
+
+import app
+from hash_reputation import (
+    INDEX_NAME, HashReputation, HashSetView, LocalReputationLookup, compile_hash_sets, hash_file, parse_hash
+)
+from model_bundle import load_bundle, save_bundle
+from shared_models import ModelPublisher, SharedModelRegistry
+
+BAD = b"malware sample"
+GOOD = b"system library"
+UNKNOWN = b"never seen before"
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+@pytest.fixture
+def hash_dir(tmp_path):
+    directory = tmp_path / "hashes"
+    directory.mkdir()
+    (directory / "known_bad_feed.csv").write_text(
+        "# hash,label\n"
+        f"{hashlib.md5(BAD).hexdigest()},emotet\n"
+        "not-a-hash,broken\n"
+    )
+    (directory / "known_good.txt").write_text(f"{sha256(GOOD).upper()}\n")
+    (directory / "notes.txt").write_text(f"{sha256(UNKNOWN)},ignored\n")
+    return directory
+
+def make_reputation(tmp_path, hash_dir, lookup=None, cache_size=10000):
+    shared = tmp_path / "shm"
+    return HashReputation(str(hash_dir), registry=SharedModelRegistry(str(shared), check_interval=0),
+                          publisher=ModelPublisher(str(shared)), lookup=lookup, cache_size=cache_size)
+
+@pytest.fixture
+def files(tmp_path):
+    paths = {}
+    for name, data in (("bad", BAD), ("good", GOOD), ("unknown", UNKNOWN)):
+        path = tmp_path / f"{name}.bin"
+        path.write_bytes(data)
+        paths[name] = str(path)
+    return paths
+
+def test_parse_hash():
+    assert parse_hash(" " + "AB" * 16 + "\n") == ("md5", bytes.fromhex("ab" * 16))
+    assert parse_hash("ab" * 20)[0] == "sha1"
+    assert parse_hash("ab" * 32)[0] == "sha256"
+    assert parse_hash("ab" * 24) is None
+    assert parse_hash("zz" * 16) is None
+
+def test_hash_file(tmp_path):
+    path = tmp_path / "f.bin"
+    path.write_bytes(BAD * 1000)
+    assert hash_file(str(path), chunk_size=7) == {
+        "md5": hashlib.md5(BAD * 1000).hexdigest(),
+        "sha1": hashlib.sha1(BAD * 1000).hexdigest(),
+        "sha256": hashlib.sha256(BAD * 1000).hexdigest()
+    }
+
+def test_sorted_sets_confirm_the_full_digest(tmp_path):
+    # Digests sharing the first 8 bytes land in one prefix run
+    shared_prefix = ["00" * 8 + f"{i:016x}" for i in range(5)]
+    entries = [("known_bad", h, f"l{i}") for i, h in enumerate(shared_prefix)]
+    entries += [("known_bad", "ff" * 16, "high"), ("known_bad", shared_prefix[0], "duplicate"), ("other", "ab" * 16, "x")]
+    arrays, metadata = compile_hash_sets(entries)
+    assert metadata["counts"] == {"known_bad_md5": 6}
+    assert metadata["skipped"] == 1
+    save_bundle(str(tmp_path / "sets.nsmb"), arrays, metadata)
+    view = HashSetView(load_bundle(str(tmp_path / "sets.nsmb")))
+
+    query = [bytes.fromhex(h) for h in (shared_prefix[3], "00" * 8 + "ff" * 8, "ff" * 16, "ee" * 16)]
+    found = view.find("known_bad", "md5", query).tolist()
+    assert [metadata["labels"][i] if i >= 0 else None for i in found] == ["l3", None, "high", None]
+    assert view.find("known_good", "md5", query).tolist() == [-1] * 4
+    assert view.find("known_bad", "md5", []).tolist() == []
+
+def test_check_hashes_gives_local_verdicts(tmp_path, hash_dir):
+    reputation = make_reputation(tmp_path, hash_dir)
+    reputation.ensure_loaded()
+    results = reputation.check_hashes([hashlib.md5(BAD).hexdigest(), sha256(GOOD), sha256(UNKNOWN), "xyz"])
+    assert results == [
+        {"verdict": "malicious", "source": "known_bad", "label": "emotet"},
+        {"verdict": "clean", "source": "known_good", "label": "known_good"},
+        {"verdict": "unknown", "source": None},
+        {"verdict": "invalid", "source": None}
+    ]
+    summary = reputation.summary()
+    assert summary["counts"] == {"known_bad_md5": 1, "known_good_sha256": 1}
+    assert (summary["known_bad"], summary["known_good"], summary["unknown"], summary["invalid"]) == (1, 1, 1, 1)
+
+def test_known_bad_wins_over_known_good(tmp_path, hash_dir):
+    (hash_dir / "known_good_vendor.txt").write_text(f"{hashlib.sha1(BAD).hexdigest()}\n")
+    reputation = make_reputation(tmp_path, hash_dir)
+    reputation.ensure_loaded()
+    results = reputation._check([[hashlib.sha1(BAD).hexdigest(), hashlib.md5(BAD).hexdigest()]])
+    assert results[0]["verdict"] == "malicious"
+
+def test_ensure_loaded_rebuilds_only_when_lists_change(tmp_path, hash_dir):
+    make_reputation(tmp_path, hash_dir).ensure_loaded()
+    reputation = make_reputation(tmp_path, hash_dir)
+    reputation.ensure_loaded()
+    assert reputation.stats["rebuilds"] == 0
+    # Files that are not hash lists do not count
+    (hash_dir / "README.md").write_text("docs")
+    reputation.ensure_loaded()
+    assert reputation.stats["rebuilds"] == 0
+
+    with open(hash_dir / "known_bad_feed.csv", "a") as f:
+        f.write(f"{sha256(UNKNOWN)},late\n")
+    reputation.ensure_loaded()
+    assert reputation.stats["rebuilds"] == 1
+    assert reputation.check_hashes([sha256(UNKNOWN)])[0]["label"] == "late"
+    assert reputation.registry.get(INDEX_NAME).metadata["version"] == 2
+
+def test_ensure_loaded_rebuilds_an_unreadable_segment(tmp_path, hash_dir):
+    reputation = make_reputation(tmp_path, hash_dir)
+    (tmp_path / "shm" / f"{INDEX_NAME}.current").write_text('{"version": 1, "file": "missing.nsmb"}')
+    reputation.ensure_loaded()
+    assert reputation.stats["rebuilds"] == 1
+    assert reputation.check_hashes([sha256(GOOD)])[0]["verdict"] == "clean"
+
+def test_missing_directory_compiles_empty_sets(tmp_path):
+    reputation = make_reputation(tmp_path, tmp_path / "missing")
+    reputation.ensure_loaded()
+    assert reputation.check_hashes([sha256(GOOD)]) == [{"verdict": "unknown", "source": None}]
+
+def test_check_files_short_circuits_known_files(tmp_path, hash_dir, files):
+    reputation = make_reputation(tmp_path, hash_dir)
+    reputation.ensure_loaded()
+    results = reputation.check_files([files["bad"], files["good"], files["unknown"], str(tmp_path / "gone")])
+    assert [r["verdict"] for r in results] == ["malicious", "clean", "unknown", "error"]
+    assert [r["short_circuit"] for r in results] == [True, True, False, False]
+    assert results[0]["hashes"]["sha256"] == sha256(BAD)
+    assert results[3]["hashes"] is None and reputation.stats["file_errors"] == 1
+    assert reputation.summary()["short_circuit_rate"] == round(2 / 3, 4)
+
+def test_external_lookup_only_for_unknown_files_and_cached(tmp_path, hash_dir, files):
+    lookup = LocalReputationLookup({sha256(UNKNOWN).upper(): "malicious", sha256(GOOD): "malicious"})
+    reputation = make_reputation(tmp_path, hash_dir, lookup=lookup)
+    reputation.ensure_loaded()
+
+    results = reputation.check_files([files["good"], files["unknown"]])
+    assert results[0]["verdict"] == "clean"
+    assert results[1]["verdict"] == "malicious" and results[1]["source"] == "local"
+    assert results[1]["short_circuit"]
+    assert lookup.calls == 1
+
+    reputation.check_files([files["unknown"]])
+    assert lookup.calls == 1
+    assert reputation.stats["external_cache_hits"] == 1
+    assert reputation.stats["external_decided"] == 2
+
+    assert reputation.check_files([files["unknown"]], external=False)[0]["verdict"] == "unknown"
+    assert lookup.calls == 1
+
+def test_external_misses_are_cached_and_errors_are_not(tmp_path, hash_dir):
+    class FlakyLookup:
+        name = "flaky"
+
+        def __init__(self):
+            self.calls = 0
+
+        def lookup(self, sha256):
+            self.calls += 1
+            if self.calls == 1:
+                raise TimeoutError("timed out")
+            return None
+
+    lookup = FlakyLookup()
+    reputation = make_reputation(tmp_path, hash_dir, lookup=lookup, cache_size=1)
+    assert reputation.external("a" * 64) is None
+    assert reputation.stats["external_errors"] == 1
+    assert reputation.external("a" * 64) is None
+    assert reputation.external("a" * 64) is None
+    assert lookup.calls == 2
+
+    # LRU of one entry
+    reputation.external("b" * 64)
+    assert list(reputation.cache) == ["b" * 64]
+    assert make_reputation(tmp_path, hash_dir).external("a" * 64) is None
+
+def test_local_lookup_from_file(tmp_path):
+    path = tmp_path / "verdicts.json"
+    path.write_text('{"AA": {"verdict": "suspicious", "positives": 1}}')
+    lookup = LocalReputationLookup.from_file(str(path))
+    assert lookup.lookup("aa") == {"verdict": "suspicious", "positives": 1}
+    assert lookup.lookup("bb") is None
+
+def test_signature_batch_skips_unknown_files_without_a_scanner(client, monkeypatch, tmp_path, hash_dir, files):
+    reputation = make_reputation(tmp_path, hash_dir)
+    reputation.ensure_loaded()
+    monkeypatch.setattr(app, "hash_reputation", reputation)
+    monkeypatch.setattr(app, "ENHANCED_MODULES_AVAILABLE", False)
+
+    response = client.post("/api/signature/detect/batch",
+                           json={"file_paths": [files["bad"], files["good"], files["unknown"]]})
+    body = response.json()
+    assert response.status_code == 200
+    assert (body["detected"], body["short_circuited"], body["not_scanned"]) == (1, 2, 1)
+    assert body["results"][0]["threat_type"] == "Known Malware (emotet)"
+
+    response = client.post("/api/signature/detect", json={"file_path": files["unknown"]})
+    assert response.status_code == 503
+    response = client.post("/api/signature/hashes/lookup", json={"hashes": [sha256(GOOD)]})
+    assert response.json()["known_good"] == 1
@@ -0,0 +1,41 @@
+from ml_model import ThreatDetectionModel, VerdictMemo
+
+FLOW = {"packet_count": 5000, "connection_duration": 10, "bytes_transferred": 10**6,
+        "packet_rate": 500, "port_number": 22, "protocol_type": 1, "flag_count": 8}
+
+def test_memoized_predictions_match_uncached_ones():
+    plain = ThreatDetectionModel()
+    memoized = ThreatDetectionModel(memo_size=100)
+    flows = [FLOW, dict(FLOW, packet_count=10), FLOW, dict(FLOW, port_number=8080), FLOW]
+    assert [memoized.predict(flow) for flow in flows] == [plain.predict(flow) for flow in flows]
+    stats = memoized.memo_stats()
+    assert (stats["hits"], stats["misses"]) == (2, 3)
+
+def test_cached_results_are_copied_for_callers():
+    model = ThreatDetectionModel(memo_size=10)
+    _, _, details = model.predict(FLOW)
+    details["feature_contributions"]["packet_count"] = -1
+    assert model.predict(FLOW)[2]["feature_contributions"]["packet_count"] != -1
+
+def test_parameter_changes_invalidate_the_memo():
+    model = ThreatDetectionModel(memo_size=10)
+    before = model.predict(dict(FLOW, packet_count=500))[1]
+    model.update_thresholds({"packet_count": 250})
+    assert model.memo_stats()["size"] == 0
+    assert model.predict(dict(FLOW, packet_count=500))[1] > before
+
+def test_memo_evicts_least_recently_used():
+    memo = VerdictMemo(max_size=2)
+    memo.put((1.0,), {"n": 1})
+    memo.put((2.0,), {"n": 2})
+    memo.get((1.0,))
+    memo.put((3.0,), {"n": 3})
+    assert memo.get((2.0,)) is None
+    assert memo.get((1.0,)) == {"n": 1}
+    assert memo.stats["evictions"] == 1
+
+def test_predict_batch_matches_predict():
+    model = ThreatDetectionModel()
+    rows = [FLOW, {"packet_count": 10}, dict(FLOW, port_number=2000), {}]
+    assert model.predict_batch(rows) == [model.predict(row) for row in rows]
+    assert model.predict_batch([]) == []
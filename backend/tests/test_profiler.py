@@ -0,0 +1,139 @@
+from collections import Counter
+import asyncio
+import sys
+import threading
+import time
+
+import pytest
+
+import app
+from profiler import LoopLagMonitor, StackSampler, collapsed, is_idle, top_frames
+
+def spin_for_profile(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+def wait(stop):
+    # Same name as threading's wait, but application code
+    while not stop.is_set():
+        sum(range(1000))
+
+@pytest.fixture
+def threads():
+    stop = threading.Event()
+    started = []
+
+    def start(target):
+        thread = threading.Thread(target=target, args=(stop,), name=target.__name__, daemon=True)
+        thread.start()
+        started.append(thread)
+        return thread
+
+    yield start
+    stop.set()
+    for thread in started:
+        thread.join()
+
+def leaf_frame(thread):
+    for _ in range(100):
+        frame = sys._current_frames().get(thread.ident)
+        if frame is not None:
+            return frame
+        time.sleep(0.01)
+
+def test_is_idle_matches_module_and_function(threads):
+    parked = threads(lambda stop: stop.wait())
+    busy = threads(wait)
+    time.sleep(0.05)
+    assert is_idle(leaf_frame(parked))
+    # The leaf of the busy thread is its own frame, or a builtin called from it
+    frame = leaf_frame(busy)
+    assert frame.f_code.co_name == "wait" and not is_idle(frame)
+
+def test_sampler_collects_busy_threads_and_skips_idle_ones(threads):
+    threads(spin_for_profile)
+    threads(lambda stop: stop.wait())
+    result = StackSampler(interval=0.002).sample(0.2)
+    assert result["samples"] > 10
+    assert 0.0 <= result["sampler_busy_fraction"] <= 1.0
+    stacks = result["stacks"]
+    assert any(stack.startswith("spin_for_profile;") and "spin_for_profile (tests/test_profiler.py:" in stack
+               for stack in stacks)
+    assert not any(stack.startswith("<lambda>;") for stack in stacks)
+
+    idle = StackSampler(interval=0.002, include_idle=True).sample(0.05)["stacks"]
+    assert any(stack.startswith("<lambda>;") for stack in idle)
+
+def test_one_profile_at_a_time():
+    with StackSampler.lock:
+        with pytest.raises(RuntimeError, match="already running"):
+            StackSampler().sample(0.01)
+
+def test_sample_duration_is_clamped():
+    result = StackSampler(interval=0).sample(-1)
+    assert result["samples"] == 0
+    assert result["interval_ms"] == 1.0
+
+def test_collapsed_and_top_frames():
+    stacks = Counter({"main;a;b": 3, "main;a": 2, "worker;a;c": 1, "idle": 4})
+    assert collapsed(stacks) == "idle 4\nmain;a 2\nmain;a;b 3\nworker;a;c 1\n"
+    assert top_frames(stacks) == [
+        {"frame": "b", "self": 3, "inclusive": 3},
+        {"frame": "a", "self": 2, "inclusive": 6},
+        {"frame": "c", "self": 1, "inclusive": 1},
+    ]
+    assert top_frames(stacks, limit=1)[0]["frame"] == "b"
+
+def test_loop_lag_monitor_records_the_blocking_coroutine():
+    async def blocking_handler():
+        time.sleep(0.3)
+
+    async def main():
+        monitor = LoopLagMonitor(threshold=0.1, interval=0.01, max_events=5)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        await blocking_handler()
+        await asyncio.sleep(0.05)
+        summary = monitor.summary()
+        await monitor.stop()
+        return monitor, summary
+
+    monitor, summary = asyncio.run(main())
+    assert summary["running"] and not monitor.summary()["running"]
+    assert summary["stalls"] == 1
+    assert summary["max_lag_ms"] >= 250
+    event = summary["events"][0]
+    assert event["coroutine"].endswith("blocking_handler")
+    assert any(frame.startswith("blocking_handler (tests/test_profiler.py:") for frame in event["stack"])
+
+def test_loop_lag_summary_without_samples():
+    summary = LoopLagMonitor().summary()
+    assert summary["stalls"] == 0 and summary["recent_p99_ms"] == 0.0 and summary["events"] == []
+
+def test_admin_endpoints_are_hidden_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(app, "ADMIN_TOKEN", "")
+    assert client.get("/api/admin/loop-lag").status_code == 404
+    assert client.get("/api/admin/profile", headers={"X-Admin-Token": ""}).status_code == 404
+
+def test_admin_endpoints_need_the_token(client, monkeypatch):
+    monkeypatch.setattr(app, "ADMIN_TOKEN", "s3cret")
+    assert client.get("/api/admin/loop-lag").status_code == 401
+    assert client.get("/api/admin/loop-lag", headers={"X-Admin-Token": "wrong"}).status_code == 401
+
+    headers = {"X-Admin-Token": "s3cret"}
+    response = client.get("/api/admin/loop-lag", params={"events": 5}, headers=headers)
+    assert response.status_code == 200 and "stalls" in response.json()
+
+    response = client.get("/api/admin/profile", params={"seconds": 0.05, "format": "json"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["samples"] > 0
+    response = client.get("/api/admin/profile", params={"seconds": 0.05}, headers=headers)
+    assert response.headers["content-type"].startswith("text/plain")
+
+    assert client.get("/api/admin/profile", params={"format": "svg"}, headers=headers).status_code == 400
+    assert client.get("/api/admin/profile", params={"seconds": 61}, headers=headers).status_code == 422
+    with StackSampler.lock:
+        assert client.get("/api/admin/profile", params={"seconds": 0.05}, headers=headers).status_code == 409
+
+    monkeypatch.setattr(app, "loop_lag_monitor", None)
+    assert client.get("/api/admin/loop-lag", headers=headers).status_code == 503
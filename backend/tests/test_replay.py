@@ -0,0 +1,101 @@
+import gzip
+import json
+import os
+import subprocess
+import sys
+
+from model_bundle import load_bundle
+from replay import BundleSink, FlowScorer, NDJSONSink, parse_lines, replay
+
+FLOWS = [
+    {"id": "1", "device_id": "d1", "packet_count": 5000, "connection_duration": 1.0,
+     "bytes_transferred": 10**6, "port": 22, "protocol": "TCP", "flags": ["S", "S", "S", "S", "S", "S"]},
+    {"id": "2", "device_id": "d2", "packet_count": 3, "connection_duration": 1.0,
+     "bytes_transferred": 100, "port": 443, "protocol": "HTTPS", "flags": []},
+]
+
+class ListSink:
+    def __init__(self):
+        self.results = []
+
+    def write(self, results):
+        self.results.extend(results)
+
+def write_ndjson(path, records, extra_lines=()):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+        for line in extra_lines:
+            f.write(line + "\n")
+
+def test_ndjson_and_gzip_inputs_are_scored_in_order(tmp_path):
+    plain, gzipped = str(tmp_path / "a.ndjson"), str(tmp_path / "b.ndjson.gz")
+    write_ndjson(plain, FLOWS)
+    write_ndjson(gzipped, FLOWS[::-1])
+    sink = ListSink()
+    progress = replay([plain, gzipped], "flows", sink, batch_size=1)
+    assert [result["id"] for result in sink.results] == ["1", "2", "2", "1"]
+    assert sink.results[0]["is_threat"] and not sink.results[1]["is_threat"]
+    assert progress.to_dict()["files"] == 2 and progress.finished
+
+def test_bad_records_are_skipped_and_counted(tmp_path):
+    path = str(tmp_path / "a.ndjson")
+    write_ndjson(path, FLOWS + [dict(FLOWS[0], id="bad", packet_count="lots")], ["{not json", "[1, 2]"])
+    sink = ListSink()
+    progress = replay([path], "flows", sink)
+    assert [result["id"] for result in sink.results] == ["1", "2"]
+    assert progress.skipped == 3
+
+def test_csv_cells_stay_strings(tmp_path):
+    path = str(tmp_path / "a.csv")
+    with open(path, "w") as f:
+        f.write("id,device_id,packet_count,port,protocol,flags\n")
+        f.write("007,d1,5000,22,TCP,S|S|S\n")
+        f.write("008,d2,oops,22,TCP,\n")
+    sink = ListSink()
+    progress = replay([path], "flows", sink)
+    assert [result["id"] for result in sink.results] == ["007"]
+    assert progress.skipped == 1
+
+def test_parse_lines_drops_empty_csv_cells():
+    assert parse_lines(["a", "b"], ["1,\n"]) == [{"a": "1"}]
+
+def test_worker_pool_matches_in_process(tmp_path):
+    path = str(tmp_path / "a.ndjson")
+    write_ndjson(path, FLOWS * 5)
+    in_process, pooled = ListSink(), ListSink()
+    replay([path], "flows", in_process, batch_size=3)
+    replay([path], "flows", pooled, batch_size=3, workers=2)
+    assert pooled.results == in_process.results
+
+def test_live_model_parameters_override_the_file():
+    from ml_model import ThreatDetectionModel
+    live = ThreatDetectionModel()
+    live.update_thresholds({"packet_count": 1})
+    scorer = FlowScorer(params=live.get_params())
+    assert scorer.model.thresholds["packet_count"] == 1
+
+def test_sinks(tmp_path):
+    results = [{"id": "1", "is_threat": True, "confidence": 0.9, "threat_type": "X"},
+               {"id": "2", "is_threat": False, "confidence": 0.1, "threat_type": None}]
+    ndjson = NDJSONSink(str(tmp_path / "out.ndjson.gz"))
+    ndjson.write(results)
+    ndjson.close()
+    with gzip.open(str(tmp_path / "out.ndjson.gz"), "rt") as f:
+        assert [json.loads(line) for line in f] == results
+
+    BundleSink(str(tmp_path / "parts")).write(results)
+    bundle = load_bundle(str(tmp_path / "parts" / "part-00000.nsmb"))
+    assert bundle.array("is_threat").tolist() == [True, False]
+    codes = bundle.array("threat_type").tolist()
+    assert [bundle.metadata["dictionaries"]["threat_type"][code] for code in codes] == ["X", ""]
+
+def test_runs_as_a_standalone_script(tmp_path):
+    path = str(tmp_path / "a.ndjson")
+    write_ndjson(path, FLOWS)
+    script = os.path.join(os.path.dirname(__file__), "..", "replay.py")
+    completed = subprocess.run([sys.executable, script, "flows", path, "-o", str(tmp_path / "out.ndjson")],
+                               cwd=str(tmp_path), capture_output=True, text=True, timeout=120)
+    assert completed.returncode == 0, completed.stderr
+    assert json.loads(completed.stdout)["records"] == 2
@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pytest
+
+from model_bundle import save_bundle, load_bundle
+from shared_models import (MISSING_NAN, ModelPublisher, SharedModelRegistry, SharedTreeModel,
+                           SharedWindows10Model, flatten_lgb_model)
+
+# Two stumps in LightGBM dump_model() shape: x0 <= 0.5 (NaN goes right), x1 <= 2
+MODEL_DUMP = {
+    "objective": "binary sigmoid:1",
+    "max_feature_idx": 1,
+    "tree_info": [
+        {"tree_structure": {"split_feature": 0, "threshold": 0.5, "decision_type": "<=", "default_left": False,
+                            "missing_type": "NaN", "internal_value": 0.0,
+                            "left_child": {"leaf_value": -1.0}, "right_child": {"leaf_value": 1.0}}},
+        {"tree_structure": {"split_feature": 1, "threshold": 2.0, "decision_type": "<=", "default_left": True,
+                            "missing_type": "None", "internal_value": 0.25,
+                            "left_child": {"leaf_value": 0.0}, "right_child": {"leaf_value": 0.5}}}
+    ]
+}
+
+def tree_model(tmp_path):
+    arrays, metadata = flatten_lgb_model(MODEL_DUMP)
+    path = str(tmp_path / "trees.nsmb")
+    save_bundle(path, arrays, metadata)
+    return SharedTreeModel(load_bundle(path))
+
+def test_flattened_trees_predict_like_the_booster(tmp_path):
+    model = tree_model(tmp_path)
+    X = np.array([[0.0, 1.0], [1.0, 3.0], [np.nan, 1.0], [0.0, np.nan]])
+    raw = np.array([-1.0, 1.5, 1.0, -1.0])
+    np.testing.assert_allclose(model.predict_raw(X)[:, 0], raw)
+    np.testing.assert_allclose(model.predict(X), 1.0 / (1.0 + np.exp(-raw)))
+
+def test_contributions_sum_to_the_raw_score(tmp_path):
+    model = tree_model(tmp_path)
+    X = np.array([[0.0, 1.0], [1.0, 3.0], [np.nan, 5.0]])
+    contrib = model.predict(X, pred_contrib=True)
+    assert contrib.shape == (3, 3)
+    np.testing.assert_allclose(contrib.sum(axis=1), model.predict_raw(X)[:, 0])
+
+def test_missing_type_and_categorical_splits():
+    arrays, _ = flatten_lgb_model(MODEL_DUMP)
+    assert arrays["node_missing_type"][0] == MISSING_NAN
+    categorical = {"tree_info": [{"tree_structure": dict(MODEL_DUMP["tree_info"][0]["tree_structure"],
+                                                         decision_type="==")}]}
+    with pytest.raises(ValueError):
+        flatten_lgb_model(categorical)
+
+def test_registry_follows_published_versions(tmp_path):
+    directory = str(tmp_path)
+    publisher = ModelPublisher(directory, keep_versions=2)
+    registry = SharedModelRegistry(directory, check_interval=0)
+    assert not registry.available("m")
+
+    for version in range(1, 4):
+        publisher.publish("m", {"w": np.full(3, float(version))})
+        assert registry.get("m").array("w")[0] == version
+    assert registry.versions() == {"m": 3}
+    assert registry.stats["reloads"] == 2
+    # Only the newest keep_versions segments are left
+    assert sorted(name for name in os.listdir(directory) if name.endswith(".nsmb")) == ["m.2.nsmb", "m.3.nsmb"]
+
+def test_windows10_model_pairs_trees_with_their_scaler(tmp_path):
+    arrays, metadata = flatten_lgb_model(MODEL_DUMP)
+    arrays.update(scaler_mean=np.zeros(2), scaler_scale=np.ones(2))
+    ModelPublisher(str(tmp_path)).publish("windows10", arrays, metadata)
+    current = SharedWindows10Model(SharedModelRegistry(str(tmp_path))).current()
+    assert current.version == 1
+    np.testing.assert_allclose(current.scaler.transform([[1.0, 2.0]]), [[1.0, 2.0]])
+
+def test_matches_lightgbm_when_installed(tmp_path):
+    lgb = pytest.importorskip("lightgbm")
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 4))
+    X[::7, 2] = np.nan
+    y = (X[:, 0] + np.nan_to_num(X[:, 2]) > 0).astype(int)
+    booster = lgb.train({"objective": "binary", "verbose": -1, "num_leaves": 7}, lgb.Dataset(X, y), 10)
+    arrays, metadata = flatten_lgb_model(booster.dump_model())
+    path = str(tmp_path / "lgb.nsmb")
+    save_bundle(path, arrays, metadata)
+    model = SharedTreeModel(load_bundle(path))
+    np.testing.assert_allclose(model.predict(X), booster.predict(X), rtol=1e-9)
@@ -0,0 +1,165 @@
+import pytest
+
+import app
+from social_engineering import (
+    CompiledSocialRules, DomainTrie, SocialEngineeringEngine, domain_skeleton, extract_domains,
+    normalize_domain, normalize_text
+)
+from threat_rules import RuleError
+
+SPEC = {
+    "patterns": [
+        {"category": "urgency", "weight": 1.5, "phrases": ["act now", "final notice", "Act  Now"]},
+        {"category": "credential_harvesting", "weight": 3.0,
+         "phrases": ["confirm your password", "confirm your account"],
+         "regex": [r"\bone[- ]time (?:pass)?code\b"]},
+    ],
+    "domains": {
+        "suspicious": [{"domain": "bit.ly", "category": "url_shortener", "weight": 1.0},
+                       {"domain": "top", "category": "suspicious_tld"}],
+        "allow": ["paypal.com", "safe.bit.ly"],
+        "brands": ["paypal.com", "microsoft.com", "amazon.co.uk"],
+        "lookalike_weight": 4.0
+    },
+    "thresholds": {"low": 1.0, "medium": 3.0, "high": 6.0, "critical": 9.0}
+}
+
+@pytest.fixture
+def engine():
+    return SocialEngineeringEngine(spec=SPEC)
+
+def test_phrases_match_whole_words_across_whitespace_and_case(engine):
+    match = engine.compiled.match_text
+    assert match("Please ACT\n  now!") == {"urgency": ["act now"]}
+    assert match("react nowhere") == {}
+    # Duplicate phrases are compiled once and reported once
+    assert engine.compiled.phrase_count == 4
+    assert match("act now, act now") == {"urgency": ["act now"]}
+
+def test_shared_prefixes_and_regex_branches(engine):
+    found = engine.compiled.match_text("confirm your account, confirm your password, one-time code")
+    assert found == {"credential_harvesting": ["confirm your account", "confirm your password",
+                                               r"\bone[- ]time (?:pass)?code\b"]}
+
+def test_homoglyphs_and_invisible_characters_are_normalized(engine):
+    # Cyrillic a/o, a zero-width space and fullwidth letters
+    text = "аct n​оw: ｆｉｎａｌ notice"
+    assert normalize_text("ＡＣＴ") == "act"
+    assert engine.compiled.match_text(text) == {"urgency": ["act now", "final notice"]}
+
+def test_trie_takes_the_longest_suffix():
+    trie = DomainTrie()
+    trie.insert("bit.ly", "suspicious")
+    trie.insert("safe.bit.ly", "allow")
+    assert trie.match("x.bit.ly") == "suspicious"
+    assert trie.match("a.safe.bit.ly") == "allow"
+    assert trie.match("notbit.ly") is None
+    assert trie.size == 2
+
+@pytest.mark.parametrize("domain, types", [
+    ("bit.ly", ["url_shortener"]),
+    ("go.safe.bit.ly", []),
+    ("login.paypal.com", []),
+    ("paypal.de", []),
+    ("amazon.co.uk", []),
+    ("rnicrosoft.com", ["lookalike_domain"]),
+    ("paypa1.com", ["lookalike_domain"]),
+    ("paypal.evil.top", ["suspicious_tld", "lookalike_domain"]),
+    ("amazon.co.uk.evil.top", ["suspicious_tld", "lookalike_domain"]),
+    ("example.org", []),
+])
+def test_check_domain(engine, domain, types):
+    findings = engine.compiled.check_domain(normalize_domain(domain))
+    assert [finding["type"] for finding in findings] == types
+
+def test_homoglyph_and_punycode_domains_imitate_the_brand(engine):
+    for domain in ("pаypal.com", "xn--pypal-4ve.com"):
+        findings = engine.compiled.check_domain(normalize_domain(domain))
+        assert findings == [{"type": "lookalike_domain", "domain": "pаypal.com",
+                             "imitates": "paypal.com", "weight": 4.0}]
+    assert domain_skeleton("rnicr0soft.com") == domain_skeleton("microsoft.com")
+
+def test_extract_domains_in_first_seen_order():
+    data = {"sender": "Support <help@Mail.Example.COM>", "links": ["https://bit.ly/x", "evil.top/login"],
+            "content": "see hxxps://paypal.evil.top/a or www.other.example and mail ops@mail.example.com"}
+    text = data["content"]
+    assert extract_domains(data, text) == ["mail.example.com", "bit.ly", "evil.top", "paypal.evil.top",
+                                           "www.other.example"]
+    assert extract_domains({"sender": "no domain here"}, "") == []
+
+def test_score_weights_levels_and_hits(engine):
+    result = engine.score({"subject": "Final notice", "content": "act now and confirm your password",
+                           "sender": "billing@paypa1.com"})
+    # urgency: 1.5 * (1 + 0.5), credentials: 3.0, lookalike: 4.0
+    assert result["overall_risk_score"] == 9.25
+    assert result["threat_level"] == "CRITICAL"
+    assert result["threat_types"] == ["urgency", "credential_harvesting", "lookalike_domain"]
+
+    assert engine.score({"content": "hello"}) == {
+        "threats_detected": [], "threat_types": [], "threat_level": "NONE", "overall_risk_score": 0.0
+    }
+    assert engine.score({"content": "act now"})["threat_level"] == "LOW"
+    assert engine.score({"content": "see https://bit.ly/x", "subject": 5})["overall_risk_score"] == 1.0
+
+    summary = engine.summary()
+    assert summary["messages"] == 4
+    assert summary["categories"]["urgency"]["hits"] == 2
+    assert summary["domain_hits"] == {"lookalike_domain": 1, "url_shortener": 1}
+
+def test_score_is_capped_at_ten(engine):
+    content = " ".join(["act now", "final notice", "confirm your password", "confirm your account",
+                        "one time passcode"])
+    result = engine.score({"content": content, "links": ["https://paypal.evil.top", "https://rnicrosoft.com"]})
+    assert result["overall_risk_score"] == 10.0
+
+def test_score_batch_matches_score(engine):
+    messages = [{"content": "act now"}, {"content": "nothing"}, {"sender": "x@rnicrosoft.com"}]
+    assert engine.score_batch(messages) == [SocialEngineeringEngine(spec=SPEC).score(m) for m in messages]
+
+@pytest.mark.parametrize("spec, message", [
+    ({"patterns": [{"phrases": ["x"]}]}, "category is required"),
+    ({"patterns": [{"category": "c", "regex": ["("]}]}, "invalid regex"),
+    ({"domains": {"suspicious": [{"category": "c"}]}}, "domain is required"),
+])
+def test_invalid_specs_are_rejected(spec, message):
+    with pytest.raises(RuleError, match=message):
+        CompiledSocialRules(spec)
+
+def test_empty_spec_matches_nothing():
+    engine = SocialEngineeringEngine(spec={})
+    assert engine.score({"content": "act now", "sender": "a@b.example"})["threat_level"] == "NONE"
+
+def test_failed_reload_keeps_the_old_rules(engine, tmp_path):
+    with pytest.raises(RuleError):
+        engine.reload(spec={"patterns": [{"category": "c", "regex": ["["]}]})
+    assert engine.score({"content": "act now"})["threat_types"] == ["urgency"]
+    assert engine.reloads == 0
+
+    path = tmp_path / "rules.yaml"
+    path.write_text("patterns:\n  - category: reward\n    phrases: [you have won]\n")
+    assert engine.reload(path=str(path)) == {"phrases": 1, "regex": 0, "domains": 0}
+    assert engine.path == str(path)
+    assert engine.score({"content": "act now"})["threat_types"] == []
+    assert engine.score({"content": "You have WON"})["threat_types"] == ["reward"]
+
+    path.write_text("- not a mapping\n")
+    with pytest.raises(RuleError, match="mapping"):
+        engine.reload()
+
+def test_shipped_rules_compile():
+    engine = SocialEngineeringEngine()
+    result = engine.score({"sender": "security@rnicrosoft.com",
+                           "content": "Unusual sign-in activity. Confirm your password within 24 hours."})
+    assert {"account_threat", "credential_harvesting", "urgency", "lookalike_domain"} <= set(result["threat_types"])
+    assert engine.score({"sender": "news@github.com", "content": "Your weekly digest"})["threat_level"] == "NONE"
+
+def test_detect_batch_and_rules_endpoints(client, monkeypatch, engine):
+    monkeypatch.setattr(app, "social_engine", engine)
+    response = client.post("/api/social-engineering/detect/batch",
+                           json={"messages": [{"content": "act now"}, {"content": "hi"}]})
+    assert response.status_code == 200
+    assert [r["threat_level"] for r in response.json()["results"]] == ["LOW", "NONE"]
+    assert client.get("/api/social-engineering/rules").json()["messages"] == 2
+
+    monkeypatch.setattr(app, "social_engine", None)
+    assert client.post("/api/social-engineering/detect/batch", json={"messages": []}).status_code == 503
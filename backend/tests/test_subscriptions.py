@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from subscriptions import SubscriptionIndex, compile_subscription
+
+def alert(**fields):
+    return {"severity": "high", "status": "open", "device_id": "d1", "detection_method": "ml_model",
+            "threat_type": "Port Scan", "confidence": 0.9, **fields}
+
+def test_compile_accepts_strings_lists_and_numbers():
+    subscription = compile_subscription({"severity": "high,critical", "device_id": 7, "status": ["open"]})
+    assert subscription.to_dict() == {"device_id": ["7"], "severity": ["critical", "high"], "status": ["open"]}
+    assert compile_subscription(None).is_wildcard
+    assert compile_subscription({"severity": None}).is_wildcard
+
+@pytest.mark.parametrize("filters", [["severity"], "severity", {"bogus": "x"}, {"severity": {"a": 1}}])
+def test_compile_rejects_invalid_filters(filters):
+    with pytest.raises(ValueError):
+        compile_subscription(filters)
+
+def test_index_matches_every_constrained_field():
+    index = SubscriptionIndex()
+    index.add("all")
+    index.add("high", compile_subscription({"severity": "high"}))
+    index.add("high-d2", compile_subscription({"severity": "high", "device_id": "d2"}))
+    index.add("confident", compile_subscription({"min_confidence": 0.95}))
+
+    assert index.match(alert()) == {"all", "high"}
+    assert index.match(alert(device_id="d2", confidence=0.99)) == {"all", "high", "high-d2", "confident"}
+    assert index.match(alert(severity="low")) == {"all"}
+
+def test_index_stringifies_alert_values():
+    index = SubscriptionIndex()
+    index.add("c", compile_subscription({"device_id": "42"}))
+    assert index.match(alert(device_id=42)) == {"c"}
+
+def test_resubscribe_and_remove_clean_up_the_index():
+    index = SubscriptionIndex()
+    index.add("c", compile_subscription({"severity": "high"}))
+    index.add("c", compile_subscription({"severity": "low"}))
+    assert index.match(alert()) == set()
+    assert index.match(alert(severity="low")) == {"c"}
+
+    index.remove("c")
+    assert index.summary()["indexed_values"]["severity"] == 0
+    assert index.match(alert(severity="low")) == set()
+
+def test_filter_is_lazy_per_client():
+    index = SubscriptionIndex()
+    index.add("c", compile_subscription({"severity": "low"}))
+    alerts = [alert(), alert(severity="low")]
+    assert list(index.filter("c", alerts)) == [alerts[1]]
+    assert index.filter("unknown", alerts) is alerts
+
+def test_websocket_subscribe_reports_invalid_filters(client):
+    with client.websocket_connect("/ws") as ws:
+        ws.receive_text()
+        for filters in (["severity"], {"min_confidence": [1]}, {"bogus": "x"}):
+            ws.send_text(json.dumps({"type": "subscribe", "filters": filters}))
+            assert json.loads(ws.receive_text())["type"] == "error"
+
+        ws.send_text(json.dumps({"type": "subscribe", "filters": {"severity": "critical"}}))
+        subscribed = json.loads(ws.receive_text())
+        assert subscribed["type"] == "subscribed"
+        assert subscribed["filters"] == {"severity": ["critical"]}
+
+def test_pong_reports_last_seq_sent_to_a_filtered_client(client):
+    with client.websocket_connect("/ws?severity=critical") as ws:
+        seq = json.loads(ws.receive_text())["seq"]
+        # A medium alert is filtered out for this client, so its pong seq must not move
+        client.post("/test-alert")
+        ws.send_text(json.dumps({"type": "ping"}))
+        pong = json.loads(ws.receive_text())
+    assert pong["type"] == "pong"
+    assert pong["seq"] == seq
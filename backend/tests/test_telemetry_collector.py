@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("psutil")
+
+from telemetry_collector import FEATURE_SOURCES, TelemetryCollector
+
+class RecordingDetector:
+    feature_names = ["ts", "Process_Thread Count", "Memory Page Faults sec", "Not A Real Counter"]
+
+    def __init__(self):
+        self.batches = []
+
+    def detect_batch(self, rows):
+        self.batches.append(np.array(rows))
+        return [{"is_threat": False} for _ in rows]
+
+def test_samples_are_scored_in_batches():
+    detector = RecordingDetector()
+    delivered = []
+    collector = TelemetryCollector(detector, batch_size=3, device_id="host",
+                                   on_results=lambda device_id, results: delivered.append((device_id, len(results))))
+
+    # The first sample only sets the baseline for rate counters
+    assert collector.sample() is None
+    for _ in range(3):
+        collector.sample()
+
+    assert len(detector.batches) == 1
+    batch = detector.batches[0]
+    assert batch.shape == (3, 4)
+    assert (batch[:, 2] >= 0).all()
+    # Unmapped features stay zero, as in detect()
+    assert (batch[:, 3] == 0).all()
+    assert delivered == [("host", 3)]
+    assert collector.summary()["unmapped_features"] == ["Not A Real Counter"]
+
+def test_flush_scores_a_partial_batch():
+    detector = RecordingDetector()
+    collector = TelemetryCollector(detector, batch_size=10)
+    collector.sample()
+    collector.sample()
+    assert collector.flush() == [{"is_threat": False}]
+    assert collector.flush() == []
+
+def test_every_feature_source_is_known():
+    sources = {"clock", "process", "cpu", "meminfo", "vmstat", "net", "disk"}
+    assert all(source in sources and kind in ("gauge", "rate") for source, _, kind in FEATURE_SOURCES.values())
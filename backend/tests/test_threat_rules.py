@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from threat_rules import RuleError, ThreatRuleEngine
+
+FEATURES = ["a", "b"]
+SPEC = {
+    "default": "Other",
+    "rules": [
+        {"name": "low", "threat_type": "Low Priority", "priority": 1, "all": ["a > 0.5"]},
+        {"name": "high", "threat_type": "High Priority", "priority": 10, "all": ["a > 0.5", "b > 0.5"]},
+        {"name": "either", "threat_type": "Either", "any": ["b >= 0.9", "score > 0.95"]}
+    ]
+}
+
+def test_priority_order_and_default():
+    engine = ThreatRuleEngine(FEATURES, spec=SPEC)
+    X = np.array([[0.9, 0.9], [0.9, 0.1], [0.1, 0.95], [0.1, 0.1], [0.1, 0.1]])
+    scores = np.array([0.5, 0.5, 0.5, 0.99, 0.1])
+    assert engine.classify(X, scores).tolist() == ["High Priority", "Low Priority", "Either", "Either", "Other"]
+    assert engine.summary()["unmatched"] == 1
+    assert {rule["name"]: rule["hits"] for rule in engine.summary()["rules"]} == {"high": 1, "low": 1, "either": 2}
+
+def test_single_row_matches_the_batch_path():
+    engine = ThreatRuleEngine(FEATURES, spec=SPEC)
+    rng = np.random.default_rng(0)
+    X = rng.random((500, 2))
+    scores = rng.random(500)
+    batch = engine.classify(X, scores).tolist()
+    single = [engine.classify_one(dict(zip(FEATURES, row)), score) for row, score in zip(X.tolist(), scores)]
+    assert batch == single
+
+@pytest.mark.parametrize("rules", [
+    [{"name": "x", "threat_type": "X", "all": ["c > 1"]}],
+    [{"name": "x", "threat_type": "X", "all": ["a >> 1"]}],
+    [{"name": "x", "threat_type": "X"}],
+    [{"name": "x", "all": ["a > 1"]}],
+    [{"name": "x", "threat_type": "X", "all": ["a > 1"]}, {"name": "x", "threat_type": "Y", "all": ["b > 1"]}],
+])
+def test_invalid_specs_are_rejected(rules):
+    with pytest.raises(RuleError):
+        ThreatRuleEngine(FEATURES, spec={"rules": rules})
+
+def test_failed_reload_keeps_the_active_rules():
+    engine = ThreatRuleEngine(FEATURES, spec=SPEC)
+    with pytest.raises(RuleError):
+        engine.reload(spec={"rules": [{"name": "bad", "threat_type": "X", "all": ["nope > 1"]}]})
+    assert engine.classify_one({"a": 0.9, "b": 0.9}, 0.5) == "High Priority"
+    assert engine.reload(spec={"rules": SPEC["rules"][:1]}) == 1
+    assert engine.reloads == 1
+
+def test_shipped_rule_file_compiles():
+    pytest.importorskip("yaml")
+    from ml_model import ThreatDetectionModel
+    engine = ThreatRuleEngine(ThreatDetectionModel().features)
+    assert engine.summary()["rules"]
@@ -0,0 +1,102 @@
+from datetime import datetime
+import json
+
+import numpy as np
+import pytest
+
+import app
+from adaptive_scheduler import AdaptiveScorer
+
+class ExplainingDetector:
+    feature_names = ["cpu", "memory", "handles"]
+
+    def __init__(self, is_threat=False):
+        self.is_threat = is_threat
+        self.vectorized = 0
+        self.explained = []
+
+    def vectorize(self, metrics):
+        self.vectorized += 1
+        return np.array([[metrics.get(name, 0.0) for name in self.feature_names]], dtype=np.float64)
+
+    def detect_batch(self, rows):
+        return [{"timestamp": datetime.now().isoformat(), "is_threat": self.is_threat,
+                 "prediction": int(self.is_threat), "confidence": 0.9,
+                 "top_features": self.feature_names} for _ in rows]
+
+    def explain_batch(self, rows, top_k=5):
+        self.explained.append(top_k)
+        return [{"bias": 0.0, "top_features": [{"feature": name} for name in self.feature_names[:top_k]]}
+                for _ in rows]
+
+@pytest.fixture
+def detector(monkeypatch):
+    detector = ExplainingDetector()
+    monkeypatch.setattr(app, "TRAINED_MODELS_AVAILABLE", True)
+    monkeypatch.setattr(app, "windows10_detector", detector)
+    monkeypatch.setattr(app, "adaptive_scorer", AdaptiveScorer(detector))
+    return detector
+
+def detect(client, **request):
+    return client.post("/api/trained-models/windows10-detect",
+                       json={"device_id": "d", "metrics": {"cpu": 1.0}, **request})
+
+def test_unavailable_model_is_503(client, monkeypatch):
+    monkeypatch.setattr(app, "windows10_detector", None)
+    assert detect(client).status_code == 503
+
+@pytest.mark.parametrize("top_k", [0, -1, 4, True, "3", 2.5])
+def test_invalid_top_k_is_rejected(client, detector, top_k):
+    response = detect(client, top_k=top_k, explain=True)
+    assert response.status_code == 400
+    assert "between 1 and 3" in response.json()["detail"]
+    assert detector.vectorized == 0
+
+def test_metrics_are_vectorized_once(client, detector):
+    response = detect(client, top_k=3)
+    assert response.status_code == 200
+    assert detector.vectorized == 1
+    assert "attributions" not in response.json()["result"]
+
+def test_benign_verdicts_are_not_explained(client, detector):
+    response = detect(client, explain=True, top_k=2)
+    assert response.status_code == 200
+    assert detector.explained == []
+    assert "attributions" not in response.json()["result"]
+
+def test_threats_are_explained_with_top_k(client, detector):
+    detector.is_threat = True
+    response = detect(client, explain=True, top_k=2)
+    assert response.status_code == 200
+    attributions = response.json()["result"]["attributions"]
+    assert [f["feature"] for f in attributions["top_features"]] == ["cpu", "memory"]
+    assert detector.explained == [2]
+    assert detector.vectorized == 1
+
+def test_explain_batch_matches_booster_contributions(tmp_path):
+    lgb = pytest.importorskip("lightgbm")
+    pytest.importorskip("joblib")
+    from models.windows10_threat_detector import Windows10ThreatDetector
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 4))
+    y = (X[:, 2] > 0.2).astype(int)
+    booster = lgb.train({"objective": "binary", "verbose": -1, "num_leaves": 4},
+                        lgb.Dataset(X, y), num_boost_round=10)
+    booster.save_model(str(tmp_path / "windows10_threat_detector.lgb"))
+    names = ["f0", "f1", "f2", "f3"]
+    (tmp_path / "windows10_threat_detector_metadata.json").write_text(
+        json.dumps({"feature_names": names, "is_binary": True, "top_features": names}))
+
+    detector = Windows10ThreatDetector(model_dir=str(tmp_path))
+    rows = X[:5]
+    explanations = detector.explain_batch(rows, top_k=2)
+    contributions = booster.predict(rows, pred_contrib=True)
+    for explanation, expected in zip(explanations, contributions):
+        assert explanation["bias"] == pytest.approx(expected[-1])
+        assert len(explanation["top_features"]) == 2
+        assert explanation["top_features"][0]["feature"] == names[int(np.argmax(expected[:-1]))]
+
+    # A repeat is served from the cache
+    assert detector.explain_batch(rows, top_k=2) == explanations
+    assert len(detector.explain_cache) == 5
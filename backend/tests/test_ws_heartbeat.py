@@ -0,0 +1,170 @@
+import asyncio
+import json
+import time
+
+from ws_heartbeat import HeartbeatScheduler
+
+class FakeSocket:
+    def __init__(self, fail=False, hang=False):
+        self.sent = []
+        self.closed = None
+        self.fail = fail
+        self.hang = hang
+
+    async def send_text(self, message):
+        if self.fail:
+            raise RuntimeError("connection reset")
+        if self.hang:
+            await asyncio.sleep(3600)
+        self.sent.append(json.loads(message))
+
+    async def close(self, code=1000):
+        if self.hang:
+            await asyncio.sleep(3600)
+        self.closed = code
+
+def scheduler(**kwargs):
+    reaped = []
+    options = {"idle_timeout": 10.0, "pong_timeout": 5.0, "tick": 1.0, "on_reap": reaped.append, **kwargs}
+    return HeartbeatScheduler(**options), reaped
+
+def test_silent_peer_is_pinged_then_reaped():
+    async def main():
+        heartbeat, reaped = scheduler(ping_payload=lambda: {"seq": 42})
+        base = time.monotonic()
+        socket = FakeSocket()
+        heartbeat.add("c1", socket)
+
+        await heartbeat.advance(base + 9.0)
+        assert socket.sent == []
+        await heartbeat.advance(base + 10.5)
+        assert socket.sent == [{"type": "ping", "seq": 42}]
+        assert heartbeat.summary()["awaiting_pong"] == 1
+
+        await heartbeat.advance(base + 14.0)
+        assert reaped == []
+        await heartbeat.advance(base + 16.6)
+        assert reaped == ["c1"]
+        assert socket.closed == 1001
+        assert "c1" not in heartbeat.peers
+        summary = heartbeat.summary()
+        assert summary["reaped_unresponsive"] == 1 and summary["pings_sent"] == 1
+        assert summary["disconnects"] == 1
+        assert summary["reap_deadline"] == 16.0
+
+    asyncio.run(main())
+
+def test_any_reply_clears_the_ping():
+    async def main():
+        heartbeat, reaped = scheduler()
+        base = time.monotonic()
+        socket = FakeSocket()
+        heartbeat.add("c1", socket)
+        await heartbeat.advance(base + 10.5)
+        assert len(socket.sent) == 1
+
+        before = heartbeat.peers["c1"].last_seen
+        heartbeat.touch("c1")
+        assert heartbeat.peers["c1"].last_seen >= before
+        # A pong two seconds after the ping
+        heartbeat.peers["c1"].last_seen = base + 12.0
+        await heartbeat.advance(base + 16.6)
+        assert reaped == [] and heartbeat.peers["c1"].pinged_at == 0.0
+        # Idle again: the next ping is due idle_timeout after the reply
+        await heartbeat.advance(base + 21.0)
+        assert len(socket.sent) == 1
+        await heartbeat.advance(base + 22.5)
+        assert len(socket.sent) == 2
+
+    asyncio.run(main())
+
+def test_active_peers_are_not_pinged():
+    async def main():
+        heartbeat, _ = scheduler()
+        base = time.monotonic()
+        socket = FakeSocket()
+        heartbeat.add("c1", socket)
+        for second in range(1, 60):
+            heartbeat.peers["c1"].last_seen = base + second
+            await heartbeat.advance(base + second + 0.5)
+        assert socket.sent == [] and heartbeat.stats["pings_sent"] == 0
+        # Lazily re-slotted: the peer sits in exactly one slot
+        assert sum("c1" in slot for slot in heartbeat.slots) == 1
+
+    asyncio.run(main())
+
+def test_failed_and_blocked_sends_are_reaped():
+    async def main():
+        heartbeat, reaped = scheduler(send_timeout=0.05)
+        base = time.monotonic()
+        failing, hanging, healthy = FakeSocket(fail=True), FakeSocket(hang=True), FakeSocket()
+        heartbeat.add("failing", failing)
+        heartbeat.add("hanging", hanging)
+        heartbeat.add("healthy", healthy)
+
+        started = time.perf_counter()
+        await heartbeat.advance(base + 10.5)
+        # One shared timeout covers the blocked ping and the blocked close
+        assert time.perf_counter() - started < 1.0
+        assert sorted(reaped) == ["failing", "hanging"]
+        assert failing.closed == 1001 and hanging.closed is None
+        assert heartbeat.stats["reaped_send_failed"] == 2
+        assert list(heartbeat.peers) == ["healthy"] and len(healthy.sent) == 1
+
+    asyncio.run(main())
+
+def test_removed_peers_are_dropped_lazily():
+    async def main():
+        heartbeat, reaped = scheduler()
+        base = time.monotonic()
+        socket = FakeSocket()
+        heartbeat.add("c1", socket)
+        heartbeat.remove("c1")
+        heartbeat.remove("c1")
+        heartbeat.touch("c1")
+        await heartbeat.advance(base + 30.0)
+        assert socket.sent == [] and reaped == []
+        assert not any(heartbeat.slots)
+        assert heartbeat.stats["disconnects"] == 1
+
+    asyncio.run(main())
+
+def test_a_late_tick_catches_up_in_one_lap():
+    async def main():
+        heartbeat, reaped = scheduler()
+        base = time.monotonic()
+        sockets = {f"c{i}": FakeSocket() for i in range(100)}
+        for client_id, socket in sockets.items():
+            heartbeat.add(client_id, socket)
+        # Far past every deadline: each peer is pinged once, then reaped on the next pass
+        await heartbeat.advance(base + 1000.0)
+        assert all(len(socket.sent) == 1 for socket in sockets.values())
+        assert heartbeat.cursor == int((base + 1000.0) / heartbeat.tick)
+        await heartbeat.advance(base + 1006.0)
+        assert len(reaped) == 100
+        summary = heartbeat.summary()
+        assert summary["peak_peers"] == 100 and summary["peers"] == 0
+        assert summary["churn_per_minute"][-1]["connects"] == 100
+
+    asyncio.run(main())
+
+def test_wheel_covers_the_longest_timeout():
+    heartbeat, _ = scheduler(idle_timeout=45.0, pong_timeout=15.0, tick=0.5)
+    assert len(heartbeat.slots) == 92
+
+def test_run_loop_pings_in_real_time():
+    async def main():
+        heartbeat, reaped = scheduler(idle_timeout=0.1, pong_timeout=0.1, tick=0.02)
+        socket = FakeSocket()
+        heartbeat.add("c1", socket)
+        heartbeat.start()
+        await asyncio.sleep(0.5)
+        await heartbeat.stop()
+        return socket, reaped
+
+    socket, reaped = asyncio.run(main())
+    assert socket.sent and reaped == ["c1"]
+
+def test_connection_stats_include_the_heartbeat(client):
+    heartbeat = client.get("/api/connections/stats").json()["heartbeat"]
+    assert {"peers", "awaiting_pong", "wheel_slots", "reaped_unresponsive"} <= set(heartbeat)
@@ -0,0 +1,260 @@
+"""
+Server-driven WebSocket heartbeats on a single timer wheel
+
+Every connection sits in exactly one slot of a hashed timer wheel. One
+task advances the wheel each tick and only looks at the peers whose slot
+came due, so cost per tick is proportional to the peers due, not to the
+number of connections, and there is no per-client sleep task.
+
+Any message from a client marks it alive (an O(1) timestamp update; the
+peer is re-slotted lazily when its slot fires). A peer silent for
+``idle_timeout`` is sent ``{"type": "ping"}``; if nothing arrives within
+``pong_timeout`` after that, the connection is closed and reaped. Dead
+peers are therefore gone within ``idle_timeout + pong_timeout + tick``.
+"""
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from collections import deque
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+class _Peer:
+    __slots__ = ("client_id", "websocket", "last_seen", "pinged_at", "connected_at")
+
+    def __init__(self, client_id: str, websocket, now: float):
+        self.client_id = client_id
+        self.websocket = websocket
+        self.last_seen = now
+        self.pinged_at = 0.0
+        self.connected_at = now
+
+class HeartbeatScheduler:
+    """
+    Pings idle WebSocket clients and reaps unresponsive ones
+
+    Args:
+        idle_timeout: Seconds of client silence before a server ping
+        pong_timeout: Seconds to wait for any reply to that ping
+        tick: Wheel resolution in seconds
+        send_timeout: Seconds a ping or close may block before the peer is reaped
+        on_reap: Called with the client id after a connection is reaped
+        ping_payload: Returns extra fields for ping messages (e.g. the replay seq)
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = 45.0,
+        pong_timeout: float = 15.0,
+        tick: float = 1.0,
+        send_timeout: float = 5.0,
+        on_reap: Optional[Callable[[str], None]] = None,
+        ping_payload: Optional[Callable[[], Dict[str, Any]]] = None
+    ):
+        self.idle_timeout = idle_timeout
+        self.pong_timeout = pong_timeout
+        self.tick = tick
+        self.send_timeout = send_timeout
+        self.on_reap = on_reap
+        self.ping_payload = ping_payload
+
+        self.slots: List[set] = [set() for _ in range(int(math.ceil(max(idle_timeout, pong_timeout) / tick)) + 2)]
+        self.peers: Dict[str, _Peer] = {}
+        self.cursor = int(time.monotonic() / tick)
+        self._task: Optional[asyncio.Task] = None
+
+        # Per-minute (minute, connects, disconnects) for churn rates
+        self.churn: deque = deque(maxlen=15)
+        self.stats = {
+            "connects": 0, "disconnects": 0, "pings_sent": 0, "reaped_unresponsive": 0,
+            "reaped_send_failed": 0, "peak_peers": 0, "max_tick_ms": 0.0
+        }
+
+    def _schedule(self, peer: _Peer, when: float) -> None:
+        # Never schedule into the slot being processed or one already passed
+        tick = max(int(when / self.tick), self.cursor + 1)
+        self.slots[tick % len(self.slots)].add(peer.client_id)
+
+    def _count(self, field: int) -> None:
+        minute = int(time.time() // 60)
+        if not self.churn or self.churn[-1][0] != minute:
+            self.churn.append([minute, 0, 0])
+        self.churn[-1][field] += 1
+
+    def add(self, client_id: str, websocket) -> None:
+        now = time.monotonic()
+        peer = self.peers[client_id] = _Peer(client_id, websocket, now)
+        # Jitter the first check so a reconnect storm does not ping everyone in the same tick
+        self._schedule(peer, now + self.idle_timeout * random.uniform(0.5, 1.0))
+        self.stats["connects"] += 1
+        self.stats["peak_peers"] = max(self.stats["peak_peers"], len(self.peers))
+        self._count(1)
+
+    def remove(self, client_id: str) -> None:
+        # The wheel entry is dropped lazily when its slot fires
+        if self.peers.pop(client_id, None) is not None:
+            self.stats["disconnects"] += 1
+            self._count(2)
+
+    def touch(self, client_id: str) -> None:
+        """Record that a client sent something"""
+        peer = self.peers.get(client_id)
+        if peer is not None:
+            peer.last_seen = time.monotonic()
+
+    def start(self) -> None:
+        self.cursor = int(time.monotonic() / self.tick)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            started = time.perf_counter()
+            try:
+                await self.advance(time.monotonic())
+            except Exception as e:
+                logger.error(f"Heartbeat tick failed: {e}")
+            self.stats["max_tick_ms"] = max(self.stats["max_tick_ms"], (time.perf_counter() - started) * 1000)
+
+    async def advance(self, now: float) -> None:
+        """Process every slot up to ``now``, catching up after a late tick"""
+        target = int(now / self.tick)
+        to_ping: List[_Peer] = []
+        to_reap: List[Tuple[_Peer, str]] = []
+        # A late loop never needs more than one lap: every slot is visited once
+        start = max(self.cursor + 1, target - len(self.slots) + 1)
+        for tick in range(start, target + 1):
+            self.cursor = tick
+            slot = self.slots[tick % len(self.slots)]
+            due = list(slot)
+            slot.clear()
+            for client_id in due:
+                peer = self.peers.get(client_id)
+                if peer is None:
+                    continue
+                if peer.pinged_at and peer.last_seen >= peer.pinged_at:
+                    peer.pinged_at = 0.0
+                if peer.pinged_at:
+                    if now >= peer.pinged_at + self.pong_timeout:
+                        to_reap.append((peer, "reaped_unresponsive"))
+                    else:
+                        self._schedule(peer, peer.pinged_at + self.pong_timeout)
+                elif now >= peer.last_seen + self.idle_timeout:
+                    peer.pinged_at = now
+                    to_ping.append(peer)
+                    self._schedule(peer, now + self.pong_timeout)
+                else:
+                    self._schedule(peer, peer.last_seen + self.idle_timeout)
+        self.cursor = max(self.cursor, target)
+
+        if to_ping:
+            extra = self.ping_payload() if self.ping_payload is not None else {}
+            message = json.dumps({"type": "ping", **extra})
+            # Sends normally complete at once; one shared timeout covers peers with full buffers
+            tasks = {asyncio.ensure_future(peer.websocket.send_text(message)): peer for peer in to_ping}
+            done, pending = await asyncio.wait(tasks, timeout=self.send_timeout)
+            for task in pending:
+                task.cancel()
+            for task, peer in tasks.items():
+                if task in done and not task.cancelled() and task.exception() is None:
+                    self.stats["pings_sent"] += 1
+                else:
+                    to_reap.append((peer, "reaped_send_failed"))
+        if to_reap:
+            await self._reap(to_reap)
+
+    async def _reap(self, to_reap: List[Tuple[_Peer, str]]) -> None:
+        reaped = []
+        for peer, reason in to_reap:
+            if self.peers.get(peer.client_id) is not peer:
+                continue
+            self.stats[reason] += 1
+            self.remove(peer.client_id)
+            reaped.append((peer, reason))
+        if not reaped:
+            return
+        # Half-open peers may never finish the close handshake; close them all under one shared timeout
+        tasks = [asyncio.ensure_future(peer.websocket.close(code=1001)) for peer, _ in reaped]
+        done, pending = await asyncio.wait(tasks, timeout=self.send_timeout)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            if not task.cancelled():
+                task.exception()
+        for peer, reason in reaped:
+            logger.info(f"Reaped WebSocket client {peer.client_id} ({reason})")
+            if self.on_reap is not None:
+                self.on_reap(peer.client_id)
+
+    def summary(self) -> Dict[str, Any]:
+        minutes = list(self.churn)
+        return {
+            "peers": len(self.peers),
+            "awaiting_pong": sum(1 for peer in self.peers.values() if peer.pinged_at),
+            "idle_timeout": self.idle_timeout,
+            "pong_timeout": self.pong_timeout,
+            "tick": self.tick,
+            "reap_deadline": self.idle_timeout + self.pong_timeout + self.tick,
+            "wheel_slots": len(self.slots),
+            "churn_per_minute": [{"minute": minute * 60, "connects": c, "disconnects": d} for minute, c, d in minutes],
+            **self.stats
+        }
+
+# Load test: 10k simulated dashboards, a tenth of them silently dead
+if __name__ == "__main__":
+    class SimulatedSocket:
+        def __init__(self, client_id: str, alive: bool):
+            self.client_id = client_id
+            self.alive = alive
+            self.closed = False
+
+        async def send_text(self, message: str) -> None:
+            if self.closed:
+                raise RuntimeError("closed")
+            # Live dashboards answer a ping after some network latency
+            if self.alive:
+                asyncio.get_running_loop().call_later(random.uniform(0.01, 0.3), scheduler.touch, self.client_id)
+
+        async def close(self, code: int = 1000) -> None:
+            self.closed = True
+
+    scheduler = HeartbeatScheduler(idle_timeout=2.0, pong_timeout=1.0, tick=0.1)
+
+    async def main() -> None:
+        clients = 10_000
+        sockets = {}
+        for i in range(clients):
+            sockets[f"c{i}"] = SimulatedSocket(f"c{i}", alive=random.random() > 0.1)
+            scheduler.add(f"c{i}", sockets[f"c{i}"])
+        dead = sum(1 for s in sockets.values() if not s.alive)
+        scheduler.start()
+
+        start = time.monotonic()
+        while time.monotonic() - start < 6.0:
+            # Some live clients also send on their own
+            for client_id, socket in sockets.items():
+                if socket.alive and random.random() < 0.01:
+                    scheduler.touch(client_id)
+            await asyncio.sleep(0.1)
+        await scheduler.stop()
+
+        summary = scheduler.summary()
+        reaped = summary["reaped_unresponsive"]
+        wrongly = sum(1 for s in sockets.values() if s.alive and s.closed)
+        print(f"{clients:,} peers, {dead} dead: reaped {reaped} within {summary['reap_deadline']:.1f} s deadline, "
+              f"{wrongly} live peers reaped, {summary['pings_sent']:,} pings, max tick {summary['max_tick_ms']:.1f} ms")
+
+    asyncio.run(main())
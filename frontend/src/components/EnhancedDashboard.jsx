@@ -218,6 +218,11 @@ const EnhancedDashboard = () => {
       
       // Update component state
       setAlerts(current => {
+        // Incidents merged into this one are superseded by it
+        const merged = (alert.metrics && alert.metrics.merged_incidents) || [];
+        if (merged.length) {
+          current = current.filter(a => !merged.includes(a.id));
+        }
         const exists = current.some(a => a.id === alert.id);
         
         if (exists) {
@@ -244,6 +249,16 @@ const EnhancedDashboard = () => {
       setLastUpdated(new Date());
     };
     
+    // Handler for status changes to alerts already shown
+    const handleAlertUpdate = (alert) => {
+      if (!alert || !alert.id) {
+        return;
+      }
+      AlertService.addAlert(alert);
+      setAlerts(current => current.map(a => a.id === alert.id ? alert : a));
+      setLastUpdated(new Date());
+    };
+    
     // Update real-time data with new alert
     const updateRealTimeData = (alert) => {
       const now = new Date();
@@ -267,6 +282,8 @@ const EnhancedDashboard = () => {
     // Subscribe to events
     const unsubscribeConnection = WebSocketService.subscribe('connection', handleConnectionChange);
     const unsubscribeAlert = WebSocketService.subscribe('alert', handleNewAlert);
+    const unsubscribeAlertUpdate = WebSocketService.subscribe('alert_update', handleAlertUpdate);
+    const unsubscribeSummary = WebSocketService.subscribe('summary', setSummary);
     
     // Load initial data
     loadInitialData();
@@ -281,6 +298,8 @@ const EnhancedDashboard = () => {
       console.log('[EnhancedDashboard] Component unmounting');
       unsubscribeConnection();
       unsubscribeAlert();
+      unsubscribeAlertUpdate();
+      unsubscribeSummary();
       clearInterval(interval);
     };
   }, []);
@@ -23,7 +23,9 @@ const SimpleAlertsPage = () => {
 
           try {
             const data = JSON.parse(event.data);
-            if (data.type === "alert" && data.data) {
+            if (data.type === "ping") {
+              ws.send(JSON.stringify({ type: "pong" }));
+            } else if (data.type === "alert" && data.data) {
               setAlerts((prev) => [data.data, ...prev]);
             } else if (data.type === "initial" && data.alerts) {
               setAlerts(data.alerts);
@@ -2,6 +2,8 @@
  * AlertService - Handles fetching and managing alert data
  */
 
+import webSocketService from './WebSocketService';
+
 class AlertService {
   constructor() {
     this.baseUrl = 'http://localhost:8001';
@@ -24,6 +26,14 @@ class AlertService {
         return this.cachedAlerts;
       }
       
+      // While the WebSocket is synced, addAlert keeps the cache current and polling is redundant
+      const { isConnected, lastSeq } = webSocketService.getConnectionState();
+      if (useCached && this.cachedAlerts.length > 0 && isConnected && lastSeq !== null) {
+        this.log(`Returning cached alerts kept in sync over WebSocket (seq ${lastSeq})`);
+        this.lastFetchTime = now;
+        return this.cachedAlerts;
+      }
+      
       // Try to fetch from backend
       const response = await fetch(`${this.baseUrl}/api/alerts`);
       
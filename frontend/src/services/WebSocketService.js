@@ -33,6 +33,9 @@ class WebSocketService {
     this.connectionId = null;
     this.developmentMode = process.env.NODE_ENV === 'development';
     this.unmounting = false; // Flag to prevent reconnects during component unmounting
+    this.lastSeq = null; // Last alert sequence number applied, used to resume with only the delta
+    this.resumePending = false; // A resume was sent and its delta has not arrived yet
+    this.filters = null; // Server-side alert filters, e.g. { severity: ['high', 'critical'] }
   }
 
   /**
@@ -79,7 +82,17 @@ class WebSocketService {
         this.socket = null;
       }
       
-      const url = `${this.baseUrl}${this.path}`;
+      // Resume from the last applied sequence number so the server only sends what we missed,
+      // and pass our filters so the snapshot/delta is already narrowed to them
+      const params = new URLSearchParams();
+      if (this.lastSeq !== null) {
+        params.set('since', this.lastSeq);
+      }
+      Object.entries(this.filters || {}).forEach(([field, value]) => {
+        params.set(field, Array.isArray(value) ? value.join(',') : value);
+      });
+      const query = params.toString();
+      const url = `${this.baseUrl}${this.path}${query ? `?${query}` : ''}`;
       this.log(`Creating WebSocket connection to ${url}`);
       this.socket = new WebSocket(url);
       
@@ -146,6 +159,20 @@ class WebSocketService {
     }
   }
 
+  /**
+   * Set server-side alert filters (severity, status, device_id, detection_method,
+   * threat_type, min_confidence) so only matching alerts are sent to this client
+   */
+  setFilters(filters) {
+    this.filters = filters && Object.keys(filters).length > 0 ? filters : null;
+    
+    if (this.isConnected) {
+      this.send({ type: 'subscribe', filters: this.filters || {} });
+    }
+    
+    return this;
+  }
+
   /**
    * Subscribe to WebSocket events
    */
@@ -321,6 +348,7 @@ class WebSocketService {
     this.log('WebSocket connection established');
     this.isConnected = true;
     this.reconnectAttempts = 0;
+    this.resumePending = false;
     
     // Set up heartbeat
     this.setupHeartbeat();
@@ -336,9 +364,43 @@ class WebSocketService {
     try {
       const message = JSON.parse(event.data);
       
+      // Answer server heartbeats so the connection is not reaped as idle
+      if (message.type === 'ping') {
+        this.send({ type: 'pong', timestamp: new Date().toISOString() });
+        return;
+      }
+      
       // Handle heartbeat response
       if (message.type === 'pong') {
         this.handleHeartbeatResponse();
+        
+        // The server sent us events we have not seen, ask for the gap
+        if (this.lastSeq !== null && message.seq > this.lastSeq && !this.resumePending) {
+          this.resumePending = true;
+          this.send({ type: 'resume', since: this.lastSeq });
+        }
+        return;
+      }
+      
+      // Correlated incidents are alert-shaped and update in place by id;
+      // alert_update carries a status change to an alert already shown
+      const isAlertEvent = message.type === 'alert' || message.type === 'incident' || message.type === 'alert_update';
+      
+      // Drop sequenced alerts already applied from a delta or snapshot
+      if (isAlertEvent && message.seq !== undefined && this.lastSeq !== null && message.seq <= this.lastSeq) {
+        return;
+      }
+      
+      // Unfiltered clients receive every seq, so a jump means events were lost: fetch the gap
+      // (which includes this event) instead of applying it out of order. Filtered clients skip
+      // other seqs by design and find gaps through the pong.
+      if (isAlertEvent && message.seq !== undefined && this.lastSeq !== null && this.filters === null
+          && (this.resumePending || message.seq > this.lastSeq + 1)) {
+        if (!this.resumePending) {
+          this.log(`Missed events after seq ${this.lastSeq} (got ${message.seq}), resuming`);
+          this.resumePending = true;
+          this.send({ type: 'resume', since: this.lastSeq });
+        }
         return;
       }
       
@@ -358,12 +420,36 @@ class WebSocketService {
       }
       
       // Special handling for alerts
-      if (message.type === 'alert' && message.data) {
+      if (message.type === 'alert_update') {
+        // Delivered to 'alert_update' subscribers above; not a new alert
+      } else if (isAlertEvent && message.data) {
         this.notifySubscribers('alert', message.data);
       } else if (message.type === 'initial' && message.alerts) {
         message.alerts.forEach(alert => {
           this.notifySubscribers('alert', alert);
         });
+      } else if (message.type === 'delta' && message.events) {
+        this.log(`Resumed from seq ${message.since}, applying ${message.events.length} missed events`);
+        message.events.forEach(event => {
+          if ((event.type === 'alert' || event.type === 'incident') && event.data) {
+            this.notifySubscribers('alert', event.data);
+          } else if (event.type === 'alert_update' && event.data) {
+            this.notifySubscribers('alert_update', event.data);
+          }
+        });
+      }
+      
+      // Snapshots and deltas carry the current summary; it is not sequenced on its own
+      if ((message.type === 'initial' || message.type === 'delta') && message.summary) {
+        this.notifySubscribers('summary', message.summary);
+      }
+      
+      // Track the newest sequence number applied
+      if (message.seq !== undefined && (!isAlertEvent || this.lastSeq === null || message.seq > this.lastSeq)) {
+        this.lastSeq = message.seq;
+      }
+      if (message.type === 'initial' || message.type === 'delta') {
+        this.resumePending = false;
       }
     } catch (error) {
       this.log('Error processing message:', error);
@@ -421,7 +507,8 @@ class WebSocketService {
       isConnected: this.isConnected,
       reconnectAttempts: this.reconnectAttempts,
       lastHeartbeat: this.lastHeartbeatResponse,
-      connectionId: this.connectionId
+      connectionId: this.connectionId,
+      lastSeq: this.lastSeq
     };
   }
 
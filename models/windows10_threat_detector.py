@@ -4,10 +4,24 @@ import json
 import numpy as np
 import lightgbm as lgb
 import joblib
+from collections import OrderedDict
 from datetime import datetime
 
+try:
+    from model_bundle import load_bundle, ArrayScaler
+    BUNDLES_AVAILABLE = True
+except ImportError:
+    BUNDLES_AVAILABLE = False
+
 class Windows10ThreatDetector:
-    def __init__(self, model_dir='models'):
+    def __init__(self, model_dir='models', explain_cache_size=1024, allow_pickle=False):
+        """
+        Args:
+            model_dir: Directory with the booster, metadata and scaler files
+            explain_cache_size: Attributions kept in the explain cache
+            allow_pickle: Also accept a legacy pickled scaler. Only use this for
+                          trusted files; convert them with model_bundle.py instead.
+        """
         # Load model
         self.model_path = os.path.join(model_dir, 'windows10_threat_detector.lgb')
         self.model = lgb.Booster(model_file=self.model_path)
@@ -19,10 +33,57 @@ class Windows10ThreatDetector:
         self.feature_names = self.metadata['feature_names']
         self.is_binary = self.metadata['is_binary']
         
-        # Load scaler if exists
+        # Load scaler if exists, preferring the memory-mapped bundle over unpickling
+        bundle_path = os.path.join(model_dir, 'windows10_threat_detector_scaler.nsmb')
         scaler_path = os.path.join(model_dir, 'windows10_threat_detector_scaler.pkl')
-        self.scaler = joblib.load(scaler_path) if os.path.exists(scaler_path) else None
-    
+        if BUNDLES_AVAILABLE and os.path.exists(bundle_path):
+            bundle = load_bundle(bundle_path)
+            self.scaler = ArrayScaler(bundle.array('scaler_mean'), bundle.array('scaler_scale'))
+        elif os.path.exists(scaler_path):
+            if not allow_pickle:
+                raise ValueError(f"{scaler_path} is a pickle and legacy pickle loading is disabled; "
+                                 f"convert it with: python backend/model_bundle.py scaler {scaler_path} {bundle_path}")
+            self.scaler = joblib.load(scaler_path)
+        else:
+            self.scaler = None
+        
+        # LRU of per-sample attributions keyed by the raw feature row, for one model version
+        self.explain_cache_size = explain_cache_size
+        self.explain_cache = OrderedDict()
+        self.explain_version = None
+        self.shared = False
+
+    @classmethod
+    def from_shared(cls, shared_model, explain_cache_size=1024):
+        """
+        Build a detector on top of a shared-memory model segment
+
+        Args:
+            shared_model: shared_models.SharedWindows10Model attached by this worker
+
+        Returns:
+            Windows10ThreatDetector whose trees and scaler are not copied into the process
+        """
+        detector = cls.__new__(cls)
+        detector.model_path = shared_model.registry.path(shared_model.name)
+        detector.model = shared_model
+        detector.metadata = shared_model.metadata
+        detector.feature_names = detector.metadata['feature_names']
+        detector.is_binary = detector.metadata['is_binary']
+        detector.scaler = shared_model if shared_model.has_scaler else None
+        detector.explain_cache_size = explain_cache_size
+        detector.explain_cache = OrderedDict()
+        detector.explain_version = None
+        detector.shared = True
+        return detector
+
+    def _snapshot(self):
+        """Model, scaler and version for one call; a shared model is pinned to a single published version"""
+        if self.shared:
+            current = self.model.current()
+            return current.model, current.scaler, current
+        return self.model, self.scaler, None
+
     def detect(self, metrics):
         """
         Detect threats from Windows metrics
@@ -34,6 +95,18 @@ class Windows10ThreatDetector:
         Returns:
             Dict with detection results
         """
+        return self.detect_batch(self.vectorize(metrics))[0]
+    
+    def vectorize(self, metrics):
+        """
+        Convert metrics into a (1, n_features) array in feature_names order
+        
+        Args:
+            metrics: Dict keyed by feature name or array-like in the correct order
+        
+        Returns:
+            numpy array of shape (1, n_features)
+        """
         # Prepare input data
         if isinstance(metrics, dict):
             # Get values in the correct order
@@ -49,30 +122,132 @@ class Windows10ThreatDetector:
             input_data = metrics
             
         # Convert to numpy array with correct shape
-        input_array = np.array(input_data).reshape(1, -1)
+        return np.array(input_data, dtype=np.float64).reshape(1, -1)
+    
+    def detect_batch(self, rows, explain=False, top_k=5):
+        """
+        Detect threats for many samples in one model call
+        
+        Args:
+            rows: 2-D array-like of shape (n_samples, n_features), columns in
+                  the order of feature_names
+            explain: Add per-sample "attributions" to threat verdicts
+            top_k: Number of features in each attribution
+        
+        Returns:
+            List of detection result dicts, one per row
+        """
+        raw_rows = np.asarray(rows, dtype=np.float64)
+        if raw_rows.ndim == 1:
+            raw_rows = raw_rows.reshape(1, -1)
+        input_array = raw_rows
+        model, scaler, _ = self._snapshot()
         
         # Apply scaling if available
-        if self.scaler is not None:
-            input_array = self.scaler.transform(input_array)
+        if scaler is not None:
+            input_array = scaler.transform(input_array)
         
         # Make prediction
+        raw = model.predict(input_array)
         if self.is_binary:
-            probability = self.model.predict(input_array)[0]
-            prediction = int(probability > 0.5)
-            confidence = float(max(probability, 1-probability))
+            predictions = (raw > 0.5).astype(int)
+            confidences = np.maximum(raw, 1 - raw)
+            is_threat = predictions == 1
         else:
-            probabilities = self.model.predict(input_array)
-            prediction = int(np.argmax(probabilities))
-            confidence = float(np.max(probabilities))
+            predictions = np.argmax(raw, axis=1)
+            confidences = np.max(raw, axis=1)
+            is_threat = predictions != 0
         
         # Return results
-        return {
-            "timestamp": datetime.now().isoformat(),
-            "is_threat": bool(prediction == 1) if self.is_binary else bool(prediction != 0),
-            "prediction": prediction,
-            "confidence": confidence,
-            "top_features": self.metadata['top_features']
-        }
+        timestamp = datetime.now().isoformat()
+        results = [
+            {
+                "timestamp": timestamp,
+                "is_threat": bool(is_threat[i]),
+                "prediction": int(predictions[i]),
+                "confidence": float(confidences[i]),
+                "top_features": self.metadata['top_features']
+            }
+            for i in range(len(predictions))
+        ]
+        
+        # Attributions are only worth their cost for threat verdicts
+        if explain and is_threat.any():
+            threat_rows = np.flatnonzero(is_threat)
+            for i, attribution in zip(threat_rows, self.explain_batch(raw_rows[threat_rows], top_k)):
+                results[i]["attributions"] = attribution
+        return results
+    
+    def explain_batch(self, rows, top_k=5):
+        """
+        Per-sample feature attributions for the predicted class
+        
+        Uses the booster's pred_contrib (TreeSHAP for LightGBM boosters,
+        tree-path attribution for shared-memory models) for all uncached
+        rows in one call.
+        
+        Args:
+            rows: 2-D array-like of raw (unscaled) feature rows
+            top_k: Number of features to return per row
+        
+        Returns:
+            List of dicts with "bias" and "top_features", the latter sorted by
+            contribution towards the predicted class, largest first
+        """
+        raw_rows = np.asarray(rows, dtype=np.float64)
+        if raw_rows.ndim == 1:
+            raw_rows = raw_rows.reshape(1, -1)
+        
+        model, scaler, version = self._snapshot()
+        if version is not self.explain_version:
+            # A reload of the shared segment makes every cached attribution stale
+            self.explain_cache.clear()
+            self.explain_version = version
+        
+        explanations = [None] * len(raw_rows)
+        missing = []
+        for i in range(len(raw_rows)):
+            key = (raw_rows[i].tobytes(), top_k)
+            cached = self.explain_cache.get(key)
+            if cached is None:
+                missing.append(i)
+            else:
+                self.explain_cache.move_to_end(key)
+                explanations[i] = cached
+        if not missing:
+            return explanations
+        
+        input_array = raw_rows[missing]
+        if scaler is not None:
+            input_array = scaler.transform(input_array)
+        n_features = len(self.feature_names)
+        contributions = np.asarray(model.predict(input_array, pred_contrib=True))
+        contributions = contributions.reshape(len(missing), -1, n_features + 1)
+        
+        # Binary models have one block; otherwise explain the most likely class
+        predicted = np.argmax(contributions.sum(axis=2), axis=1) if contributions.shape[1] > 1 \
+            else np.zeros(len(missing), dtype=int)
+        block = contributions[np.arange(len(missing)), predicted]
+        k = min(top_k, n_features)
+        top = np.argsort(-block[:, :n_features], axis=1)[:, :k]
+        
+        for j, i in enumerate(missing):
+            explanation = {
+                "bias": float(block[j, -1]),
+                "top_features": [
+                    {
+                        "feature": self.feature_names[f],
+                        "value": float(raw_rows[i, f]),
+                        "contribution": float(block[j, f])
+                    }
+                    for f in top[j]
+                ]
+            }
+            explanations[i] = explanation
+            self.explain_cache[(raw_rows[i].tobytes(), top_k)] = explanation
+            if len(self.explain_cache) > self.explain_cache_size:
+                self.explain_cache.popitem(last=False)
+        return explanations
 
 # Example usage
 if __name__ == "__main__":